@@ -0,0 +1,49 @@
+"""Benchmark of the diet generator solver: solve time versus candidate food-set size.
+
+Usage:
+    python bench_diet_solver.py [--sizes 10 100 1000 10000 50000] [--repeats 20] [--meals 6]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from diet_solver import MACRO_KCAL, macro_targets, solve_quantities
+
+
+def random_library(rng, size: int) -> np.ndarray:
+    """4 x size per-gram matrix of plausible foods (macros per 100 g, kcal derived from them)"""
+    per_100g = rng.uniform(0, [35, 85, 45], size=(size, 3))
+    kcal = per_100g @ MACRO_KCAL
+    return np.vstack([per_100g.T, kcal]) / 100
+
+
+def run(sizes, repeats: int, meals: int) -> None:
+    rng = np.random.default_rng(42)
+    daily = macro_targets(2200, 30, 40, 30)
+    meal_target = daily / meals
+
+    print(f"{'foods':>8} {'median ms/meal':>15} {'p95 ms/meal':>12} {'ms/diet':>9} {'kcal error %':>13}")
+    for size in sizes:
+        library = random_library(rng, size)
+        timings = []
+        errors = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            quantities = solve_quantities(library, meal_target)
+            timings.append(time.perf_counter() - started)
+            errors.append(abs(library[3] @ quantities - meal_target[3]) / meal_target[3] * 100)
+        timings = np.array(timings) * 1000
+        print(
+            f"{size:>8} {np.median(timings):>15.2f} {np.percentile(timings, 95):>12.2f} "
+            f"{np.median(timings) * meals:>9.1f} {np.median(errors):>13.1f}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time solve_quantities across food library sizes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--meals', type=int, default=6)
+    args = parser.parse_args()
+    run(args.sizes, args.repeats, args.meals)
@@ -0,0 +1,90 @@
+"""Compact diet revisions: positional deltas between consecutive versions of a diet.
+
+A revision is either a full snapshot of the revisioned fields or a delta
+against the version before it. A delta keeps only what changed: top-level
+fields, the meal count, and per meal its changed fields and changed food
+items. Applying the deltas of versions s+1..v in order to the snapshot of
+version s gives version v.
+"""
+import copy
+
+REVISION_FIELDS = ["name", "meals", "total_kcal", "total_protein", "total_carbs", "total_fats"]
+
+
+def revision_state(diet: dict) -> dict:
+    """The revisioned part of a diet document"""
+    return {field: copy.deepcopy(diet[field]) for field in REVISION_FIELDS}
+
+
+def _diff_fields(old: dict, new: dict, skip: str) -> dict:
+    return {key: value for key, value in new.items() if key != skip and old.get(key) != value}
+
+
+def _diff_items(old: list, new: list) -> dict:
+    patch = {}
+    if len(new) != len(old):
+        patch["length"] = len(new)
+    changed = [[index, item] for index, item in enumerate(new) if index >= len(old) or old[index] != item]
+    if changed:
+        patch["set"] = changed
+    return patch
+
+
+def _apply_items(items: list, patch: dict) -> list:
+    items = items[:patch.get("length", len(items))]
+    for index, item in patch.get("set", []):
+        # Indexes are ascending, so positions past the end are appends in order
+        if index < len(items):
+            items[index] = item
+        else:
+            items.append(item)
+    return items
+
+
+def diff_diet(old: dict, new: dict) -> dict:
+    """Delta turning revision_state(old) into revision_state(new); empty when nothing changed"""
+    delta = {}
+    fields = _diff_fields(old, {field: new[field] for field in REVISION_FIELDS}, skip="meals")
+    if fields:
+        delta["fields"] = fields
+    old_meals, new_meals = old["meals"], new["meals"]
+    if len(new_meals) != len(old_meals):
+        delta["meal_count"] = len(new_meals)
+
+    meals = []
+    for index, meal in enumerate(new_meals):
+        if index >= len(old_meals):
+            meals.append([index, {"meal": meal}])
+            continue
+        patch = {}
+        meal_fields = _diff_fields(old_meals[index], meal, skip="foods")
+        if meal_fields:
+            patch["fields"] = meal_fields
+        foods = _diff_items(old_meals[index]["foods"], meal["foods"])
+        if foods:
+            patch["foods"] = foods
+        if patch:
+            meals.append([index, patch])
+    if meals:
+        delta["meals"] = meals
+    return delta
+
+
+def apply_delta(state: dict, delta: dict) -> dict:
+    """Next revision state from a state and the delta recorded against it"""
+    state = copy.deepcopy(state)
+    state.update(delta.get("fields", {}))
+    meals = state["meals"][:delta.get("meal_count", len(state["meals"]))]
+    for index, patch in delta.get("meals", []):
+        if "meal" in patch:
+            if index < len(meals):
+                meals[index] = patch["meal"]
+            else:
+                meals.append(patch["meal"])
+            continue
+        meal = meals[index]
+        meal.update(patch.get("fields", {}))
+        if "foods" in patch:
+            meal["foods"] = _apply_items(meal["foods"], patch["foods"])
+    state["meals"] = meals
+    return state
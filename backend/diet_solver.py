@@ -0,0 +1,138 @@
+"""Quantity solver for the automatic diet generator.
+
+Finds grams per food so that a meal hits protein/carbs/fats/kcal targets:
+greedy food selection over the whole candidate set, box-constrained least
+squares (accelerated projected gradient) over the selected foods, and
+rounding to practical gram steps. Everything is vectorised with NumPy.
+"""
+import numpy as np
+
+# kcal per gram of protein, carbs and fats
+MACRO_KCAL = np.array([4.0, 4.0, 9.0])
+
+
+def macro_targets(target_kcal: float, protein_pct: float, carbs_pct: float, fats_pct: float) -> np.ndarray:
+    """Targets as [protein g, carbs g, fats g, kcal] for a kcal goal and percentage split"""
+    grams = target_kcal * np.array([protein_pct, carbs_pct, fats_pct]) / 100 / MACRO_KCAL
+    return np.append(grams, target_kcal)
+
+
+def per_gram_matrix(foods: list) -> np.ndarray:
+    """4 x n matrix of protein, carbs, fats and kcal per gram for each food"""
+    per_100g = np.array(
+        [[f["protein_per_100g"], f["carbs_per_100g"], f["fats_per_100g"], f["kcal_per_100g"]] for f in foods],
+        dtype=float
+    ).reshape(-1, 4)
+    return per_100g.T / 100
+
+
+def _bounded_least_squares(A, target, lower, upper, ridge, iterations):
+    """min 0.5 * ||A q - target||^2 + 0.5 * ridge * ||q||^2  subject to  lower <= q <= upper"""
+    lipschitz = np.linalg.norm(A, 2) ** 2 + ridge
+    step = 1.0 / lipschitz
+    q = np.clip(np.full(A.shape[1], target.sum() / max(A.sum(), 1e-9)), lower, upper)
+    momentum = q.copy()
+    t = 1.0
+    for _ in range(iterations):
+        gradient = A.T @ (A @ momentum - target) + ridge * momentum
+        q_next = np.clip(momentum - step * gradient, lower, upper)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        momentum = q_next + ((t - 1) / t_next) * (q_next - q)
+        q, t = q_next, t_next
+    return q
+
+
+def solve_quantities(
+    per_gram: np.ndarray,
+    target: np.ndarray,
+    min_g: float = 10.0,
+    max_g: float = 400.0,
+    step_g: float = 5.0,
+    max_foods: int = 4,
+    ridge: float = 1e-6,
+    iterations: int = 500,
+) -> np.ndarray:
+    """Grams per candidate food (0 for unused ones) approximating `target`.
+
+    Rows are weighted by the inverse target so a gram of fat error and a kcal
+    of error count in proportion to their goals. Foods are picked greedily
+    (non-negative matching pursuit): each round scores every candidate against
+    the current residual in one matrix product, adds the best one and re-solves
+    the bounded least squares over the picked foods. Quantities are finally
+    rounded to multiples of `step_g`.
+    """
+    n = per_gram.shape[1]
+    quantities = np.zeros(n)
+    if n == 0 or target[-1] <= 0:
+        return quantities
+
+    weights = 1.0 / np.maximum(target, 1.0)
+    A = per_gram * weights[:, None]
+    b = target * weights
+    norms = np.maximum(np.linalg.norm(A, axis=0), 1e-12)
+
+    selected = []
+    q = np.zeros(0)
+    residual = b.copy()
+    best_error = np.linalg.norm(residual)
+    for _ in range(min(max_foods, n)):
+        scores = (A.T @ residual) / norms
+        scores[selected] = -np.inf
+        candidate = int(np.argmax(scores))
+        if scores[candidate] <= 0:
+            break
+        trial = selected + [candidate]
+        q_trial = _bounded_least_squares(A[:, trial], b, min_g, max_g, ridge, iterations)
+        residual_trial = b - A[:, trial] @ q_trial
+        error = np.linalg.norm(residual_trial)
+        if error >= best_error:
+            break
+        selected, q, residual, best_error = trial, q_trial, residual_trial, error
+
+    if selected:
+        quantities[selected] = np.clip(np.round(q / step_g) * step_g, min_g, max_g)
+    return quantities
+
+
+# ============ TEMPLATE SCALING ============
+
+# Bounds on how far one macro group of a template may be scaled for a client
+TEMPLATE_MIN_SCALE = 0.25
+TEMPLATE_MAX_SCALE = 4.0
+
+
+def macro_groups(per_gram: np.ndarray) -> np.ndarray:
+    """Index (0 protein, 1 carbs, 2 fats) of the macro giving most of each food's kcal"""
+    return np.argmax(per_gram[:3] * MACRO_KCAL[:, None], axis=0)
+
+
+def template_scale_factors(per_gram: np.ndarray, quantities: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """clients x 3 scale factors, one per macro group, for targets given as clients x [P g, C g, F g, kcal]
+
+    Each group's foods are scaled together so the template keeps its
+    structure: the factors solve groups -> macro grams in the least squares
+    sense, are clipped to sane bounds, then corrected uniformly to hit kcal.
+    """
+    groups = np.eye(3)[macro_groups(per_gram)]
+    contribution = (per_gram * quantities) @ groups  # 4 x 3: macros and kcal of each group
+    factors = np.linalg.lstsq(contribution[:3], targets[:, :3].T, rcond=None)[0].T
+    factors = np.clip(factors, TEMPLATE_MIN_SCALE, TEMPLATE_MAX_SCALE)
+    kcal = factors @ contribution[3]
+    return factors * (targets[:, 3] / np.maximum(kcal, 1e-9))[:, None]
+
+
+def scale_template(per_gram: np.ndarray, quantities: np.ndarray, targets: np.ndarray,
+                   meal_sizes: list, step_g: float = 1.0) -> tuple:
+    """Scale a template's items for many clients at once.
+
+    Returns grams (clients x items), item macros (clients x 4 x items, rows
+    protein, carbs, fats, kcal) and meal totals (clients x 4 x meals).
+    """
+    factors = template_scale_factors(per_gram, quantities, targets)
+    grams = np.round(quantities * factors[:, macro_groups(per_gram)] / step_g) * step_g
+    items = grams[:, None, :] * per_gram[None]
+    # Meal totals from cumulative sums, which (unlike reduceat) handle empty meals
+    bounds = np.concatenate([[0], np.cumsum(meal_sizes)]).astype(int)
+    cumulative = np.concatenate([np.zeros(items.shape[:2] + (1,)), np.cumsum(items, axis=2)], axis=2)
+    meals = cumulative[:, :, bounds[1:]] - cumulative[:, :, bounds[:-1]]
+    return grams, items, meals
@@ -0,0 +1,123 @@
+"""Streaming CSV / NDJSON parsing and formatting for bulk food import and export.
+
+Input arrives as an async iterable of byte chunks (a request body or a file)
+and is decoded, split into lines and parsed one record at a time, so memory
+stays flat regardless of the file size. Parsers yield
+(line number, row dict or None, error or None); validation and writes are
+left to the caller.
+"""
+import codecs
+import csv
+import io
+import json
+
+FOOD_COLUMNS = ["name", "kcal_per_100g", "protein_per_100g", "carbs_per_100g", "fats_per_100g"]
+NUMERIC_COLUMNS = FOOD_COLUMNS[1:]
+FOOD_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+# Lines buffered per chunk of an export stream
+EXPORT_CHUNK_LINES = 500
+
+
+async def iter_lines(chunks):
+    """Decode UTF-8 (BOM tolerated) incrementally and yield (line number, text) per line"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    number = 0
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            number += 1
+            yield number, line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield number + 1, pending.rstrip("\r")
+
+
+def _decimal(value):
+    """Accept spreadsheet decimal commas ('12,5')"""
+    if isinstance(value, str) and "," in value and "." not in value:
+        return value.replace(",", ".")
+    return value
+
+
+async def iter_csv_rows(lines):
+    """Rows of a CSV whose header names the columns; ',', ';' and tab delimiters are detected"""
+    header = None
+    delimiter = ","
+    record = []
+    start = 0
+    async for number, line in lines:
+        if not record:
+            start = number
+        record.append(line)
+        text = "\n".join(record)
+        if text.count('"') % 2:
+            # Quoted field continues on the next line
+            continue
+        record = []
+        if not text.strip():
+            continue
+
+        if header is None:
+            delimiter = max([",", ";", "\t"], key=text.count)
+            header = [column.strip().lower() for column in next(csv.reader([text], delimiter=delimiter))]
+            missing = [column for column in FOOD_COLUMNS if column not in header]
+            if missing:
+                yield start, None, f"missing columns: {', '.join(missing)}"
+                return
+            continue
+
+        values = next(csv.reader([text], delimiter=delimiter))
+        if len(values) != len(header):
+            yield start, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        row = dict(zip(header, values))
+        for column in NUMERIC_COLUMNS:
+            row[column] = _decimal(row[column].strip())
+        yield start, row, None
+
+    if record:
+        yield start, None, "unterminated quoted field"
+
+
+async def iter_ndjson_rows(lines):
+    """Rows of newline-delimited JSON, one object per line"""
+    async for number, line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f"invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "expected a JSON object"
+            continue
+        yield number, row, None
+
+
+def iter_rows(chunks, fmt: str):
+    lines = iter_lines(chunks)
+    return iter_csv_rows(lines) if fmt == "csv" else iter_ndjson_rows(lines)
+
+
+def _csv_line(values) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(values)
+    return buffer.getvalue()
+
+
+async def format_foods(foods, fmt: str):
+    """Serialize an async iterable of food documents, yielding text in chunks of lines"""
+    lines = [_csv_line(FOOD_COLUMNS)] if fmt == "csv" else []
+    async for food in foods:
+        if fmt == "csv":
+            lines.append(_csv_line([food[column] for column in FOOD_COLUMNS]))
+        else:
+            lines.append(json.dumps({column: food[column] for column in FOOD_COLUMNS}, ensure_ascii=False) + "\n")
+        if len(lines) >= EXPORT_CHUNK_LINES:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
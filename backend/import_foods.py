@@ -0,0 +1,69 @@
+"""Bulk import or export of a trainer's foods as CSV or NDJSON.
+
+The file is streamed in fixed-size chunks through the same parser and
+batched writer as POST /api/foods/import, so large tables never sit in
+memory at once.
+
+Usage:
+    python import_foods.py --trainer-id ID foods.csv [--format ndjson] [--mode upsert] [--batch-size 1000]
+    python import_foods.py --trainer-id ID --export foods.csv [--format ndjson]
+"""
+import argparse
+import asyncio
+import time
+
+from server import client, import_food_rows, exported_foods, load_catalog, FOOD_IMPORT_BATCH_SIZE
+from food_io import iter_rows, format_foods
+
+READ_CHUNK_BYTES = 64 * 1024
+
+
+async def read_chunks(path: str):
+    with open(path, 'rb') as source:
+        while chunk := source.read(READ_CHUNK_BYTES):
+            yield chunk
+
+
+def guess_format(path: str, fmt) -> str:
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+async def import_file(args) -> None:
+    started = time.perf_counter()
+    rows = iter_rows(read_chunks(args.path), guess_format(args.path, args.format))
+    report = await import_food_rows(args.trainer_id, rows, args.mode, args.batch_size)
+    elapsed = time.perf_counter() - started
+    for error in report['errors']:
+        print(f"  línea {error['line']}: {error['error']}")
+    if report['error_count'] > len(report['errors']):
+        print(f"  … y {report['error_count'] - len(report['errors'])} errores más")
+    print(f"✓ {report['inserted']} insertados, {report['updated']} actualizados, "
+          f"{report['skipped']} omitidos, {report['error_count']} errores ({elapsed:.1f}s)")
+
+
+async def export_file(args) -> None:
+    with open(args.path, 'w', encoding='utf-8', newline='') as target:
+        async for text in format_foods(exported_foods(args.trainer_id), guess_format(args.path, args.format)):
+            target.write(text)
+    print(f"✓ alimentos exportados a {args.path}")
+
+
+async def main(args) -> None:
+    # Imports match names against the catalogue; exports include the catalogue foods the trainer edited
+    await load_catalog()
+    await (export_file(args) if args.export else import_file(args))
+    client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import or export a trainer\'s foods as CSV or NDJSON')
+    parser.add_argument('path', help='file to read, or to write with --export')
+    parser.add_argument('--trainer-id', required=True)
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='defaults from the file extension')
+    parser.add_argument('--mode', choices=['skip', 'upsert'], default='skip',
+                        help='what to do with foods whose name already exists')
+    parser.add_argument('--batch-size', type=int, default=FOOD_IMPORT_BATCH_SIZE)
+    parser.add_argument('--export', action='store_true', help='write the trainer\'s foods to path instead')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,36 @@
+"""Report MongoDB indexes that recorded no use, from $indexStats.
+
+The counters start at zero whenever mongod restarts and are kept per node,
+so an index is only reported as unused once its counters have run for
+--min-age-days; younger ones are listed separately. Run it against the
+primary after the application has been up for a while.
+
+Usage:
+    python index_report.py [--min-age-days 14]
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+
+from server import client, db, index_usage
+
+
+async def main(args) -> None:
+    report = await index_usage(db, timedelta(days=args.min_age_days))
+    for collection_name, entry in report.items():
+        if entry.get("error"):
+            print(f"  {collection_name}: {entry['error']}")
+        if entry["unused"]:
+            print(f"  {collection_name}: sin uso → {', '.join(entry['unused'])}")
+        if entry["too_recent"]:
+            print(f"  {collection_name}: contadores demasiado recientes → {', '.join(entry['too_recent'])}")
+    unused = sum(len(entry["unused"]) for entry in report.values())
+    print(f"✓ {unused} índices sin uso en al menos {args.min_age_days} días")
+    client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='List declared indexes with no recorded use')
+    parser.add_argument('--min-age-days', type=float, default=14,
+                        help='only report indexes whose usage counters are at least this old')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,202 @@
+"""Request, MongoDB and PDF timings in Prometheus text format, plus a Server-Timing header.
+
+The hot path only does a bucket lookup and a couple of additions: histograms
+keep per-bucket counts and are made cumulative when /metrics is scraped. The
+breakdown of the request being served lives in a context variable; Motor
+copies the context into the threads that run its commands, so the command
+listener adds database time to the request that issued it.
+"""
+import bisect
+import contextvars
+import math
+import threading
+import time
+from collections import defaultdict
+
+from pymongo import monitoring
+
+# Seconds; Prometheus' defaults stretched to cover PDF renders and slow aggregations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Time spent per component while serving one request"""
+
+    __slots__ = ("started", "durations", "calls")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def header(self) -> str:
+        parts = [
+            f'{name};desc="{self.calls[name]}x";dur={seconds * 1000:.1f}'
+            for name, seconds in self.durations.items()
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """Add to the current request's Server-Timing entry; a no-op outside requests"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.durations[name] += seconds
+        timings.calls[name] += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Labelled histograms and counters, rendered in the Prometheus text exposition format"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Observations come from the event loop and from Motor's executor threads
+        self._lock = threading.Lock()
+        self._histograms = {}  # name -> (help, label names, {label values: [bucket counts..., sum]})
+        self._counters = {}  # name -> (help, label names, {label values: count})
+
+    def histogram(self, name: str, help_text: str, label_names) -> None:
+        self._histograms.setdefault(name, (help_text, tuple(label_names), {}))
+
+    def counter(self, name: str, help_text: str, label_names) -> None:
+        self._counters.setdefault(name, (help_text, tuple(label_names), {}))
+
+    def observe(self, name: str, labels: tuple, seconds: float) -> None:
+        series = self._histograms[name][2]
+        # Bucket upper bounds are inclusive (le)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            values = series.get(labels)
+            if values is None:
+                values = series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += seconds
+
+    def inc(self, name: str, labels: tuple, amount: int = 1) -> None:
+        series = self._counters[name][2]
+        with self._lock:
+            series[labels] = series.get(labels, 0) + amount
+
+    def render(self, gauges: dict = None, totals: dict = None) -> str:
+        """Exposition text plus unlabelled values kept elsewhere, each a name -> (help, value) map:
+        gauges for point-in-time values, totals for running counts (names ending in _total)"""
+        with self._lock:
+            histograms = {name: (h, names, {k: list(v) for k, v in series.items()})
+                          for name, (h, names, series) in self._histograms.items()}
+            counters = {name: (h, names, dict(series)) for name, (h, names, series) in self._counters.items()}
+
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        lines = []
+        for name, (help_text, names, series) in histograms.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for labels, values in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(bounds, values):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{_labels(names, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, labels)} {_number(values[-1])}")
+                lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+        for name, (help_text, names, series) in counters.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for labels, count in sorted(series.items()):
+                lines.append(f"{name}{_labels(names, labels)} {count}")
+        for name, (help_text, value) in (totals or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {_number(value)}"]
+        for name, (help_text, value) in (gauges or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Command durations per collection and command name, also added to the request's db timing"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        registry.histogram("mongodb_command_duration_seconds", "MongoDB command round trips", ("collection", "command"))
+        registry.counter("mongodb_command_failures_total", "MongoDB commands that returned an error", ("collection", "command"))
+        # request id -> collection; succeeded/failed events do not carry the command
+        self._collections = {}
+
+    def started(self, event):
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._collections[event.request_id] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        self.registry.inc("mongodb_command_failures_total", labels)
+
+    def _finish(self, event) -> tuple:
+        labels = (self._collections.pop(event.request_id, ""), event.command_name)
+        seconds = event.duration_micros / 1e6
+        self.registry.observe("mongodb_command_duration_seconds", labels, seconds)
+        record_timing("db", seconds)
+        return labels
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request per route template and adding Server-Timing"""
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+        registry.histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+        self._routes = None  # endpoint -> path template, built on first request
+
+    def _route(self, scope) -> str:
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        # Templates rather than raw paths keep one series per route, not per id
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timings.header().encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            self.registry.observe(
+                "http_request_duration_seconds",
+                (scope["method"], self._route(scope), str(status)),
+                time.perf_counter() - timings.started
+            )
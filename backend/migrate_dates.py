@@ -0,0 +1,95 @@
+"""One-shot migration of created_at/updated_at from ISO strings to native BSON dates.
+
+Safe to interrupt and re-run: only documents whose date fields are still
+strings are touched, and they are walked in _id order in fixed-size batches.
+
+Usage:
+    python migrate_dates.py [--batch-size 1000] [--dry-run] [--collections users clients ...]
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DATE_FIELDS = {
+    'users': ['created_at'],
+    'clients': ['created_at', 'updated_at'],
+    'foods': ['created_at'],
+    'diets': ['created_at', 'updated_at'],
+}
+
+
+def parse_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    # Strings written without an offset were always UTC
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def migrate_collection(collection, fields, batch_size: int, dry_run: bool) -> tuple:
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+    migrated = 0
+    failed = 0
+    last_id = None
+
+    while True:
+        batch_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+        docs = await collection.find(batch_query, projection).sort("_id", 1).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]['_id']
+
+        operations = []
+        for doc in docs:
+            changes = {}
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    changes[field] = parse_date(value)
+                except ValueError:
+                    failed += 1
+                    print(f'  ✗ {collection.name} {doc["_id"]}: {field}={value!r} no es una fecha ISO')
+            if changes:
+                # Match on the old values so a concurrent write is never overwritten
+                match = {"_id": doc['_id'], **{field: doc[field] for field in changes}}
+                operations.append(UpdateOne(match, {"$set": changes}))
+
+        if operations and not dry_run:
+            await collection.bulk_write(operations, ordered=False)
+        migrated += len(operations)
+        print(f'  … {collection.name}: {migrated} documentos')
+
+    return migrated, failed
+
+
+async def migrate(batch_size: int, dry_run: bool, collections) -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+
+    for name in collections:
+        migrated, failed = await migrate_collection(db[name], DATE_FIELDS[name], batch_size, dry_run)
+        suffix = ' (dry run)' if dry_run else ''
+        print(f'✓ {name}: {migrated} documentos migrados, {failed} errores{suffix}')
+
+    client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert ISO string dates to native BSON dates')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--collections', nargs='+', choices=list(DATE_FIELDS), default=list(DATE_FIELDS))
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.dry_run, args.collections))
@@ -0,0 +1,128 @@
+"""Energy expenditure formulas, in scalar form for the API and vectorised form for batch jobs."""
+import hashlib
+import json
+from functools import lru_cache
+
+import numpy as np
+
+ACTIVITY_MULTIPLIERS = {
+    "sedentaria": 1.2,
+    "ligera": 1.375,
+    "moderada": 1.55,
+    "alta": 1.725,
+    "muy_alta": 1.9
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.2
+
+# ============ BMR FORMULAS ============
+# Every formula takes arrays (or scalars): male mask, weight kg, height cm, age years,
+# body fat % (NaN when unknown) and returns kcal/day.
+
+BMR_FORMULAS = {}
+DEFAULT_BMR_FORMULA = "harris_benedict"
+
+
+def bmr_formula(name: str):
+    def register(fn):
+        BMR_FORMULAS[name] = fn
+        return fn
+    return register
+
+
+@bmr_formula("harris_benedict")
+def harris_benedict(male, weight, height, age, body_fat):
+    return np.where(
+        male,
+        66.5 + 13.75 * weight + 5.003 * height - 6.75 * age,
+        655.1 + 9.563 * weight + 1.850 * height - 4.676 * age
+    )
+
+
+@bmr_formula("mifflin_st_jeor")
+def mifflin_st_jeor(male, weight, height, age, body_fat):
+    return 10 * weight + 6.25 * height - 5 * age + np.where(male, 5, -161)
+
+
+@bmr_formula("katch_mcardle")
+def katch_mcardle(male, weight, height, age, body_fat):
+    """Lean-mass based; falls back to Mifflin-St Jeor where body fat is unknown"""
+    lean_mass = weight * (1 - body_fat / 100)
+    return np.where(np.isnan(body_fat), mifflin_st_jeor(male, weight, height, age, body_fat), 370 + 21.6 * lean_mass)
+
+
+@bmr_formula("cunningham")
+def cunningham(male, weight, height, age, body_fat):
+    """Lean-mass based, for athletes; falls back to Mifflin-St Jeor where body fat is unknown"""
+    lean_mass = weight * (1 - body_fat / 100)
+    return np.where(np.isnan(body_fat), mifflin_st_jeor(male, weight, height, age, body_fat), 500 + 22 * lean_mass)
+
+
+def _as_body_fat(body_fat) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in np.atleast_1d(body_fat)], dtype=float)
+
+
+def calculate_tmb(sex: str, weight: float, height: float, age: int,
+                  formula: str = DEFAULT_BMR_FORMULA, body_fat: float = None) -> float:
+    """Calculate Basal Metabolic Rate (Harris-Benedict equation unless another formula is given)"""
+    male = sex.upper() == 'H'
+    return float(BMR_FORMULAS[formula](male, weight, height, age, _as_body_fat(body_fat)[0]))
+
+
+def calculate_maintenance_kcal(tmb: float, activity_level: str) -> float:
+    """Calculate maintenance calories based on activity level"""
+    return tmb * ACTIVITY_MULTIPLIERS.get(activity_level, DEFAULT_ACTIVITY_MULTIPLIER)
+
+
+def calculate_tmb_batch(sex: np.ndarray, weight: np.ndarray, height: np.ndarray, age: np.ndarray,
+                        formula: str = DEFAULT_BMR_FORMULA, body_fat=None) -> np.ndarray:
+    """BMR over arrays of clients in one pass"""
+    male = np.char.upper(sex.astype(str)) == 'H'
+    body_fat = np.full(len(weight), np.nan) if body_fat is None else _as_body_fat(body_fat)
+    return BMR_FORMULAS[formula](male, weight, height, age, body_fat)
+
+
+def activity_multiplier_batch(activity_levels) -> np.ndarray:
+    return np.array([ACTIVITY_MULTIPLIERS.get(level, DEFAULT_ACTIVITY_MULTIPLIER) for level in activity_levels])
+
+# ============ PROJECTIONS ============
+
+# Bump when the table layout or the goal adjustments change
+PROJECTION_VERSION = 1
+PROJECTION_WEIGHT_RANGE = 10.0  # kg either side of the current weight
+PROJECTION_WEIGHT_STEP = 1.0
+PROJECTION_GOALS = {"cut_kcal": -0.20, "bulk_kcal": 0.10}  # relative to maintenance
+
+
+def projection_key(formula: str, sex: str, weight: float, height: float, age: int,
+                   activity_level: str, body_fat) -> str:
+    """Stable hash of every input of a projection table; stored to skip recomputation"""
+    inputs = [PROJECTION_VERSION, formula, sex.upper(), weight, height, age, activity_level, body_fat]
+    return hashlib.sha1(json.dumps(inputs).encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def _projection_table(formula, sex, weight, height, age, activity_level, body_fat) -> tuple:
+    weights = np.arange(
+        max(weight - PROJECTION_WEIGHT_RANGE, PROJECTION_WEIGHT_STEP),
+        weight + PROJECTION_WEIGHT_RANGE + PROJECTION_WEIGHT_STEP / 2,
+        PROJECTION_WEIGHT_STEP
+    )
+    count = len(weights)
+    tmb = calculate_tmb_batch(
+        np.full(count, sex), weights, np.full(count, float(height)), np.full(count, float(age)),
+        formula, [body_fat] * count
+    )
+    maintenance = tmb * ACTIVITY_MULTIPLIERS.get(activity_level, DEFAULT_ACTIVITY_MULTIPLIER)
+    columns = {"weight": weights, "tmb": tmb, "maintenance_kcal": maintenance}
+    columns.update({goal: maintenance * (1 + change) for goal, change in PROJECTION_GOALS.items()})
+    return tuple(
+        {name: round(float(values[row]), 1) for name, values in columns.items()}
+        for row in range(count)
+    )
+
+
+def project_targets(formula: str, sex: str, weight: float, height: float, age: int,
+                    activity_level: str, body_fat=None) -> list:
+    """kcal targets (maintenance, cut, bulk) across a weight range around the current weight"""
+    table = _projection_table(formula, sex.upper(), float(weight), float(height), age, activity_level, body_fat)
+    return [dict(row) for row in table]
@@ -0,0 +1,199 @@
+"""ReportLab rendering for diet PDFs.
+
+Kept free of database and web imports so it can run inside the render
+worker processes started by server.py.
+"""
+import time
+from io import BytesIO
+from pathlib import Path
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
+from reportlab.lib.enums import TA_CENTER
+
+LOGO_PATH = Path(__file__).parent / "assets" / "logo.png"
+
+# Bump whenever the layout changes so cached PDFs are not served stale
+PDF_TEMPLATE_VERSION = "1"
+
+TOTAL_FIELDS = ["total_kcal", "total_protein", "total_carbs", "total_fats"]
+
+
+def _styles() -> dict:
+    return {
+        "title": ParagraphStyle(
+            "Title",
+            fontSize=22,
+            alignment=TA_CENTER,
+            fontName="Helvetica-Bold",
+            spaceAfter=20
+        ),
+        "meal": ParagraphStyle(
+            "MealTitle",
+            fontSize=14,
+            fontName="Helvetica-Bold",
+            spaceAfter=10
+        ),
+        "day": ParagraphStyle(
+            "DayTitle",
+            fontSize=18,
+            fontName="Helvetica-Bold",
+            spaceAfter=14
+        ),
+    }
+
+
+def _document(buffer: BytesIO) -> SimpleDocTemplate:
+    return SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2 * cm,
+        leftMargin=2 * cm,
+        topMargin=2 * cm,
+        bottomMargin=2 * cm
+    )
+
+
+def _header(title: str, styles: dict) -> list:
+    # Logo (optional)
+    if LOGO_PATH.exists():
+        logo = Image(str(LOGO_PATH), width=3 * cm, height=3 * cm)
+    else:
+        logo = ""
+
+    header = Table([[Paragraph(title, styles["title"]), logo]], colWidths=[12 * cm, 4 * cm])
+    header.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("ALIGN", (1, 0), (1, 0), "RIGHT"),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
+    ]))
+    return [header, Spacer(1, 0.5 * cm)]
+
+
+def _meal(meal: dict, styles: dict) -> list:
+    story = [Paragraph(meal["meal_name"].upper(), styles["meal"])]
+
+    # Foods table
+    food_table_data = [["Alimento", "Cantidad (g)"]]
+    for food in meal["foods"]:
+        food_table_data.append([
+            food["food_name"],
+            f"{food['quantity_g']:.0f}"
+        ])
+
+    food_table = Table(
+        food_table_data,
+        colWidths=[10 * cm, 4 * cm]
+    )
+    food_table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.black),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("ALIGN", (1, 1), (-1, -1), "CENTER"),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+    ]))
+    story.append(food_table)
+    story.append(Spacer(1, 0.2 * cm))
+
+    # Meal totals table
+    totals_meal_data = [
+        ["Kcal", "Proteínas", "Carbohidratos", "Grasas"],
+        [
+            f"{meal['total_kcal']:.0f}",
+            f"{meal['total_protein']:.1f} g",
+            f"{meal['total_carbs']:.1f} g",
+            f"{meal['total_fats']:.1f} g",
+        ]
+    ]
+    totals_meal_table = Table(
+        totals_meal_data,
+        colWidths=[4 * cm, 4 * cm, 4 * cm, 4 * cm]
+    )
+    totals_meal_table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ]))
+    story.append(totals_meal_table)
+    story.append(Spacer(1, 0.6 * cm))
+    return story
+
+
+def _totals(title: str, totals: dict, styles: dict) -> list:
+    daily_totals = [
+        ["Calorías", "Proteínas", "Carbohidratos", "Grasas"],
+        [
+            f"{totals['total_kcal']:.0f} kcal",
+            f"{totals['total_protein']:.1f} g",
+            f"{totals['total_carbs']:.1f} g",
+            f"{totals['total_fats']:.1f} g",
+        ]
+    ]
+
+    daily_table = Table(daily_totals, colWidths=[4 * cm] * 4)
+    daily_table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.black),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+    ]))
+    return [Paragraph(title, styles["meal"]), daily_table]
+
+
+def render_diet_pdf(diet: dict, client_name: str) -> bytes:
+    """Render a diet (meals and daily totals) as PDF bytes"""
+    buffer = BytesIO()
+    styles = _styles()
+    story = _header(f"DIETA – {client_name}", styles)
+    for meal in diet["meals"]:
+        story += _meal(meal, styles)
+    story += _totals("TOTALES DIARIOS", diet, styles)
+
+    _document(buffer).build(story)
+    return buffer.getvalue()
+
+
+def render_plan_pdf(plan: dict, client_name: str) -> bytes:
+    """Render a multi-day plan as one PDF: a page per day, then the weekly totals"""
+    buffer = BytesIO()
+    styles = _styles()
+    meals = {meal["id"]: meal for meal in plan["meals"]}
+    story = _header(f"{plan['name'].upper()} – {client_name}", styles)
+    for number, day in enumerate(plan["days"]):
+        if number:
+            story.append(PageBreak())
+        story.append(Paragraph(day["name"].upper(), styles["day"]))
+        for meal_id in day["meal_ids"]:
+            story += _meal(meals[meal_id], styles)
+        story += _totals("TOTALES DEL DÍA", day, styles)
+
+    story.append(PageBreak())
+    story += _totals(f"TOTALES DEL PLAN ({len(plan['days'])} DÍAS)", plan, styles)
+    days = max(len(plan["days"]), 1)
+    story.append(Spacer(1, 0.6 * cm))
+    story += _totals("MEDIA DIARIA", {key: plan[key] / days for key in TOTAL_FIELDS}, styles)
+
+    _document(buffer).build(story)
+    return buffer.getvalue()
+
+
+def timed_render_diet_pdf(diet: dict, client_name: str) -> tuple:
+    """Worker entry point: returns (render seconds, PDF bytes)"""
+    started = time.perf_counter()
+    pdf = render_diet_pdf(diet, client_name)
+    return time.perf_counter() - started, pdf
+
+
+def timed_render_plan_pdf(plan: dict, client_name: str) -> tuple:
+    """Worker entry point for plans: returns (render seconds, PDF bytes)"""
+    started = time.perf_counter()
+    pdf = render_plan_pdf(plan, client_name)
+    return time.perf_counter() - started, pdf
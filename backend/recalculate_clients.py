@@ -0,0 +1,157 @@
+"""Batch recalculation of client TMB and maintenance calories.
+
+Streams clients from MongoDB in chunks, recomputes each chunk with NumPy in
+a single vectorised pass per BMR formula (the client's own, else its
+trainer's default) and writes only the changed clients back, with refreshed
+weight projections, in an unordered bulk_write. Each write is pinned to the
+version that was read and bumps it, so a client edited meanwhile is skipped
+(its own update already recomputed it) instead of overwritten.
+
+Usage:
+    python recalculate_clients.py [--trainer-id ID] [--batch-size 2000] [--dry-run] [--show 20]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from nutrition import (
+    calculate_tmb_batch, activity_multiplier_batch, project_targets, projection_key, DEFAULT_BMR_FORMULA
+)
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+CLIENT_PROJECTION = {
+    "_id": 1, "id": 1, "name": 1, "sex": 1, "weight": 1, "height": 1, "age": 1,
+    "activity_level": 1, "body_fat_percentage": 1, "bmr_formula": 1, "trainer_id": 1,
+    "tmb": 1, "maintenance_kcal": 1, "version": 1,
+}
+# Differences below this (kcal) are float noise, not a formula change
+TOLERANCE = 0.01
+
+
+def recalculate_chunk(clients: list, formulas: list) -> tuple:
+    """Return (changed mask, new tmb, new maintenance, old tmb, old maintenance) for a chunk"""
+    sex = np.array([c.get('sex', '') for c in clients])
+    weight = np.array([c['weight'] for c in clients], dtype=float)
+    height = np.array([c['height'] for c in clients], dtype=float)
+    age = np.array([c['age'] for c in clients], dtype=float)
+    body_fat = [c.get('body_fat_percentage') for c in clients]
+
+    formulas = np.array(formulas)
+    tmb = np.empty(len(clients))
+    for formula in np.unique(formulas):
+        rows = np.flatnonzero(formulas == formula)
+        tmb[rows] = calculate_tmb_batch(
+            sex[rows], weight[rows], height[rows], age[rows], str(formula), [body_fat[i] for i in rows]
+        )
+    maintenance = tmb * activity_multiplier_batch([c.get('activity_level') for c in clients])
+
+    old_tmb = np.array([c.get('tmb') if c.get('tmb') is not None else np.nan for c in clients], dtype=float)
+    old_maintenance = np.array(
+        [c.get('maintenance_kcal') if c.get('maintenance_kcal') is not None else np.nan for c in clients],
+        dtype=float
+    )
+    # NaN (missing) old values compare as changed
+    changed = ~(np.abs(tmb - old_tmb) <= TOLERANCE) | ~(np.abs(maintenance - old_maintenance) <= TOLERANCE)
+    return changed, tmb, maintenance, old_tmb, old_maintenance
+
+
+async def recalculate(db, trainer_id=None, batch_size: int = 2000, dry_run: bool = False, show: int = 20,
+                      inherited_only: bool = False, log=print) -> dict:
+    """inherited_only limits the run to clients following their trainer's default formula"""
+    # Tombstoned clients are about to be purged by the server's cascade worker
+    query = {"deleted_at": None}
+    if trainer_id:
+        query["trainer_id"] = trainer_id
+    if inherited_only:
+        query["bmr_formula"] = None
+    totals = {"processed": 0, "changed": 0, "skipped": 0}
+    shown = 0
+    started = time.perf_counter()
+    trainer_formulas = {
+        user['id']: user.get('bmr_formula') or DEFAULT_BMR_FORMULA
+        async for user in db.users.find({"id": trainer_id} if trainer_id else {}, {"_id": 0, "id": 1, "bmr_formula": 1})
+    }
+
+    async def flush(chunk):
+        nonlocal shown
+        formulas = [
+            c.get('bmr_formula') or trainer_formulas.get(c.get('trainer_id'), DEFAULT_BMR_FORMULA)
+            for c in chunk
+        ]
+        changed, tmb, maintenance, old_tmb, old_maintenance = recalculate_chunk(chunk, formulas)
+        now = datetime.now(timezone.utc)
+        operations = []
+        for index in np.flatnonzero(changed):
+            client = chunk[index]
+            if dry_run and shown < show:
+                shown += 1
+                log(
+                    f"  {client.get('name', client['id'])}: "
+                    f"TMB {old_tmb[index]:.1f} → {tmb[index]:.1f}, "
+                    f"mantenimiento {old_maintenance[index]:.1f} → {maintenance[index]:.1f}"
+                )
+            inputs = (
+                formulas[index], client['sex'], client['weight'], client['height'], client['age'],
+                client.get('activity_level'), client.get('body_fat_percentage')
+            )
+            operations.append(UpdateOne(
+                # None also matches clients stored before versioning
+                {"_id": client['_id'], "version": client.get('version')},
+                {"$inc": {"version": 1}, "$set": {
+                    "tmb": float(tmb[index]),
+                    "maintenance_kcal": float(maintenance[index]),
+                    "projections": project_targets(*inputs),
+                    "projection_key": projection_key(*inputs),
+                    "updated_at": now,
+                }}
+            ))
+        applied = len(operations)
+        if operations and not dry_run:
+            result = await db.clients.bulk_write(operations, ordered=False)
+            applied = result.matched_count
+
+        totals["processed"] += len(chunk)
+        totals["changed"] += applied
+        totals["skipped"] += len(operations) - applied
+        elapsed = time.perf_counter() - started
+        log(f"… {totals['processed']} clientes procesados, {totals['changed']} con cambios, "
+            f"{totals['skipped']} modificados entretanto ({totals['processed'] / max(elapsed, 1e-9):.0f}/s)")
+
+    chunk = []
+    async for client in db.clients.find(query, CLIENT_PROJECTION).batch_size(batch_size):
+        chunk.append(client)
+        if len(chunk) >= batch_size:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+    return totals
+
+
+async def main(args) -> None:
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    totals = await recalculate(db, args.trainer_id, args.batch_size, args.dry_run, args.show)
+    suffix = ' (dry run, nada escrito)' if args.dry_run else ''
+    print(f"✓ {totals['processed']} clientes, {totals['changed']} actualizados, "
+          f"{totals['skipped']} omitidos por haber cambiado durante el recálculo{suffix}")
+    client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recompute tmb and maintenance_kcal for every client')
+    parser.add_argument('--trainer-id', help='only recalculate this trainer\'s clients')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--dry-run', action='store_true', help='print a diff instead of writing')
+    parser.add_argument('--show', type=int, default=20, help='diff lines to print in dry-run mode')
+    asyncio.run(main(parser.parse_args()))
@@ -1,25 +1,51 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ASCENDING, InsertOne, UpdateOne, DeleteOne, ReturnDocument
+from pymongo.errors import OperationFailure, BulkWriteError, CollectionInvalid
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError, model_validator
+from typing import Dict, List, Optional, Literal
+import abc
 import uuid
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import hashlib
+import hmac
+import json
+import shutil
+import io
+import re
+import zipfile
+import base64
+import bisect
+import math
+import itertools
+import unicodedata
+from collections import defaultdict, Counter
 from datetime import datetime, timezone, timedelta
 import bcrypt
+import numpy as np
 import jwt
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from io import BytesIO
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from pypdf import PdfWriter
+from pdf_render import timed_render_diet_pdf, timed_render_plan_pdf, PDF_TEMPLATE_VERSION, TOTAL_FIELDS
+from diet_history import revision_state, diff_diet, apply_delta
+from diet_solver import macro_targets, per_gram_matrix, solve_quantities, scale_template
+from food_io import FOOD_COLUMNS, FOOD_FORMATS, iter_rows, format_foods
+from metrics import MetricsRegistry, MetricsMiddleware, MongoCommandListener, record_timing
+from recalculate_clients import recalculate as recalculate_clients
+from nutrition import calculate_tmb, calculate_maintenance_kcal, project_targets, projection_key, BMR_FORMULAS, DEFAULT_BMR_FORMULA
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -31,9 +57,64 @@ SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-product
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Authenticated-user cache
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', '60'))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', '1024'))
+
+# Password hashing
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', '2'))
+PASSWORD_QUEUE_MAX = int(os.environ.get('PASSWORD_QUEUE_MAX', '64'))
+
+# PDF rendering
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_RENDER_MAX_CONCURRENCY = int(os.environ.get('PDF_RENDER_MAX_CONCURRENCY', str(max(1, PDF_RENDER_WORKERS) * 2)))
+PDF_RENDER_TIMEOUT_SECONDS = float(os.environ.get('PDF_RENDER_TIMEOUT_SECONDS', '30'))
+
+# PDF cache
+PDF_CACHE_BACKEND = os.environ.get('PDF_CACHE_BACKEND', 'disk')  # disk, memory or none
+PDF_CACHE_DIR = Path(os.environ.get('PDF_CACHE_DIR', str(ROOT_DIR / 'pdf_cache')))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+BULK_EXPORT_MAX_DIETS = int(os.environ.get('BULK_EXPORT_MAX_DIETS', '500'))
+
+# Food search
+FOOD_INDEX_MAX_TRAINERS = int(os.environ.get('FOOD_INDEX_MAX_TRAINERS', '256'))
+
+# Bulk food import (rows per insert_many/bulk_write and error rows kept in the report)
+FOOD_IMPORT_BATCH_SIZE = int(os.environ.get('FOOD_IMPORT_BATCH_SIZE', '1000'))
+FOOD_IMPORT_MAX_ERRORS = int(os.environ.get('FOOD_IMPORT_MAX_ERRORS', '1000'))
+
+# Batch write endpoint
+BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', '500'))
+
+# Multi-day plans
+PLAN_MAX_DAYS = int(os.environ.get('PLAN_MAX_DAYS', '14'))
+
+# Client check-ins (trend = mean of the latest N weigh-ins; cap on points per series response)
+CHECKIN_TREND_POINTS = int(os.environ.get('CHECKIN_TREND_POINTS', '7'))
+CHECKIN_MAX_POINTS = int(os.environ.get('CHECKIN_MAX_POINTS', '5000'))
+
+# Diet history: every Nth version is stored in full, the rest as deltas against the previous version
+DIET_SNAPSHOT_INTERVAL = int(os.environ.get('DIET_SNAPSHOT_INTERVAL', '10'))
+
+# Background cleanup of deleted clients (diets removed per batch, sweep for leftovers)
+CASCADE_BATCH_SIZE = int(os.environ.get('CASCADE_BATCH_SIZE', '500'))
+CASCADE_SWEEP_INTERVAL_SECONDS = float(os.environ.get('CASCADE_SWEEP_INTERVAL_SECONDS', '300'))
+CASCADE_MAX_RETRIES = int(os.environ.get('CASCADE_MAX_RETRIES', '5'))
+
+# Metrics: latency histograms at /metrics (Prometheus text) and a Server-Timing header per response
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # /metrics requires "Authorization: Bearer <token>"; unset, it is off
+metrics_registry = MetricsRegistry()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_INDEX_MODE = os.environ.get('MONGO_INDEX_MODE', 'ensure')  # ensure, check or off
+MONGO_INDEX_STRICT = os.environ.get('MONGO_INDEX_STRICT', 'false').lower() in ('1', 'true', 'yes')
+client = AsyncIOMotorClient(
+    mongo_url, tz_aware=True,
+    event_listeners=[MongoCommandListener(metrics_registry)] if METRICS_ENABLED else []
+)
 db = client[os.environ['DB_NAME']]
 
 # Security
@@ -54,7 +135,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+if METRICS_ENABLED:
+    # Added last so it is outermost and times the whole stack
+    app.add_middleware(MetricsMiddleware, registry=metrics_registry)
 api_router = APIRouter(prefix="/api")
 
 # ============ MODELS ============
@@ -64,6 +149,7 @@ class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     email: EmailStr
     name: str
+    bmr_formula: str = DEFAULT_BMR_FORMULA  # default for clients without their own formula
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserCreate(BaseModel):
@@ -75,11 +161,22 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class UserSettingsUpdate(BaseModel):
+    name: Optional[str] = None
+    bmr_formula: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
     user: User
 
+class WeightProjection(BaseModel):
+    weight: float
+    tmb: float
+    maintenance_kcal: float
+    cut_kcal: float
+    bulk_kcal: float
+
 class Client(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -90,14 +187,19 @@ class Client(BaseModel):
     weight: float  # kg
     height: float  # cm
     activity_level: str  # sedentaria, ligera, moderada, alta, muy_alta
+    body_fat_percentage: Optional[float] = None
+    bmr_formula: Optional[str] = None  # None uses the trainer's default formula
     tmb: Optional[float] = None
     maintenance_kcal: Optional[float] = None
     target_kcal: Optional[float] = None
     protein_percentage: Optional[float] = 30.0
     carbs_percentage: Optional[float] = 40.0
     fats_percentage: Optional[float] = 30.0
+    projections: Optional[List[WeightProjection]] = None  # precomputed kcal targets across a weight range
+    projection_key: Optional[str] = None  # hash of the inputs the projections were computed from
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0  # bumped by every update; exposed as the ETag
 
 class ClientCreate(BaseModel):
     name: str
@@ -106,6 +208,8 @@ class ClientCreate(BaseModel):
     weight: float
     height: float
     activity_level: str
+    body_fat_percentage: Optional[float] = None
+    bmr_formula: Optional[str] = None
     protein_percentage: Optional[float] = 30.0
     carbs_percentage: Optional[float] = 40.0
     fats_percentage: Optional[float] = 30.0
@@ -117,6 +221,8 @@ class ClientUpdate(BaseModel):
     weight: Optional[float] = None
     height: Optional[float] = None
     activity_level: Optional[str] = None
+    body_fat_percentage: Optional[float] = None
+    bmr_formula: Optional[str] = None
     tmb: Optional[float] = None
     maintenance_kcal: Optional[float] = None
     target_kcal: Optional[float] = None
@@ -134,6 +240,7 @@ class Food(BaseModel):
     fats_per_100g: float
     created_by: str  # trainer_id
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0  # bumped by every update; exposed as the ETag
 
 class FoodCreate(BaseModel):
     name: str
@@ -173,20 +280,292 @@ class Diet(BaseModel):
     total_fats: float
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0  # bumped by every update; exposed as the ETag
+
+class FoodItemInput(BaseModel):
+    food_id: str
+    quantity_g: float = Field(..., ge=0)
+
+class MealInput(BaseModel):
+    meal_number: int
+    meal_name: str
+    foods: List[FoodItemInput]
 
 class DietCreate(BaseModel):
+    # Only food ids and grams are read; names and macros are computed server-side
     client_id: str
     name: str
-    meals: List[Meal]
+    meals: List[MealInput]
+
+class DietSummary(BaseModel):
+    """A diet without its meals"""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    client_id: str
+    name: str
+    total_kcal: float
+    total_protein: float
+    total_carbs: float
+    total_fats: float
+    created_at: datetime
+    updated_at: datetime
+    version: int = 0
+
+class ClientDetail(BaseModel):
+    client: Client
+    diets: List[DietSummary]
+
+class DietRevision(BaseModel):
+    version: int
+    snapshot: bool  # full copy; otherwise a delta against the previous version
+    name: str
+    total_kcal: float
+    created_at: datetime
+
+class DietFood(FoodCreate):
+    id: str
+
+class DietDetail(BaseModel):
+    diet: Diet
+    client: Client
+    foods: List[DietFood]  # only the foods the diet references
+
+class GeneratedMealTemplate(BaseModel):
+    meal_name: str
+    kcal_share: float = Field(..., gt=0)  # relative share of the daily target, normalised over meals
+    food_ids: Optional[List[str]] = None  # candidates for this meal; defaults to the request's set
+
+class DietGenerateRequest(BaseModel):
+    client_id: str
+    name: str
+    meals: List[GeneratedMealTemplate] = Field(..., min_length=1)
+    food_ids: Optional[List[str]] = None  # candidate food set; defaults to the whole library
+    max_foods_per_meal: int = Field(4, ge=1, le=10)
+    min_g: float = Field(10, ge=0)
+    max_g: float = Field(400, gt=0)
+    step_g: float = Field(5, gt=0)
+    save: bool = False  # store the diet instead of only returning it for review
+
+    @model_validator(mode="after")
+    def check_bounds(self):
+        if self.min_g > self.max_g:
+            raise ValueError("min_g must not exceed max_g")
+        return self
+
+class DietTemplate(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    trainer_id: str
+    name: str
+    meals: List[MealInput]  # base quantities, scaled per client when applied
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0
+
+class DietTemplateCreate(BaseModel):
+    name: str
+    meals: Optional[List[MealInput]] = None
+    diet_id: Optional[str] = None  # copy the meals of an existing diet instead
+
+class TemplateApplyRequest(BaseModel):
+    client_ids: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    name: Optional[str] = None  # diet name; defaults to the template's
+    step_g: float = Field(1, gt=0)  # rounding of the scaled quantities
+
+class PlanMealUpdate(BaseModel):
+    meal_name: str
+    foods: List[FoodItemInput]
+
+class PlanMealInput(PlanMealUpdate):
+    id: str = Field(..., min_length=1)  # referenced from days; unique within the plan
+
+class PlanDayInput(BaseModel):
+    name: str  # "Lunes", "Entreno", ...
+    meal_ids: List[str]
+
+class PlanCreate(BaseModel):
+    client_id: str
+    name: str
+    meals: List[PlanMealInput]
+    days: List[PlanDayInput] = Field(..., min_length=1, max_length=PLAN_MAX_DAYS)
+
+class PlanMeal(BaseModel):
+    id: str
+    meal_name: str
+    foods: List[FoodItem]
+    total_kcal: float
+    total_protein: float
+    total_carbs: float
+    total_fats: float
+
+class PlanDay(BaseModel):
+    name: str
+    meal_ids: List[str]
+    total_kcal: float
+    total_protein: float
+    total_carbs: float
+    total_fats: float
+
+class Plan(BaseModel):
+    """Several days built from shared meals; the totals cover the whole plan"""
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    client_id: str
+    trainer_id: str
+    name: str
+    meals: List[PlanMeal]
+    days: List[PlanDay]
+    total_kcal: float
+    total_protein: float
+    total_carbs: float
+    total_fats: float
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 0
+
+class CheckInCreate(BaseModel):
+    measured_at: Optional[datetime] = None  # defaults to now
+    weight: Optional[float] = Field(None, gt=0)  # kg
+    body_fat_percentage: Optional[float] = Field(None, ge=0, le=100)
+    waist_cm: Optional[float] = Field(None, gt=0)
+    hip_cm: Optional[float] = Field(None, gt=0)
+
+class CheckInBatch(BaseModel):
+    checkins: List[CheckInCreate] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+
+class CheckInResult(BaseModel):
+    inserted: int
+    client: Client  # with weight, TMB and maintenance moved to the new trend
+
+class CheckInPoint(BaseModel):
+    measured_at: datetime  # start of the bucket when downsampled
+    id: Optional[str] = None  # raw check-ins only
+    count: int = 1  # check-ins averaged into the point
+    weight: Optional[float] = None
+    body_fat_percentage: Optional[float] = None
+    waist_cm: Optional[float] = None
+    hip_cm: Optional[float] = None
+    # rolling means over the last `window` points
+    weight_trend: Optional[float] = None
+    body_fat_percentage_trend: Optional[float] = None
+    waist_cm_trend: Optional[float] = None
+    hip_cm_trend: Optional[float] = None
+
+class BulkExportRequest(BaseModel):
+    diet_ids: Optional[List[str]] = None
+    client_ids: Optional[List[str]] = None  # export every diet of these clients
+    format: Literal["zip", "pdf"] = "zip"  # zip of PDFs or a single merged PDF
+
+    @model_validator(mode="after")
+    def check_filter(self):
+        if self.diet_ids is None and self.client_ids is None:
+            raise ValueError("diet_ids or client_ids is required")
+        return self
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    collection: Literal["clients", "foods", "diets"]
+    id: Optional[str] = None  # required by update and delete
+    data: Optional[dict] = None  # body of the matching single-object route
+    version: Optional[int] = None  # like If-Match: reject the operation unless the stored version matches
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    transaction: bool = True  # all or nothing (needs a replica set); false applies what it can
+
+class BatchResult(BaseModel):
+    index: int
+    status: int
+    id: Optional[str] = None
+    data: Optional[dict] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult]
+
+class DietSnapshot(BaseModel):
+    id: str
+    client_id: str
+    name: str
+    total_kcal: float
+    created_at: datetime
+
+class ClientSummary(BaseModel):
+    diet_count: int = 0
+    latest_diet: Optional[DietSnapshot] = None
+
+class DashboardSummary(BaseModel):
+    client_count: int
+    diet_count: int
+    avg_target_kcal: Optional[float] = None  # mean target_kcal of the trainer's clients that have one
+    latest_diet: Optional[DietSnapshot] = None
+    # macro -> share of the diet's macro kcal, floored to 10% ("30") -> number of diets
+    macro_split: Dict[str, Dict[str, int]]
+    clients: Dict[str, ClientSummary]
 
 # ============ AUTH HELPERS ============
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+class PasswordWorkerPool:
+    """Runs bcrypt work on a dedicated, size-limited thread pool so it never blocks the event loop"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    async def run(self, fn, *args):
+        # Backpressure: refuse new work once every worker is busy and the queue is full
+        if self._in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many authentication requests, please retry",
+                headers={"Retry-After": "1"}
+            )
+        
+        submitted_at = time.perf_counter()
+        
+        def job():
+            return time.perf_counter() - submitted_at, fn(*args)
+        
+        self._in_flight += 1
+        try:
+            waited, result = await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._in_flight -= 1
+        
+        self.completed += 1
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        return result
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_seconds_total": self.queue_wait_total,
+            "queue_wait_seconds_max": self.queue_wait_max,
+        }
+
+password_pool = PasswordWorkerPool(PASSWORD_WORKERS, PASSWORD_QUEUE_MAX)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -194,9 +573,111 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class UserCache:
+    """Bounded TTL/LRU cache of authenticated users keyed by user id (the JWT `sub`)"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending: dict = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[User]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def put(self, user: User) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        self._entries[user.id] = (user, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, user_id: str, loader) -> Optional[User]:
+        """Return the cached user or load it once, sharing the lookup between concurrent callers"""
+        user = self.get(user_id)
+        if user is not None:
+            self.hits += 1
+            return user
+
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        generation = self._generation
+        pending = asyncio.ensure_future(loader(user_id))
+        self._pending[user_id] = pending
+        try:
+            user = await asyncio.shield(pending)
+        finally:
+            if self._pending.get(user_id) is pending:
+                del self._pending[user_id]
+        # Skip caching if the user was invalidated while the lookup was in flight
+        if user is not None and generation == self._generation:
+            self.put(user)
+        return user
+
+    def invalidate(self, user_id: str) -> None:
+        self._generation += 1
+        self.invalidations += 1
+        self._entries.pop(user_id, None)
+        self._pending.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+user_cache = UserCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a cached user; call whenever a user record is modified or deleted"""
+    user_cache.invalidate(user_id)
+
+async def load_user(user_id: str) -> Optional[User]:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    if user is None:
+        return None
+    
+    return User(**user)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    started = time.perf_counter()
+    try:
+        return await authenticate(credentials.credentials)
+    finally:
+        record_timing("auth", time.perf_counter() - started)
+
+async def authenticate(token: str) -> User:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
@@ -206,34 +687,187 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.JWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
     
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    user = await user_cache.get_or_load(user_id, load_user)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
-    if isinstance(user.get('created_at'), str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
-    
-    return User(**user)
+    return user
+
+# ============ ENERGY HELPERS ============
+
+ENERGY_INPUTS = ['weight', 'height', 'age', 'sex', 'activity_level', 'body_fat_percentage', 'bmr_formula']
 
-# ============ CALCULATION HELPERS ============
-
-def calculate_tmb(sex: str, weight: float, height: float, age: int) -> float:
-    """Calculate Basal Metabolic Rate using Harris-Benedict equation"""
-    if sex.upper() == 'H':
-        return 66.5 + (13.75 * weight) + (5.003 * height) - (6.75 * age)
-    else:  # M
-        return 655.1 + (9.563 * weight) + (1.850 * height) - (4.676 * age)
-
-def calculate_maintenance_kcal(tmb: float, activity_level: str) -> float:
-    """Calculate maintenance calories based on activity level"""
-    activity_multipliers = {
-        "sedentaria": 1.2,
-        "ligera": 1.375,
-        "moderada": 1.55,
-        "alta": 1.725,
-        "muy_alta": 1.9
+def check_bmr_formula(formula: Optional[str]) -> None:
+    if formula is not None and formula not in BMR_FORMULAS:
+        raise HTTPException(status_code=400, detail=f"Unknown BMR formula, use one of: {', '.join(BMR_FORMULAS)}")
+
+def client_projections(formula: str, sex: str, weight: float, height: float, age: int,
+                       activity_level: str, body_fat: Optional[float], previous_key: Optional[str] = None) -> dict:
+    """Projection table plus the key of its inputs, or {} when the stored table is still current"""
+    key = projection_key(formula, sex, weight, height, age, activity_level, body_fat)
+    if key == previous_key:
+        return {}
+    return {
+        "projections": project_targets(formula, sex, weight, height, age, activity_level, body_fat),
+        "projection_key": key,
     }
-    return tmb * activity_multipliers.get(activity_level, 1.2)
+
+def build_client(client_data: ClientCreate, user: User) -> Client:
+    """New client with TMB, maintenance calories and weight projections computed"""
+    check_bmr_formula(client_data.bmr_formula)
+    formula = client_data.bmr_formula or user.bmr_formula
+    
+    # Calculate TMB and maintenance calories
+    tmb = calculate_tmb(
+        client_data.sex, client_data.weight, client_data.height, client_data.age,
+        formula, client_data.body_fat_percentage
+    )
+    maintenance_kcal = calculate_maintenance_kcal(tmb, client_data.activity_level)
+    
+    return Client(
+        trainer_id=user.id,
+        name=client_data.name,
+        age=client_data.age,
+        sex=client_data.sex,
+        weight=client_data.weight,
+        height=client_data.height,
+        activity_level=client_data.activity_level,
+        body_fat_percentage=client_data.body_fat_percentage,
+        bmr_formula=client_data.bmr_formula,
+        tmb=tmb,
+        maintenance_kcal=maintenance_kcal,
+        target_kcal=maintenance_kcal,
+        protein_percentage=client_data.protein_percentage,
+        carbs_percentage=client_data.carbs_percentage,
+        fats_percentage=client_data.fats_percentage,
+        **client_projections(
+            formula, client_data.sex, client_data.weight, client_data.height, client_data.age,
+            client_data.activity_level, client_data.body_fat_percentage
+        )
+    )
+
+def client_update_fields(client: dict, update_data: dict, user: User) -> dict:
+    """$set fields for a client update, recomputing energy values when one of their inputs changed"""
+    check_bmr_formula(update_data.get('bmr_formula'))
+    
+    # Recalculate if needed
+    if any(k in update_data for k in ENERGY_INPUTS):
+        age = update_data.get('age', client['age'])
+        sex = update_data.get('sex', client['sex'])
+        weight = update_data.get('weight', client['weight'])
+        height = update_data.get('height', client['height'])
+        activity = update_data.get('activity_level', client['activity_level'])
+        body_fat = update_data.get('body_fat_percentage', client.get('body_fat_percentage'))
+        formula = update_data.get('bmr_formula', client.get('bmr_formula')) or user.bmr_formula
+        
+        if 'tmb' not in update_data:
+            update_data['tmb'] = calculate_tmb(sex, weight, height, age, formula, body_fat)
+        if 'maintenance_kcal' not in update_data:
+            update_data['maintenance_kcal'] = calculate_maintenance_kcal(update_data['tmb'], activity)
+        # Only rebuilt when one of its inputs actually changed
+        update_data.update(client_projections(
+            formula, sex, weight, height, age, activity, body_fat, client.get('projection_key')
+        ))
+    
+    update_data['updated_at'] = datetime.now(timezone.utc)
+    return update_data
+
+# ============ VERSION HELPERS ============
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Version demanded by an If-Match header; None when absent or '*'"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+def version_etag(doc: dict) -> str:
+    return f'"{doc.get("version", 0)}"'
+
+def version_filter(version: Optional[int]) -> dict:
+    if version is None:
+        return {}
+    # Documents written before versioning have no field and count as version 0
+    return {"version": version} if version else {"version": {"$in": [0, None]}}
+
+def check_version(doc: dict, expected: Optional[int]) -> None:
+    if expected is not None and doc.get("version", 0) != expected:
+        raise HTTPException(status_code=412, detail="Modified since it was read; reload and retry")
+
+async def find_and_update(collection, query: dict, update_data: dict, expected: Optional[int],
+                          return_document=ReturnDocument.AFTER) -> Optional[dict]:
+    """Atomic ownership- and version-checked update returning the new (or previous) document, or None on no match"""
+    return await collection.find_one_and_update(
+        {**query, **version_filter(expected)},
+        {"$set": update_data, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        return_document=return_document
+    )
+
+async def update_miss(collection, query: dict, expected: Optional[int], label: str) -> HTTPException:
+    """Tell a missing document (404) from a stale If-Match (412); only failed updates pay this read"""
+    if expected is not None and await collection.count_documents(query, limit=1):
+        return HTTPException(status_code=412, detail="Modified since it was read; reload and retry")
+    return HTTPException(status_code=404, detail=f"{label} not found")
+
+# ============ PAGINATION HELPERS ============
+
+def encode_cursor(doc: dict) -> str:
+    created_at = doc["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, last_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), last_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str], model) -> Optional[dict]:
+    """Turn a `fields=a,b` query parameter into a Mongo projection validated against the model"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # id and created_at are always returned because the cursor is built from them
+    projection = {"_id": 0, "id": 1, "created_at": 1}
+    projection.update({field: 1 for field in requested})
+    return projection
+
+async def find_page(collection, query: dict, limit: int, cursor: Optional[str], projection: Optional[dict]) -> tuple:
+    """Keyset pagination over (created_at, id); returns the page and the cursor of the next one"""
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "id": {"$gt": last_id}},
+        ]}]}
+    
+    docs = await collection.find(query, projection or {"_id": 0}) \
+        .sort([("created_at", 1), ("id", 1)]) \
+        .to_list(limit + 1)
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+    return docs, next_cursor
+
+def projected_page(docs: list, next_cursor: Optional[str]) -> JSONResponse:
+    """Projected pages bypass the response model, which would reject the missing fields"""
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return JSONResponse(jsonable_encoder(docs), headers=headers)
 
 # ============ AUTH ROUTES ============
 
@@ -245,11 +879,10 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user = User(email=user_data.email, name=user_data.name)
-    hashed_pw = hash_password(user_data.password)
+    hashed_pw = await password_pool.run(hash_password, user_data.password)
     
     doc = user.model_dump()
     doc['password'] = hashed_pw
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.users.insert_one(doc)
     return user
@@ -260,12 +893,9 @@ async def login(credentials: UserLogin):
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(credentials.password, user_doc['password']):
+    if not await password_pool.run(verify_password, credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
     user = User(**user_doc)
     access_token = create_access_token(data={"sub": user.id})
     
@@ -275,106 +905,1076 @@ async def login(credentials: UserLogin):
 async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@api_router.put("/auth/me", response_model=User)
+async def update_me(settings: UserSettingsUpdate, current_user: User = Depends(get_current_user)):
+    update_data = settings.model_dump(exclude_unset=True, exclude_none=True)
+    check_bmr_formula(update_data.get('bmr_formula'))
+    if update_data:
+        await db.users.update_one({"id": current_user.id}, {"$set": update_data})
+        invalidate_user(current_user.id)
+    if update_data.get('bmr_formula', current_user.bmr_formula) != current_user.bmr_formula:
+        # Clients without a formula of their own follow the default: recompute them now
+        await recalculate_clients(db, current_user.id, inherited_only=True, log=logger.debug)
+    return current_user.model_copy(update=update_data)
+
+# ============ CASCADE DELETES ============
+
+# Deleted clients keep a deleted_at tombstone until the cascade worker purges them
+LIVE_CLIENT = {"deleted_at": None}
+
+class CascadeWorker:
+    """Background purge of tombstoned clients: their cached PDFs and diets in batches, then the client.
+
+    Tombstones are the durable queue. The in-memory queue only starts a fresh
+    delete right away; the periodic sweep (also run at startup) picks up what a
+    crash or exhausted retries left behind, plus diets whose client is gone.
+    """
+
+    def __init__(self, batch_size: int, sweep_interval: float, max_retries: int):
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self.max_retries = max_retries
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.clients_purged = 0
+        self.diets_deleted = 0
+        self.orphan_diets_deleted = 0
+        self.failures = 0
+        self.sweeps = 0
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, client_id: str, trainer_id: str) -> None:
+        if self._queue is not None:
+            self._queue.put_nowait((client_id, trainer_id))
+
+    async def _run(self) -> None:
+        next_sweep = 0.0
+        while True:
+            try:
+                client_id, trainer_id = await asyncio.wait_for(
+                    self._queue.get(), max(next_sweep - time.monotonic(), 0)
+                )
+            except asyncio.TimeoutError:
+                await self._with_retries(self.sweep)
+                next_sweep = time.monotonic() + self.sweep_interval
+                continue
+            await self._with_retries(self.purge_client, client_id, trainer_id)
+
+    async def _with_retries(self, fn, *args) -> None:
+        for attempt in range(self.max_retries):
+            try:
+                return await fn(*args)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failures += 1
+                logger.exception("Cascade delete failed (attempt %d of %d)", attempt + 1, self.max_retries)
+                await asyncio.sleep(min(2 ** attempt, 60))
+        logger.error("Cascade delete gave up; the next sweep will retry")
+
+    async def _delete_diets(self, query: dict) -> int:
+        deleted = 0
+        while True:
+            diets = await db.diets.find(query, {"_id": 0, "id": 1}).limit(self.batch_size).to_list(self.batch_size)
+            if not diets:
+                return deleted
+            diet_ids = [diet["id"] for diet in diets]
+            # Cache first: a crash between the two steps leaves diets to retry, never stale PDFs
+            await asyncio.gather(*(pdf_cache.invalidate_diet(diet_id) for diet_id in diet_ids))
+            await db.diet_revisions.delete_many({"diet_id": {"$in": diet_ids}})
+            await db.diets.delete_many({"id": {"$in": diet_ids}})
+            deleted += len(diet_ids)
+
+    async def purge_client(self, client_id: str, trainer_id: str) -> None:
+        self.diets_deleted += await self._delete_diets({"client_id": client_id, "trainer_id": trainer_id})
+        plan_ids = await db.plans.distinct("id", {"client_id": client_id, "trainer_id": trainer_id})
+        if plan_ids:
+            await asyncio.gather(*(pdf_cache.invalidate_diet(plan_id) for plan_id in plan_ids))
+            await db.plans.delete_many({"id": {"$in": plan_ids}})
+        await db.checkins.delete_many({"meta.client_id": client_id, "meta.trainer_id": trainer_id})
+        result = await db.clients.delete_one({"id": client_id, "trainer_id": trainer_id, "deleted_at": {"$type": "date"}})
+        self.clients_purged += result.deleted_count
+
+    async def sweep(self) -> None:
+        self.sweeps += 1
+        tombstoned = db.clients.find({"deleted_at": {"$type": "date"}}, {"_id": 0, "id": 1, "trainer_id": 1})
+        async for client in tombstoned:
+            await self.purge_client(client["id"], client["trainer_id"])
+        
+        # Diets whose client no longer exists at all (e.g. deleted before tombstones)
+        client_ids = await db.diets.distinct("client_id")
+        for start in range(0, len(client_ids), self.batch_size):
+            chunk = client_ids[start:start + self.batch_size]
+            existing = set(await db.clients.distinct("id", {"id": {"$in": chunk}}))
+            for client_id in set(chunk) - existing:
+                self.orphan_diets_deleted += await self._delete_diets({"client_id": client_id})
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "clients_purged": self.clients_purged,
+            "diets_deleted": self.diets_deleted,
+            "orphan_diets_deleted": self.orphan_diets_deleted,
+            "failures": self.failures,
+            "sweeps": self.sweeps,
+        }
+
+cascade_worker = CascadeWorker(CASCADE_BATCH_SIZE, CASCADE_SWEEP_INTERVAL_SECONDS, CASCADE_MAX_RETRIES)
+
+# ============ DASHBOARD SUMMARY ============
+
+# Diets are counted per macro by that macro's share of their macro kcal, in buckets of this many percent
+MACRO_SPLIT_STEP = 10
+MACRO_KCAL_FACTORS = {"protein": 4, "carbs": 4, "fats": 9}
+DIET_SNAPSHOT_FIELDS = ["id", "client_id", "name", "total_kcal", "created_at"]
+
+def diet_snapshot(diet: dict) -> dict:
+    return {field: diet[field] for field in DIET_SNAPSHOT_FIELDS}
+
+def macro_buckets(diet: dict) -> dict:
+    """Bucket per macro, with the same arithmetic as macro_bucket_expr so both paths agree"""
+    kcal = [diet[f"total_{macro}"] * factor for macro, factor in MACRO_KCAL_FACTORS.items()]
+    total = kcal[0] + kcal[1] + kcal[2]
+    if total <= 0:
+        return {}
+    return {
+        macro: str(int(math.floor(value * 100 / total / MACRO_SPLIT_STEP) * MACRO_SPLIT_STEP))
+        for macro, value in zip(MACRO_KCAL_FACTORS, kcal)
+    }
+
+def macro_kcal_expr() -> dict:
+    return {macro: {"$multiply": [f"$total_{macro}", factor]} for macro, factor in MACRO_KCAL_FACTORS.items()}
+
+def macro_bucket_expr(macro: str) -> dict:
+    kcal = macro_kcal_expr()
+    total = {"$add": list(kcal.values())}
+    share = {"$divide": [{"$divide": [{"$multiply": [kcal[macro], 100]}, total]}, MACRO_SPLIT_STEP]}
+    return {"$multiply": [{"$floor": share}, MACRO_SPLIT_STEP]}
+
+async def aggregate_diets(match: dict) -> dict:
+    """Diet counts, latest diet per client, kcal sum and macro split of the matching diets in one pipeline"""
+    has_macros = {"$match": {"$expr": {"$gt": [{"$add": list(macro_kcal_expr().values())}, 0]}}}
+    facets = {
+        "clients": [
+            {"$sort": {"created_at": -1, "id": -1}},
+            {"$group": {
+                "_id": "$client_id",
+                "diet_count": {"$sum": 1},
+                "latest_diet": {"$first": {field: f"${field}" for field in DIET_SNAPSHOT_FIELDS}},
+            }},
+        ],
+        "totals": [{"$group": {"_id": None, "diet_count": {"$sum": 1}, "kcal_sum": {"$sum": "$total_kcal"}}}],
+        **{
+            macro: [has_macros, {"$group": {"_id": macro_bucket_expr(macro), "count": {"$sum": 1}}}]
+            for macro in MACRO_KCAL_FACTORS
+        },
+    }
+    result = (await db.diets.aggregate([{"$match": match}, {"$facet": facets}]).to_list(1))[0]
+    totals = result["totals"][0] if result["totals"] else {"diet_count": 0, "kcal_sum": 0}
+    return {
+        "clients": {
+            group["_id"]: {"diet_count": group["diet_count"], "latest_diet": group["latest_diet"]}
+            for group in result["clients"]
+        },
+        "diet_count": totals["diet_count"],
+        "kcal_sum": totals["kcal_sum"],
+        "macro_split": {
+            macro: {str(int(group["_id"])): group["count"] for group in result[macro]}
+            for macro in MACRO_KCAL_FACTORS
+        },
+    }
+
+def client_target(client: dict) -> Optional[float]:
+    return client.get("target_kcal")
+
+async def rebuild_dashboard_summary(trainer_id: str) -> dict:
+    """Recompute a trainer's summary from scratch and store it"""
+    clients = await db.clients.find(
+        {"trainer_id": trainer_id, **LIVE_CLIENT}, {"_id": 0, "id": 1, "target_kcal": 1}
+    ).to_list(None)
+    client_ids = [client["id"] for client in clients]
+    targets = [client_target(client) for client in clients if client_target(client) is not None]
+    diets = await aggregate_diets({"trainer_id": trainer_id, "client_id": {"$in": client_ids}})
+    summary = {
+        "trainer_id": trainer_id,
+        "client_count": len(client_ids),
+        "target_count": len(targets),
+        "target_kcal_sum": sum(targets),
+        "diet_count": diets["diet_count"],
+        "kcal_sum": diets["kcal_sum"],
+        "macro_split": diets["macro_split"],
+        "clients": {
+            client_id: diets["clients"].get(client_id, {"diet_count": 0, "latest_diet": None})
+            for client_id in client_ids
+        },
+        "rebuilt_at": datetime.now(timezone.utc),
+    }
+    await db.dashboard_summaries.replace_one({"trainer_id": trainer_id}, summary, upsert=True)
+    return summary
+
+class SummaryDelta:
+    """Changes to one trainer's materialized dashboard summary, applied as one update after the write.
+
+    Nothing is written while the trainer has no summary yet, or only one
+    stored before the client target totals existed; the next read rebuilds it
+    with the aggregation pipeline.
+    """
+
+    def __init__(self, trainer_id: str):
+        self.trainer_id = trainer_id
+        self.inc = defaultdict(int)
+        self.added_clients = set()
+        self.removed_clients = set()
+        self.latest = {}  # client id -> snapshot of its newest added diet
+        self.relinks = []  # (client id, diet id, snapshot or None to look up the newest remaining diet)
+
+    def _count(self, diet: dict, sign: int) -> None:
+        self.inc["diet_count"] += sign
+        self.inc["kcal_sum"] += sign * diet["total_kcal"]
+        self.inc[f"clients.{diet['client_id']}.diet_count"] += sign
+        for macro, bucket in macro_buckets(diet).items():
+            self.inc[f"macro_split.{macro}.{bucket}"] += sign
+
+    def _target(self, client: dict, sign: int) -> None:
+        target = client_target(client)
+        if target is not None:
+            self.inc["target_kcal_sum"] += sign * target
+            self.inc["target_count"] += sign
+
+    def client_added(self, client: dict) -> None:
+        self.added_clients.add(client["id"])
+        self._target(client, 1)
+
+    def client_changed(self, before: dict, after: dict) -> None:
+        self._target(before, -1)
+        self._target(after, 1)
+
+    def client_removed(self, client: dict) -> None:
+        self.removed_clients.add(client["id"])
+        self._target(client, -1)
+
+    def diet_added(self, diet: dict) -> None:
+        self._count(diet, 1)
+        latest = self.latest.get(diet["client_id"])
+        if latest is None or diet["created_at"] >= latest["created_at"]:
+            self.latest[diet["client_id"]] = diet_snapshot(diet)
+
+    def diet_changed(self, before: dict, after: dict) -> None:
+        self._count(before, -1)
+        self._count(after, 1)
+        self.relinks.append((after["client_id"], after["id"], diet_snapshot(after)))
+
+    def diet_removed(self, diet: dict) -> None:
+        self._count(diet, -1)
+        self.relinks.append((diet["client_id"], diet["id"], None))
+
+    async def _update(self) -> dict:
+        # Removed clients take their remaining diets out of the totals (they are still there until purged)
+        for client_id in self.removed_clients:
+            diets = await aggregate_diets({"trainer_id": self.trainer_id, "client_id": client_id})
+            self.inc["diet_count"] -= diets["diet_count"]
+            self.inc["kcal_sum"] -= diets["kcal_sum"]
+            for macro, buckets in diets["macro_split"].items():
+                for bucket, count in buckets.items():
+                    self.inc[f"macro_split.{macro}.{bucket}"] -= count
+        
+        # Paths under an added or removed client are folded into its $set / $unset
+        new_clients = self.added_clients - self.removed_clients
+        touched = self.added_clients | self.removed_clients
+        inc = {
+            path: value for path, value in self.inc.items()
+            if value and not (path.startswith("clients.") and path.split(".")[1] in touched)
+        }
+        update = {}
+        client_count = len(new_clients) - len(self.removed_clients - self.added_clients)
+        if client_count:
+            inc["client_count"] = client_count
+        if inc:
+            update["$inc"] = inc
+        fields = {
+            f"clients.{client_id}": {
+                "diet_count": self.inc.get(f"clients.{client_id}.diet_count", 0),
+                "latest_diet": self.latest.get(client_id),
+            }
+            for client_id in new_clients
+        }
+        fields.update({
+            f"clients.{client_id}.latest_diet": snapshot
+            for client_id, snapshot in self.latest.items() if client_id not in touched
+        })
+        if fields:
+            update["$set"] = fields
+        removed = self.removed_clients - self.added_clients
+        if removed:
+            update["$unset"] = {f"clients.{client_id}": "" for client_id in removed}
+        return update
+
+    async def apply(self) -> None:
+        try:
+            update = await self._update()
+            if update:
+                await db.dashboard_summaries.update_one(
+                    {"trainer_id": self.trainer_id, "target_count": {"$exists": True}}, update
+                )
+            for client_id, diet_id, snapshot in self.relinks:
+                if client_id in self.removed_clients:
+                    continue
+                if snapshot is None:
+                    newest = await db.diets.find_one(
+                        {"trainer_id": self.trainer_id, "client_id": client_id},
+                        {"_id": 0, **{field: 1 for field in DIET_SNAPSHOT_FIELDS}},
+                        sort=[("created_at", -1), ("id", -1)]
+                    )
+                    snapshot = newest and diet_snapshot(newest)
+                # Only when the changed diet is the one shown as latest
+                await db.dashboard_summaries.update_one(
+                    {"trainer_id": self.trainer_id, f"clients.{client_id}.latest_diet.id": diet_id},
+                    {"$set": {f"clients.{client_id}.latest_diet": snapshot}}
+                )
+        except Exception:
+            # Derived data: the write already succeeded, and ?refresh=true rebuilds the summary
+            logger.exception("Dashboard summary update failed for trainer %s", self.trainer_id)
+
+@api_router.get("/dashboard/summary", response_model=DashboardSummary)
+async def get_dashboard_summary(refresh: bool = False, current_user: User = Depends(get_current_user)):
+    """Counts, latest diets and macro split for the landing page from one stored document"""
+    summary = None if refresh else await db.dashboard_summaries.find_one({"trainer_id": current_user.id}, {"_id": 0})
+    if summary is None or "target_count" not in summary:
+        summary = await rebuild_dashboard_summary(current_user.id)
+    
+    snapshots = [client["latest_diet"] for client in summary["clients"].values() if client.get("latest_diet")]
+    return DashboardSummary(
+        client_count=summary["client_count"],
+        diet_count=summary["diet_count"],
+        avg_target_kcal=round(summary["target_kcal_sum"] / summary["target_count"], 1) if summary["target_count"] > 0 else None,
+        latest_diet=max(snapshots, key=lambda snapshot: (snapshot["created_at"], snapshot["id"]), default=None),
+        macro_split={
+            macro: {bucket: count for bucket, count in summary["macro_split"].get(macro, {}).items() if count > 0}
+            for macro in MACRO_KCAL_FACTORS
+        },
+        clients=summary["clients"],
+    )
+
 # ============ CLIENT ROUTES ============
 
+DIET_SUMMARY_PROJECTION = {"_id": 0, "meals": 0}
+CLIENT_TARGET_PROJECTION = {
+    "_id": 0, "id": 1, "target_kcal": 1, "maintenance_kcal": 1,
+    "protein_percentage": 1, "carbs_percentage": 1, "fats_percentage": 1,
+}
+
 @api_router.post("/clients", response_model=Client)
 async def create_client(client_data: ClientCreate, current_user: User = Depends(get_current_user)):
-    # Calculate TMB and maintenance calories
-    tmb = calculate_tmb(client_data.sex, client_data.weight, client_data.height, client_data.age)
-    maintenance_kcal = calculate_maintenance_kcal(tmb, client_data.activity_level)
-    
-    client = Client(
-        trainer_id=current_user.id,
-        name=client_data.name,
-        age=client_data.age,
-        sex=client_data.sex,
-        weight=client_data.weight,
-        height=client_data.height,
-        activity_level=client_data.activity_level,
-        tmb=tmb,
-        maintenance_kcal=maintenance_kcal,
-        target_kcal=maintenance_kcal,
-        protein_percentage=client_data.protein_percentage,
-        carbs_percentage=client_data.carbs_percentage,
-        fats_percentage=client_data.fats_percentage
-    )
+    client = build_client(client_data, current_user)
     
     doc = client.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
     
     await db.clients.insert_one(doc)
+    summary = SummaryDelta(current_user.id)
+    summary.client_added(doc)
+    await summary.apply()
     return client
 
 @api_router.get("/clients", response_model=List[Client])
-async def get_clients(current_user: User = Depends(get_current_user)):
-    clients = await db.clients.find({"trainer_id": current_user.id}, {"_id": 0}).to_list(1000)
-    
-    for client in clients:
-        if isinstance(client.get('created_at'), str):
-            client['created_at'] = datetime.fromisoformat(client['created_at'])
-        if isinstance(client.get('updated_at'), str):
-            client['updated_at'] = datetime.fromisoformat(client['updated_at'])
+async def get_clients(
+    response: Response,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    projection = parse_fields(fields, Client)
+    clients, next_cursor = await find_page(
+        db.clients, {"trainer_id": current_user.id, **LIVE_CLIENT}, limit, cursor, projection
+    )
+    if projection:
+        return projected_page(clients, next_cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return clients
 
 @api_router.get("/clients/{client_id}", response_model=Client)
-async def get_client(client_id: str, current_user: User = Depends(get_current_user)):
-    client = await db.clients.find_one({"id": client_id, "trainer_id": current_user.id}, {"_id": 0})
+async def get_client(client_id: str, response: Response, current_user: User = Depends(get_current_user)):
+    client = await db.clients.find_one({"id": client_id, "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    if isinstance(client.get('created_at'), str):
-        client['created_at'] = datetime.fromisoformat(client['created_at'])
-    if isinstance(client.get('updated_at'), str):
-        client['updated_at'] = datetime.fromisoformat(client['updated_at'])
-    
+    response.headers["ETag"] = version_etag(client)
     return Client(**client)
 
-@api_router.put("/clients/{client_id}", response_model=Client)
-async def update_client(client_id: str, client_data: ClientUpdate, current_user: User = Depends(get_current_user)):
-    client = await db.clients.find_one({"id": client_id, "trainer_id": current_user.id}, {"_id": 0})
+@api_router.get("/clients/{client_id}/detail", response_model=ClientDetail)
+async def get_client_detail(client_id: str, response: Response, current_user: User = Depends(get_current_user)):
+    """Client and its diet summaries in one request; more diets continue at /diets?client_id=&cursor="""
+    client, (diets, next_cursor) = await asyncio.gather(
+        db.clients.find_one({"id": client_id, "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0}),
+        find_page(db.diets, {"trainer_id": current_user.id, "client_id": client_id}, 1000, None, DIET_SUMMARY_PROJECTION)
+    )
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["ETag"] = version_etag(client)
+    return ClientDetail(client=Client(**client), diets=diets)
+
+@api_router.put("/clients/{client_id}", response_model=Client)
+async def update_client(
+    client_id: str,
+    client_data: ClientUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    expected = parse_if_match(if_match)
+    query = {"id": client_id, "trainer_id": current_user.id, **LIVE_CLIENT}
     update_data = client_data.model_dump(exclude_unset=True)
     
-    # Recalculate if needed
-    if any(k in update_data for k in ['weight', 'height', 'age', 'sex', 'activity_level']):
-        age = update_data.get('age', client['age'])
-        sex = update_data.get('sex', client['sex'])
-        weight = update_data.get('weight', client['weight'])
-        height = update_data.get('height', client['height'])
-        activity = update_data.get('activity_level', client['activity_level'])
-        
-        if 'tmb' not in update_data:
-            update_data['tmb'] = calculate_tmb(sex, weight, height, age)
-        if 'maintenance_kcal' not in update_data:
-            update_data['maintenance_kcal'] = calculate_maintenance_kcal(update_data['tmb'], activity)
+    client = {}
+    if any(k in update_data for k in ENERGY_INPUTS):
+        # Energy values derive from the stored inputs: read them, then pin the update to that version
+        client = await db.clients.find_one(query, {"_id": 0})
+        if not client:
+            raise HTTPException(status_code=404, detail="Client not found")
+        check_version(client, expected)
+        expected = client.get("version", 0)
     
-    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    
-    await db.clients.update_one({"id": client_id}, {"$set": update_data})
-    
-    updated_client = await db.clients.find_one({"id": client_id}, {"_id": 0})
-    if isinstance(updated_client.get('created_at'), str):
-        updated_client['created_at'] = datetime.fromisoformat(updated_client['created_at'])
-    if isinstance(updated_client.get('updated_at'), str):
-        updated_client['updated_at'] = datetime.fromisoformat(updated_client['updated_at'])
+    update_data = client_update_fields(client, update_data, current_user)
+    previous = await find_and_update(db.clients, query, update_data, expected, ReturnDocument.BEFORE)
+    if previous is None:
+        raise await update_miss(db.clients, query, expected, "Client")
     
+    updated_client = {**previous, **update_data, "version": previous.get("version", 0) + 1}
+    summary = SummaryDelta(current_user.id)
+    summary.client_changed(previous, updated_client)
+    await summary.apply()
+    response.headers["ETag"] = version_etag(updated_client)
     return Client(**updated_client)
 
 @api_router.delete("/clients/{client_id}")
 async def delete_client(client_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.clients.delete_one({"id": client_id, "trainer_id": current_user.id})
-    if result.deleted_count == 0:
+    # Tombstone only; diets and cached PDFs are purged by the cascade worker
+    now = datetime.now(timezone.utc)
+    client = await db.clients.find_one_and_update(
+        {"id": client_id, "trainer_id": current_user.id, **LIVE_CLIENT},
+        {"$set": {"deleted_at": now, "updated_at": now}, "$inc": {"version": 1}},
+        projection={"_id": 0, "id": 1, "target_kcal": 1}
+    )
+    if client is None:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Also delete associated diets
-    await db.diets.delete_many({"client_id": client_id})
-    
+    # Before the purge, while the client's diets can still be counted out of the summary
+    summary = SummaryDelta(current_user.id)
+    summary.client_removed(client)
+    await summary.apply()
+    cascade_worker.enqueue(client_id, current_user.id)
     return {"message": "Client deleted successfully"}
 
+# ============ CHECK-INS ============
+
+# Stored as a time-series collection: one document per check-in, bucketed by client on disk
+CHECKIN_MEASURES = ["weight", "body_fat_percentage", "waist_cm", "hip_cm"]
+CHECKIN_TIMESERIES = {"timeField": "measured_at", "metaField": "meta", "granularity": "hours"}
+# A Monday at 00:00 UTC: day and week buckets are whole units counted from it
+CHECKIN_EPOCH = datetime(1970, 1, 5, tzinfo=timezone.utc)
+CHECKIN_BUCKET_MS = {"day": 86_400_000, "week": 7 * 86_400_000}
+
+async def ensure_checkins_collection(database) -> None:
+    """Create checkins as a time-series collection; must run before anything else touches it"""
+    if await database.list_collection_names(filter={"name": "checkins"}):
+        return
+    try:
+        await database.create_collection("checkins", timeseries=CHECKIN_TIMESERIES)
+    except CollectionInvalid:
+        pass  # created concurrently by another worker
+    except OperationFailure as e:
+        # Servers before 5.0: a regular collection with the same documents and index works the same,
+        # since the series pipeline avoids 5.0-only stages
+        logger.warning("checkins created as a regular collection: %s", e)
+
+async def checkin_trend(client_id: str, trainer_id: str) -> Optional[dict]:
+    """Mean weight and body fat of the latest CHECKIN_TREND_POINTS weigh-ins"""
+    trend = await db.checkins.aggregate([
+        {"$match": {"meta.client_id": client_id, "meta.trainer_id": trainer_id, "weight": {"$exists": True}}},
+        {"$sort": {"measured_at": -1}},
+        {"$limit": CHECKIN_TREND_POINTS},
+        {"$group": {"_id": None, "weight": {"$avg": "$weight"}, "body_fat_percentage": {"$avg": "$body_fat_percentage"}}},
+    ]).to_list(1)
+    return trend[0] if trend else None
+
+async def apply_checkin_trend(client: dict, user: User) -> dict:
+    """Move the client's weight and body fat to their check-in trend, recomputing TMB and maintenance"""
+    trend = await checkin_trend(client["id"], user.id)
+    if not trend:
+        return client
+    update_data = {}
+    weight = round(trend["weight"], 1)
+    if weight != round(client["weight"], 1):
+        update_data["weight"] = weight
+    if trend["body_fat_percentage"] is not None:
+        body_fat = round(trend["body_fat_percentage"], 1)
+        if body_fat != client.get("body_fat_percentage"):
+            update_data["body_fat_percentage"] = body_fat
+    if not update_data:
+        return client
+    
+    # Pinned to the version the trend was applied to; a concurrent edit by the trainer wins
+    query = {"id": client["id"], "trainer_id": user.id, **LIVE_CLIENT}
+    updated_client = await find_and_update(
+        db.clients, query, client_update_fields(client, update_data, user), client.get("version", 0)
+    )
+    if updated_client is None:
+        logger.info("Client %s changed while applying its check-in trend; left as is", client["id"])
+        return await db.clients.find_one(query, {"_id": 0}) or client
+    return updated_client
+
+def checkin_bucket_expr(interval: str) -> dict:
+    """Start of the UTC day, week (from Monday) or month of measured_at, with operators older than $dateTrunc"""
+    if interval == "month":
+        return {"$dateFromParts": {"year": {"$year": "$measured_at"}, "month": {"$month": "$measured_at"}}}
+    since_epoch = {"$subtract": ["$measured_at", CHECKIN_EPOCH]}
+    return {"$subtract": ["$measured_at", {"$mod": [since_epoch, CHECKIN_BUCKET_MS[interval]]}]}
+
+def checkin_series_pipeline(match: dict, interval: str) -> list:
+    """Raw or downsampled points, capped one past CHECKIN_MAX_POINTS to tell a full series from a truncated one"""
+    measures = {measure: 1 for measure in CHECKIN_MEASURES}
+    pipeline = [{"$match": match}]
+    if interval == "raw":
+        pipeline += [
+            {"$sort": {"measured_at": 1}},
+            {"$project": {"_id": 0, "id": 1, "measured_at": 1, **measures}},
+        ]
+    else:
+        pipeline += [
+            {"$group": {
+                "_id": checkin_bucket_expr(interval),
+                "count": {"$sum": 1},
+                **{measure: {"$avg": f"${measure}"} for measure in CHECKIN_MEASURES},
+            }},
+            {"$sort": {"_id": 1}},
+            {"$project": {"_id": 0, "measured_at": "$_id", "count": 1, **measures}},
+        ]
+    pipeline.append({"$limit": CHECKIN_MAX_POINTS + 1})
+    return pipeline
+
+def add_checkin_trends(points: List[dict], window: int) -> None:
+    """Rolling means over the last `window` points; like $avg, missing values are skipped"""
+    for measure in CHECKIN_MEASURES:
+        values = [point.get(measure) for point in points]
+        total, count = 0.0, 0
+        for index, value in enumerate(values):
+            if value is not None:
+                total += value
+                count += 1
+            if index >= window and values[index - window] is not None:
+                total -= values[index - window]
+                count -= 1
+            points[index][f"{measure}_trend"] = total / count if count else None
+
+@api_router.post("/clients/{client_id}/checkins", response_model=CheckInResult)
+async def create_checkins(
+    client_id: str,
+    batch: CheckInBatch,
+    recalculate: bool = True,
+    current_user: User = Depends(get_current_user)
+):
+    """Record check-ins (e.g. a backfill of past weigh-ins) and, unless recalculate=false, apply the new trend"""
+    client = await db.clients.find_one({"id": client_id, "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0})
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    now = datetime.now(timezone.utc)
+    docs = []
+    for index, checkin in enumerate(batch.checkins):
+        measures = checkin.model_dump(include=set(CHECKIN_MEASURES), exclude_none=True)
+        if not measures:
+            raise HTTPException(status_code=400, detail=f"Check-in {index} has no measurements")
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "meta": {"trainer_id": current_user.id, "client_id": client_id},
+            "measured_at": checkin.measured_at or now,
+            **measures,
+            "created_at": now,
+        })
+    await db.checkins.insert_many(docs, ordered=False)
+    
+    if recalculate:
+        client = await apply_checkin_trend(client, current_user)
+    return CheckInResult(inserted=len(docs), client=Client(**client))
+
+@api_router.get("/clients/{client_id}/checkins", response_model=List[CheckInPoint], response_model_exclude_none=True)
+async def get_checkins(
+    client_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    interval: Literal["raw", "day", "week", "month"] = "raw",
+    window: int = Query(1, ge=1, le=365),
+    current_user: User = Depends(get_current_user)
+):
+    """Check-ins in [start, end), raw or averaged per day/week/month (UTC), with rolling means over `window` points
+
+    Buckets come from MongoDB; the rolling means are computed here over the
+    at most CHECKIN_MAX_POINTS returned points, so servers before 5.0
+    ($setWindowFields) serve the same series.
+    """
+    match = {"meta.client_id": client_id, "meta.trainer_id": current_user.id}
+    measured_at = {}
+    if start:
+        measured_at["$gte"] = start
+    if end:
+        measured_at["$lt"] = end
+    if measured_at:
+        match["measured_at"] = measured_at
+    
+    client, points = await asyncio.gather(
+        db.clients.find_one({"id": client_id, "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0, "id": 1}),
+        db.checkins.aggregate(checkin_series_pipeline(match, interval)).to_list(None)
+    )
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    if len(points) > CHECKIN_MAX_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"More than {CHECKIN_MAX_POINTS} points; narrow start/end or use a coarser interval"
+        )
+    if window > 1:
+        add_checkin_trends(points, window)
+    return points
+
+# ============ FOOD SEARCH ============
+
+def normalize_text(text: str) -> str:
+    """Casefold and strip accents so 'Plátano' matches 'platano'"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class FoodSearchIndex:
+    """Accent-insensitive word-prefix index with a trigram fallback over one trainer's foods"""
+
+    FUZZY_MIN_SIMILARITY = 0.5
+
+    def __init__(self, foods: List[dict] = ()):
+        self._foods = {}
+        self._names = {}
+        self._tokens = []  # sorted (token, food_id) pairs for prefix range scans
+        self._trigrams = defaultdict(set)
+        # Catalogue ids the trainer has overridden or hidden; their own entries live in this index
+        self.shadowed = set()
+        for food in foods:
+            self.add(food)
+
+    def __len__(self) -> int:
+        return len(self._foods)
+
+    def add(self, food: dict) -> None:
+        food_id = food["id"]
+        self.remove(food_id)
+        name = normalize_text(food["name"])
+        self._foods[food_id] = food
+        self._names[food_id] = name
+        for token in set(re.findall(r"\w+", name)):
+            bisect.insort(self._tokens, (token, food_id))
+        for gram in trigrams(name):
+            self._trigrams[gram].add(food_id)
+
+    def remove(self, food_id: str) -> None:
+        name = self._names.pop(food_id, None)
+        if name is None:
+            return
+        del self._foods[food_id]
+        for token in set(re.findall(r"\w+", name)):
+            position = bisect.bisect_left(self._tokens, (token, food_id))
+            del self._tokens[position]
+        for gram in trigrams(name):
+            self._trigrams[gram].discard(food_id)
+            if not self._trigrams[gram]:
+                del self._trigrams[gram]
+
+    def _prefix_matches(self, prefix: str) -> set:
+        start = bisect.bisect_left(self._tokens, (prefix, ""))
+        matches = set()
+        for token, food_id in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.add(food_id)
+        return matches
+
+    def get(self, food_id: str) -> dict:
+        return self._foods[food_id]
+
+    def ranked(self, query: str, limit: int = 20, exclude=frozenset()) -> List[tuple]:
+        """(rank key, food id) pairs, best first; keys are comparable across indexes"""
+        query = normalize_text(query).strip()
+        query_tokens = re.findall(r"\w+", query)
+        if not query_tokens:
+            return []
+        
+        # Every query word must prefix some word of the name
+        candidates = self._prefix_matches(query_tokens[0])
+        for token in query_tokens[1:]:
+            if not candidates:
+                break
+            candidates &= self._prefix_matches(token)
+        candidates -= exclude
+        
+        def rank(food_id):
+            name = self._names[food_id]
+            if name == query:
+                tier = 0
+            elif name.startswith(query):
+                tier = 1
+            else:
+                tier = 2
+            return (0, tier, len(name), name)
+        
+        ranked = sorted((rank(food_id), food_id) for food_id in candidates)[:limit]
+        
+        # Typos and partial words: rank the remaining names by trigram overlap
+        if len(ranked) < limit:
+            query_grams = trigrams(query)
+            shared = Counter()
+            for gram in query_grams:
+                for food_id in self._trigrams.get(gram, ()):
+                    if food_id not in candidates and food_id not in exclude:
+                        shared[food_id] += 1
+            scored = []
+            for food_id, common in shared.items():
+                # Share of the query's trigrams found in the name, so long names are not penalised
+                similarity = common / len(query_grams)
+                if similarity >= self.FUZZY_MIN_SIMILARITY:
+                    name = self._names[food_id]
+                    scored.append(((1, -similarity, len(name), name), food_id))
+            ranked += sorted(scored)[:limit - len(ranked)]
+        
+        return ranked
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        return [self._foods[food_id] for _, food_id in self.ranked(query, limit)]
+
+class FoodSearchRegistry:
+    """Lazily built per-trainer search indexes, kept current by the food write routes"""
+
+    def __init__(self, max_trainers: int):
+        self.max_trainers = max_trainers
+        self._indexes: "OrderedDict[str, FoodSearchIndex]" = OrderedDict()
+        self._locks = {}
+        self._generations = defaultdict(int)
+        self.loads = 0
+
+    async def get(self, trainer_id: str) -> FoodSearchIndex:
+        index = self._indexes.get(trainer_id)
+        if index is not None:
+            self._indexes.move_to_end(trainer_id)
+            return index
+        
+        lock = self._locks.setdefault(trainer_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(trainer_id)
+            if index is not None:
+                return index
+            generation = self._generations[trainer_id]
+            foods = await db.foods.find({"created_by": trainer_id}, {"_id": 0}).to_list(None)
+            overrides = await load_overrides(trainer_id)
+            overridden = (effective_food(food_id, overrides) for food_id in overrides if food_id in food_catalog)
+            index = FoodSearchIndex(foods + [food for food in overridden if food is not None])
+            index.shadowed = set(overrides)
+            self.loads += 1
+            # A write that landed while loading may be missing from `foods`; serve but do not keep
+            if self._generations[trainer_id] == generation:
+                self._indexes[trainer_id] = index
+                while len(self._indexes) > self.max_trainers:
+                    self._indexes.popitem(last=False)
+        self._locks.pop(trainer_id, None)
+        return index
+
+    def food_saved(self, trainer_id: str, food: dict) -> None:
+        self._generations[trainer_id] += 1
+        index = self._indexes.get(trainer_id)
+        if index is not None:
+            index.add(food)
+
+    def food_deleted(self, trainer_id: str, food_id: str) -> None:
+        self._generations[trainer_id] += 1
+        index = self._indexes.get(trainer_id)
+        if index is not None:
+            index.remove(food_id)
+
+    def override_saved(self, trainer_id: str, food_id: str, food: Optional[dict]) -> None:
+        """A catalogue food was edited (food) or hidden (None) for one trainer"""
+        self._generations[trainer_id] += 1
+        index = self._indexes.get(trainer_id)
+        if index is not None:
+            index.shadowed.add(food_id)
+            if food is None:
+                index.remove(food_id)
+            else:
+                index.add(food)
+
+    def invalidate(self, trainer_id: str) -> None:
+        self._generations[trainer_id] += 1
+        self._indexes.pop(trainer_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "trainers": len(self._indexes),
+            "foods": sum(len(index) for index in self._indexes.values()),
+            "loads": self.loads,
+        }
+
+food_search = FoodSearchRegistry(FOOD_INDEX_MAX_TRAINERS)
+
+def search_library(index: FoodSearchIndex, query: str, limit: int) -> List[dict]:
+    """Rank a trainer's own foods and the catalogue together, skipping catalogue foods they shadow"""
+    ranked = [(key, False, food_id) for key, food_id in index.ranked(query, limit)]
+    ranked += [
+        (key, True, food_id)
+        for key, food_id in food_catalog.search_index.ranked(query, limit, exclude=index.shadowed)
+    ]
+    return [
+        food_catalog.food(food_id) if shared else index.get(food_id)
+        for _, shared, food_id in sorted(ranked)[:limit]
+    ]
+
+# ============ FOOD CATALOGUE ============
+
+CATALOG_OWNER = "catalog"
+
+class FoodCatalog:
+    """Shared read-only reference foods, held once per process as parallel columns.
+
+    Trainers see it merged with their own foods. Editing or deleting a
+    catalogue food writes a per-trainer override (copy-on-write) instead.
+    """
+
+    MACRO_COLUMNS = ["kcal_per_100g", "protein_per_100g", "carbs_per_100g", "fats_per_100g"]
+
+    def __init__(self, foods: List[dict] = ()):
+        self.load(foods)
+
+    def load(self, foods: List[dict]) -> None:
+        foods = sorted(foods, key=lambda food: (food["created_at"], food["id"]))
+        self.ids = [food["id"] for food in foods]
+        self.names = [food["name"] for food in foods]
+        self.created_at = [food["created_at"] for food in foods]
+        self.macros = np.array(
+            [[food[column] for column in self.MACRO_COLUMNS] for food in foods], dtype=float
+        ).reshape(-1, len(self.MACRO_COLUMNS))
+        self._keys = list(zip(self.created_at, self.ids))
+        self._rows = {food_id: row for row, food_id in enumerate(self.ids)}
+        self.search_index = FoodSearchIndex({"id": food_id, "name": name} for food_id, name in zip(self.ids, self.names))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, food_id: str) -> bool:
+        return food_id in self._rows
+
+    def food(self, food_id: str) -> dict:
+        row = self._rows[food_id]
+        food = {
+            "id": food_id,
+            "name": self.names[row],
+            "created_by": CATALOG_OWNER,
+            "created_at": self.created_at[row],
+        }
+        food.update(zip(self.MACRO_COLUMNS, self.macros[row].tolist()))
+        return food
+
+    def ids_after(self, key: Optional[tuple]) -> List[str]:
+        """Ids in (created_at, id) order, strictly after a pagination key"""
+        start = 0 if key is None else bisect.bisect_right(self._keys, key)
+        return itertools.islice(self.ids, start, None)
+
+    def stats(self) -> dict:
+        return {"foods": len(self), "macro_bytes": self.macros.nbytes}
+
+food_catalog = FoodCatalog()
+
+async def load_catalog() -> None:
+    food_catalog.load(await db.catalog_foods.find({}, {"_id": 0}).to_list(None))
+
+async def load_overrides(trainer_id: str, food_ids=None) -> dict:
+    """A trainer's catalogue overrides by catalogue food id"""
+    query = {"trainer_id": trainer_id}
+    if food_ids is not None:
+        query["food_id"] = {"$in": list(food_ids)}
+    return {override["food_id"]: override async for override in db.food_overrides.find(query, {"_id": 0})}
+
+def effective_food(food_id: str, overrides: dict) -> Optional[dict]:
+    """A catalogue food as one trainer sees it; None when they have hidden it"""
+    override = overrides.get(food_id)
+    food = food_catalog.food(food_id)
+    if override is None:
+        return food
+    if override.get("hidden"):
+        return None
+    food.update({field: override[field] for field in FoodCreate.model_fields if field in override})
+    food["version"] = override.get("version", 0)
+    return food
+
+def catalog_page(after: Optional[tuple], limit: int, overrides: dict, projection: Optional[dict]) -> tuple:
+    """Up to `limit` visible catalogue foods after a pagination key, and whether more follow"""
+    page = []
+    for food_id in food_catalog.ids_after(after):
+        food = effective_food(food_id, overrides)
+        if food is None:
+            continue
+        if len(page) == limit:
+            return page, True
+        if projection:
+            food = {field: food[field] for field in projection if field in food}
+        page.append(food)
+    return page, False
+
+def override_update(fields: dict, now: datetime) -> dict:
+    return {"$set": {**fields, "updated_at": now}, "$setOnInsert": {"created_at": now}, "$inc": {"version": 1}}
+
+async def save_override(trainer_id: str, food_id: str, fields: dict) -> Optional[dict]:
+    """Copy-on-write edit (or hide, with hidden=True) of a catalogue food for one trainer"""
+    override = await db.food_overrides.find_one_and_update(
+        {"trainer_id": trainer_id, "food_id": food_id},
+        override_update(fields, datetime.now(timezone.utc)),
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    food = effective_food(food_id, {food_id: override})
+    food_search.override_saved(trainer_id, food_id, food)
+    return food
+
+async def trainer_library(trainer_id: str) -> dict:
+    """Every food a trainer can use: the catalogue with their overrides, then their own foods"""
+    overrides = await load_overrides(trainer_id)
+    foods = {}
+    for food_id in food_catalog.ids:
+        food = effective_food(food_id, overrides)
+        if food is not None:
+            foods[food_id] = food
+    async for food in db.foods.find({"created_by": trainer_id}, FOOD_MACRO_PROJECTION):
+        foods[food["id"]] = food
+    return foods
+
+# ============ FOOD IMPORT ============
+
+def food_name_key(name: str) -> str:
+    return " ".join(normalize_text(name).split())
+
+def validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors())
+
+async def import_food_rows(trainer_id: str, rows, mode: str = "skip", batch_size: int = FOOD_IMPORT_BATCH_SIZE) -> dict:
+    """Validate parsed rows with FoodCreate and write them in batches, deduplicating by normalized name.
+
+    Names already in the trainer's library (catalogue included) are skipped or,
+    with mode="upsert", overwritten in place (catalogue foods through an
+    override); repeated names within the input are reported as errors.
+    """
+    overrides = await load_overrides(trainer_id)
+    shared = [effective_food(food_id, overrides) for food_id in food_catalog.ids]
+    # name key -> (is a catalogue food, id); the trainer's own foods win over the catalogue
+    existing = {food_name_key(food["name"]): (True, food["id"]) for food in shared if food is not None}
+    async for food in db.foods.find({"created_by": trainer_id}, {"_id": 0, "id": 1, "name": 1}):
+        existing[food_name_key(food["name"])] = (False, food["id"])
+    seen = {}
+    inserts, updates, override_updates = [], [], []
+    report = {"inserted": 0, "updated": 0, "skipped": 0, "error_count": 0, "errors": []}
+
+    def fail(line: int, message: str) -> None:
+        report["error_count"] += 1
+        if len(report["errors"]) < FOOD_IMPORT_MAX_ERRORS:
+            report["errors"].append({"line": line, "error": message})
+
+    async def flush() -> None:
+        if inserts:
+            await db.foods.insert_many(inserts, ordered=False)
+            report["inserted"] += len(inserts)
+            inserts.clear()
+        if updates:
+            await db.foods.bulk_write(updates, ordered=False)
+            report["updated"] += len(updates)
+            updates.clear()
+        if override_updates:
+            await db.food_overrides.bulk_write(override_updates, ordered=False)
+            report["updated"] += len(override_updates)
+            override_updates.clear()
+
+    try:
+        async for line, row, error in rows:
+            if error:
+                fail(line, error)
+                continue
+            try:
+                food = FoodCreate.model_validate(row)
+            except ValidationError as exc:
+                fail(line, validation_message(exc))
+                continue
+            key = food_name_key(food.name)
+            if not key:
+                fail(line, "name: empty")
+                continue
+            if key in seen:
+                fail(line, f"duplicate of line {seen[key]}")
+                continue
+            seen[key] = line
+
+            if key not in existing:
+                inserts.append(Food(**food.model_dump(), created_by=trainer_id).model_dump())
+            elif mode != "upsert":
+                report["skipped"] += 1
+            elif existing[key][0]:
+                override_updates.append(UpdateOne(
+                    {"trainer_id": trainer_id, "food_id": existing[key][1]},
+                    override_update({**food.model_dump(), "hidden": False}, datetime.now(timezone.utc)),
+                    upsert=True
+                ))
+            else:
+                updates.append(UpdateOne(
+                    {"id": existing[key][1], "created_by": trainer_id},
+                    {"$set": food.model_dump(), "$inc": {"version": 1}}
+                ))
+            if len(inserts) + len(updates) + len(override_updates) >= batch_size:
+                await flush()
+        await flush()
+    finally:
+        food_search.invalidate(trainer_id)
+    return report
+
+async def exported_foods(trainer_id: str):
+    """The trainer's own foods, then the catalogue foods they edited as they see them.
+
+    Catalogue foods they hid have no row: a CSV line cannot express "hidden".
+    Re-importing the file with mode=upsert matches edited catalogue foods by
+    name and writes the values back as overrides.
+    """
+    own = db.foods.find(
+        {"created_by": trainer_id},
+        {"_id": 0, **{column: 1 for column in FOOD_COLUMNS}}
+    ).sort([("created_at", 1), ("id", 1)]).batch_size(FOOD_IMPORT_BATCH_SIZE)
+    async for food in own:
+        yield food
+    overrides = await load_overrides(trainer_id)
+    for food_id in food_catalog.ids:
+        if food_id in overrides:
+            food = effective_food(food_id, overrides)
+            if food is not None:
+                yield food
+
 # ============ FOOD ROUTES ============
 
 @api_router.post("/foods", response_model=Food)
@@ -389,330 +1989,1853 @@ async def create_food(food_data: FoodCreate, current_user: User = Depends(get_cu
     )
     
     doc = food.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.foods.insert_one(doc)
+    food_search.food_saved(current_user.id, food.model_dump())
     return food
 
 @api_router.get("/foods", response_model=List[Food])
-async def get_foods(current_user: User = Depends(get_current_user)):
-    foods = await db.foods.find({"created_by": current_user.id}, {"_id": 0}).to_list(10000)
+async def get_foods(
+    response: Response,
+    limit: int = Query(10000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    projection = parse_fields(fields, Food)
+    (own, next_cursor), overrides = await asyncio.gather(
+        find_page(db.foods, {"created_by": current_user.id}, limit, cursor, projection),
+        load_overrides(current_user.id)
+    )
     
-    for food in foods:
-        if isinstance(food.get('created_at'), str):
-            food['created_at'] = datetime.fromisoformat(food['created_at'])
+    # Merge the catalogue in on the same (created_at, id) keyset
+    shared, more_shared = catalog_page(decode_cursor(cursor) if cursor else None, limit, overrides, projection)
+    foods = sorted(own + shared, key=lambda food: (food["created_at"], food["id"]))
+    if next_cursor or more_shared or len(foods) > limit:
+        foods = foods[:limit]
+        next_cursor = encode_cursor(foods[-1])
+    
+    if projection:
+        return projected_page(foods, next_cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return foods
 
+@api_router.get("/foods/search", response_model=List[Food])
+async def search_foods(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    index = await food_search.get(current_user.id)
+    return search_library(index, q, limit)
+
+@api_router.post("/foods/import")
+async def import_foods(
+    http_request: Request,
+    fmt: Optional[Literal["csv", "ndjson"]] = Query(None, alias="format"),
+    mode: Literal["skip", "upsert"] = "skip",
+    current_user: User = Depends(get_current_user)
+):
+    """Import a raw CSV or NDJSON body; the format defaults from the Content-Type"""
+    if fmt is None:
+        fmt = "ndjson" if "json" in http_request.headers.get("content-type", "") else "csv"
+    return await import_food_rows(current_user.id, iter_rows(http_request.stream(), fmt), mode)
+
+@api_router.get("/foods/export")
+async def export_foods(
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    current_user: User = Depends(get_current_user)
+):
+    return StreamingResponse(
+        format_foods(exported_foods(current_user.id), fmt),
+        media_type=FOOD_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="alimentos.{fmt}"'}
+    )
+
 @api_router.get("/foods/{food_id}", response_model=Food)
-async def get_food(food_id: str, current_user: User = Depends(get_current_user)):
+async def get_food(food_id: str, response: Response, current_user: User = Depends(get_current_user)):
     food = await db.foods.find_one({"id": food_id, "created_by": current_user.id}, {"_id": 0})
+    if not food and food_id in food_catalog:
+        food = effective_food(food_id, await load_overrides(current_user.id, [food_id]))
     if not food:
         raise HTTPException(status_code=404, detail="Food not found")
     
-    if isinstance(food.get('created_at'), str):
-        food['created_at'] = datetime.fromisoformat(food['created_at'])
-    
+    response.headers["ETag"] = version_etag(food)
     return Food(**food)
 
 @api_router.put("/foods/{food_id}", response_model=Food)
-async def update_food(food_id: str, food_data: FoodCreate, current_user: User = Depends(get_current_user)):
-    food = await db.foods.find_one({"id": food_id, "created_by": current_user.id}, {"_id": 0})
-    if not food:
-        raise HTTPException(status_code=404, detail="Food not found")
-    
-    update_data = food_data.model_dump()
-    await db.foods.update_one({"id": food_id}, {"$set": update_data})
+async def update_food(
+    food_id: str,
+    food_data: FoodCreate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    expected = parse_if_match(if_match)
+    query = {"id": food_id, "created_by": current_user.id}
+    updated_food = await find_and_update(db.foods, query, food_data.model_dump(), expected)
     
-    updated_food = await db.foods.find_one({"id": food_id}, {"_id": 0})
-    if isinstance(updated_food.get('created_at'), str):
-        updated_food['created_at'] = datetime.fromisoformat(updated_food['created_at'])
+    if updated_food is not None:
+        food_search.food_saved(current_user.id, updated_food)
+    elif food_id in food_catalog and not await db.foods.count_documents(query, limit=1):
+        current = effective_food(food_id, await load_overrides(current_user.id, [food_id]))
+        if current is None:
+            raise HTTPException(status_code=404, detail="Food not found")
+        check_version(current, expected)
+        updated_food = await save_override(current_user.id, food_id, {**food_data.model_dump(), "hidden": False})
+    else:
+        raise await update_miss(db.foods, query, expected, "Food")
     
+    response.headers["ETag"] = version_etag(updated_food)
     return Food(**updated_food)
 
 @api_router.delete("/foods/{food_id}")
 async def delete_food(food_id: str, current_user: User = Depends(get_current_user)):
     result = await db.foods.delete_one({"id": food_id, "created_by": current_user.id})
-    if result.deleted_count == 0:
+    if result.deleted_count:
+        food_search.food_deleted(current_user.id, food_id)
+    elif food_id in food_catalog and effective_food(food_id, await load_overrides(current_user.id, [food_id])):
+        # Catalogue foods are only hidden from this trainer
+        await save_override(current_user.id, food_id, {"hidden": True})
+    else:
         raise HTTPException(status_code=404, detail="Food not found")
+    
     return {"message": "Food deleted successfully"}
 
+# ============ MACRO HELPERS ============
+
+FOOD_MACRO_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1,
+    "kcal_per_100g": 1, "protein_per_100g": 1, "carbs_per_100g": 1, "fats_per_100g": 1,
+}
+
+async def load_foods(trainer_id: str, food_ids, food_cache: Optional[dict] = None) -> dict:
+    """Load the trainer's foods and visible catalogue foods by id, skipping ids already in `food_cache`"""
+    food_cache = {} if food_cache is None else food_cache
+    missing = list({food_id for food_id in food_ids if food_id not in food_cache})
+    if missing:
+        async for food in db.foods.find({"id": {"$in": missing}, "created_by": trainer_id}, FOOD_MACRO_PROJECTION):
+            food_cache[food["id"]] = food
+        shared = [food_id for food_id in missing if food_id not in food_cache and food_id in food_catalog]
+        if shared:
+            overrides = await load_overrides(trainer_id, shared)
+            for food_id in shared:
+                food = effective_food(food_id, overrides)
+                if food is not None:
+                    food_cache[food_id] = food
+    return food_cache
+
+def stored_foods(meals: List[dict]) -> dict:
+    """Per-100g values recovered from a diet's saved items, by food id.
+
+    Lets a diet keep foods that have since been deleted from the library:
+    they are only unknown when a request adds them anew.
+    """
+    foods = {}
+    for meal in meals:
+        for item in meal["foods"]:
+            grams = item["quantity_g"]
+            if item["food_id"] in foods and not grams:
+                continue
+            factor = 100 / grams if grams else 0
+            foods[item["food_id"]] = {
+                "id": item["food_id"],
+                "name": item["food_name"],
+                **{f"{macro}_per_100g": item[macro] * factor for macro in ("kcal", "protein", "carbs", "fats")},
+            }
+    return foods
+
+def compute_meals(meal_inputs: List[MealInput], foods: dict) -> List[Meal]:
+    unknown = sorted({item.food_id for meal in meal_inputs for item in meal.foods} - set(foods))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown food ids: {', '.join(unknown)}")
+    
+    meals = []
+    for meal_input in meal_inputs:
+        items = []
+        for item in meal_input.foods:
+            food = foods[item.food_id]
+            factor = item.quantity_g / 100
+            items.append(FoodItem(
+                food_id=item.food_id,
+                food_name=food["name"],
+                quantity_g=item.quantity_g,
+                kcal=food["kcal_per_100g"] * factor,
+                protein=food["protein_per_100g"] * factor,
+                carbs=food["carbs_per_100g"] * factor,
+                fats=food["fats_per_100g"] * factor
+            ))
+        meals.append(Meal(
+            meal_number=meal_input.meal_number,
+            meal_name=meal_input.meal_name,
+            foods=items,
+            total_kcal=sum(i.kcal for i in items),
+            total_protein=sum(i.protein for i in items),
+            total_carbs=sum(i.carbs for i in items),
+            total_fats=sum(i.fats for i in items)
+        ))
+    return meals
+
+def diet_totals(meals: List[Meal]) -> dict:
+    return {
+        "total_kcal": sum(meal.total_kcal for meal in meals),
+        "total_protein": sum(meal.total_protein for meal in meals),
+        "total_carbs": sum(meal.total_carbs for meal in meals),
+        "total_fats": sum(meal.total_fats for meal in meals),
+    }
+
+def diet_update_fields(diet_data: DietCreate, meals: List[Meal]) -> dict:
+    return {
+        "name": diet_data.name,
+        "meals": [meal.model_dump() for meal in meals],
+        **diet_totals(meals),
+        "updated_at": datetime.now(timezone.utc),
+        "has_revisions": False  # set once record_diet_revision has stored the new version
+    }
+
+async def build_meals(trainer_id: str, meal_inputs: List[MealInput], food_cache: Optional[dict] = None) -> List[Meal]:
+    food_ids = [item.food_id for meal in meal_inputs for item in meal.foods]
+    foods = await load_foods(trainer_id, food_ids, food_cache)
+    return compute_meals(meal_inputs, foods)
+
 # ============ DIET ROUTES ============
 
 @api_router.post("/diets", response_model=Diet)
 async def create_diet(diet_data: DietCreate, current_user: User = Depends(get_current_user)):
-    # Verify client belongs to trainer
-    client = await db.clients.find_one({"id": diet_data.client_id, "trainer_id": current_user.id}, {"_id": 0})
+    # Verify client belongs to trainer while the referenced foods load
+    client, meals = await asyncio.gather(
+        db.clients.find_one({"id": diet_data.client_id, "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0, "id": 1}),
+        build_meals(current_user.id, diet_data.meals)
+    )
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Calculate totals
-    total_kcal = sum(meal.total_kcal for meal in diet_data.meals)
-    total_protein = sum(meal.total_protein for meal in diet_data.meals)
-    total_carbs = sum(meal.total_carbs for meal in diet_data.meals)
-    total_fats = sum(meal.total_fats for meal in diet_data.meals)
-    
     diet = Diet(
         client_id=diet_data.client_id,
         trainer_id=current_user.id,
         name=diet_data.name,
-        meals=diet_data.meals,
-        total_kcal=total_kcal,
-        total_protein=total_protein,
-        total_carbs=total_carbs,
-        total_fats=total_fats
+        meals=meals,
+        **diet_totals(meals)
     )
     
     doc = diet.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
     
     await db.diets.insert_one(doc)
+    summary = SummaryDelta(current_user.id)
+    summary.diet_added(doc)
+    await summary.apply()
     return diet
 
+async def live_diets_query(trainer_id: str, **filters) -> dict:
+    """Diets of the trainer's live clients: a deleted client's diets only wait for the cascade purge"""
+    query = {"trainer_id": trainer_id, **filters}
+    tombstoned = await db.clients.distinct("id", {"trainer_id": trainer_id, "deleted_at": {"$ne": None}})
+    if tombstoned:
+        query["client_id"] = {**({"$eq": query["client_id"]} if "client_id" in query else {}), "$nin": tombstoned}
+    return query
+
 @api_router.get("/diets", response_model=List[Diet])
-async def get_diets(client_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
-    query = {"trainer_id": current_user.id}
-    if client_id:
-        query["client_id"] = client_id
-    
-    diets = await db.diets.find(query, {"_id": 0}).to_list(1000)
-    
-    for diet in diets:
-        if isinstance(diet.get('created_at'), str):
-            diet['created_at'] = datetime.fromisoformat(diet['created_at'])
-        if isinstance(diet.get('updated_at'), str):
-            diet['updated_at'] = datetime.fromisoformat(diet['updated_at'])
+async def get_diets(
+    response: Response,
+    client_id: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    query = await live_diets_query(current_user.id, **({"client_id": client_id} if client_id else {}))
+    projection = parse_fields(fields, Diet)
+    diets, next_cursor = await find_page(db.diets, query, limit, cursor, projection)
+    if projection:
+        return projected_page(diets, next_cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return diets
 
 @api_router.get("/diets/{diet_id}", response_model=Diet)
-async def get_diet(diet_id: str, current_user: User = Depends(get_current_user)):
+async def get_diet(diet_id: str, response: Response, current_user: User = Depends(get_current_user)):
+    diet = await db.diets.find_one(await live_diets_query(current_user.id, id=diet_id), {"_id": 0})
+    if not diet:
+        raise HTTPException(status_code=404, detail="Diet not found")
+    
+    response.headers["ETag"] = version_etag(diet)
+    return Diet(**diet)
+
+@api_router.get("/diets/{diet_id}/detail", response_model=DietDetail)
+async def get_diet_detail(diet_id: str, response: Response, current_user: User = Depends(get_current_user)):
+    """Diet with its client and only the foods it references, in one request"""
     diet = await db.diets.find_one({"id": diet_id, "trainer_id": current_user.id}, {"_id": 0})
     if not diet:
         raise HTTPException(status_code=404, detail="Diet not found")
     
-    if isinstance(diet.get('created_at'), str):
-        diet['created_at'] = datetime.fromisoformat(diet['created_at'])
-    if isinstance(diet.get('updated_at'), str):
-        diet['updated_at'] = datetime.fromisoformat(diet['updated_at'])
+    food_ids = [item["food_id"] for meal in diet["meals"] for item in meal["foods"]]
+    client, foods = await asyncio.gather(
+        db.clients.find_one({"id": diet["client_id"], "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0}),
+        load_foods(current_user.id, food_ids)
+    )
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
     
-    return Diet(**diet)
+    response.headers["ETag"] = version_etag(diet)
+    foods = {**stored_foods(diet["meals"]), **foods}
+    return DietDetail(diet=Diet(**diet), client=Client(**client), foods=list(foods.values()))
 
 @api_router.delete("/diets/{diet_id}")
 async def delete_diet(diet_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.diets.delete_one({"id": diet_id, "trainer_id": current_user.id})
-    if result.deleted_count == 0:
+    # A deleted client's diets already left the summary with the client
+    query = await live_diets_query(current_user.id, id=diet_id)
+    diet = await db.diets.find_one_and_delete(query, projection={"_id": 0, "meals": 0})
+    if diet is None:
         raise HTTPException(status_code=404, detail="Diet not found")
+    
+    await asyncio.gather(pdf_cache.invalidate_diet(diet_id), db.diet_revisions.delete_many({"diet_id": diet_id}))
+    summary = SummaryDelta(current_user.id)
+    summary.diet_removed(diet)
+    await summary.apply()
     return {"message": "Diet deleted successfully"}
 
 @api_router.put("/diets/{diet_id}", response_model=Diet)
-async def update_diet(diet_id: str, diet_data: DietCreate, current_user: User = Depends(get_current_user)):
-    # Verify diet exists and belongs to trainer
-    existing_diet = await db.diets.find_one({"id": diet_id, "trainer_id": current_user.id}, {"_id": 0})
-    if not existing_diet:
+async def update_diet(
+    diet_id: str,
+    diet_data: DietCreate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    expected = parse_if_match(if_match)
+    # A deleted client's diets already left the summary with the client, so they are not editable
+    query = await live_diets_query(current_user.id, id=diet_id)
+    # The stored items stand in for foods deleted since; the update is pinned to the version they came from
+    diet = await db.diets.find_one(query, {"_id": 0, "version": 1, "meals": 1})
+    if not diet:
         raise HTTPException(status_code=404, detail="Diet not found")
+    check_version(diet, expected)
+    expected = diet.get("version", 0)
+    foods = await load_foods(current_user.id, [item.food_id for meal in diet_data.meals for item in meal.foods])
+    meals = compute_meals(diet_data.meals, {**stored_foods(diet["meals"]), **foods})
     
-    # Calculate totals
-    total_kcal = sum(meal.total_kcal for meal in diet_data.meals)
-    total_protein = sum(meal.total_protein for meal in diet_data.meals)
-    total_carbs = sum(meal.total_carbs for meal in diet_data.meals)
-    total_fats = sum(meal.total_fats for meal in diet_data.meals)
-    
-    update_data = {
-        "name": diet_data.name,
-        "meals": [meal.model_dump() for meal in diet_data.meals],
-        "total_kcal": total_kcal,
-        "total_protein": total_protein,
-        "total_carbs": total_carbs,
-        "total_fats": total_fats,
-        "updated_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.diets.update_one({"id": diet_id}, {"$set": update_data})
-    
-    updated_diet = await db.diets.find_one({"id": diet_id}, {"_id": 0})
-    if isinstance(updated_diet.get('created_at'), str):
-        updated_diet['created_at'] = datetime.fromisoformat(updated_diet['created_at'])
-    if isinstance(updated_diet.get('updated_at'), str):
-        updated_diet['updated_at'] = datetime.fromisoformat(updated_diet['updated_at'])
+    # Ownership and version are part of the filter, so a concurrent edit cannot be overwritten.
+    # The previous totals come back for the summary; the new document is rebuilt from the update.
+    update_data = diet_update_fields(diet_data, meals)
+    previous = await find_and_update(db.diets, query, update_data, expected, ReturnDocument.BEFORE)
+    if previous is None:
+        raise await update_miss(db.diets, query, expected, "Diet")
+    updated_diet = {**previous, **update_data, "version": previous.get("version", 0) + 1}
+    await asyncio.gather(pdf_cache.invalidate_diet(diet_id), record_diet_revision(previous, updated_diet))
+    summary = SummaryDelta(current_user.id)
+    summary.diet_changed(previous, updated_diet)
+    await summary.apply()
     
+    response.headers["ETag"] = version_etag(updated_diet)
     return Diet(**updated_diet)
 
-# ============ PDF EXPORT ============
-
-@api_router.get("/diets/{diet_id}/export")
-async def export_diet_pdf(diet_id: str, current_user: User = Depends(get_current_user)):
-    diet = await db.diets.find_one(
-        {"id": diet_id, "trainer_id": current_user.id},
-        {"_id": 0}
+# ============ DIET REVISIONS ============
+
+def revision_doc(diet: dict, previous: Optional[dict] = None) -> dict:
+    """A diet version as stored in diet_revisions: in full without `previous`, else as a delta against it"""
+    doc = {
+        "diet_id": diet["id"],
+        "trainer_id": diet["trainer_id"],
+        "version": diet.get("version", 0),
+        "name": diet["name"],
+        "total_kcal": diet["total_kcal"],
+        "created_at": diet["updated_at"],
+        "snapshot": previous is None,
+    }
+    if previous is None:
+        doc["state"] = revision_state(diet)
+    else:
+        doc["delta"] = diff_diet(previous, diet)
+    return doc
+
+async def record_diet_revision(previous: dict, updated: dict) -> bool:
+    """Store the version an update produced, and the one it replaced unless that one is known to be stored.
+
+    has_revisions is only set once the insert went through, so a diet whose
+    last revision was lost stores its current version in full next time.
+    """
+    docs = [] if previous.get("has_revisions") else [revision_doc(previous)]
+    snapshot = updated["version"] % DIET_SNAPSHOT_INTERVAL == 0
+    docs.append(revision_doc(updated, None if snapshot else previous))
+    try:
+        await db.diet_revisions.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        if any(error.get("code") != 11000 for error in exc.details["writeErrors"]):
+            # The diet itself is saved either way
+            logger.exception("Diet %s revision %s not recorded", updated["id"], updated["version"])
+            return False
+        # Only duplicates of versions already recorded
+    # Pinned to the version: a newer update records (and flags) its own
+    await db.diets.update_one({"id": updated["id"], "version": updated["version"]}, {"$set": {"has_revisions": True}})
+    return True
+
+async def materialize_revision(diet_id: str, trainer_id: str, version: int) -> Optional[dict]:
+    """Revision state of one version: the nearest snapshot at or before it plus the deltas after it"""
+    query = {"diet_id": diet_id, "trainer_id": trainer_id}
+    snapshot = await db.diet_revisions.find_one(
+        {**query, "version": {"$lte": version}, "snapshot": True},
+        {"_id": 0},
+        sort=[("version", -1)]
+    )
+    if snapshot is None:
+        return None
+    state = snapshot["state"]
+    expected = snapshot["version"] + 1
+    deltas = db.diet_revisions.find(
+        {**query, "version": {"$gt": snapshot["version"], "$lte": version}},
+        {"_id": 0, "version": 1, "delta": 1, "state": 1, "created_at": 1}
+    ).sort("version", ASCENDING)
+    created_at = snapshot["created_at"]
+    async for revision in deltas:
+        if revision["version"] != expected:
+            return None  # a missing revision breaks the chain
+        state = revision["state"] if revision.get("state") else apply_delta(state, revision["delta"])
+        created_at = revision["created_at"]
+        expected += 1
+    if expected != version + 1:
+        return None
+    return {**state, "updated_at": created_at}
+
+@api_router.get("/diets/{diet_id}/revisions", response_model=List[DietRevision])
+async def get_diet_revisions(diet_id: str, current_user: User = Depends(get_current_user)):
+    """Recorded versions of a diet, newest first; a diet that was never edited has none"""
+    if not await db.diets.count_documents({"id": diet_id, "trainer_id": current_user.id}, limit=1):
+        raise HTTPException(status_code=404, detail="Diet not found")
+    revisions = await db.diet_revisions.find(
+        {"diet_id": diet_id, "trainer_id": current_user.id},
+        {"_id": 0, "version": 1, "snapshot": 1, "name": 1, "total_kcal": 1, "created_at": 1}
+    ).sort("version", -1).to_list(None)
+    return revisions
+
+@api_router.get("/diets/{diet_id}/revisions/{version}", response_model=Diet)
+async def get_diet_revision(diet_id: str, version: int, current_user: User = Depends(get_current_user)):
+    """A diet as it was at one version"""
+    diet, state = await asyncio.gather(
+        db.diets.find_one({"id": diet_id, "trainer_id": current_user.id}, {"_id": 0}),
+        materialize_revision(diet_id, current_user.id, version)
     )
     if not diet:
         raise HTTPException(status_code=404, detail="Diet not found")
+    if state is None:
+        if version != diet.get("version", 0):
+            raise HTTPException(status_code=404, detail="Revision not found")
+        state = diet  # never edited: the current version is the only one
+    return Diet(**{**diet, **state, "version": version})
+
+# ============ DIET TEMPLATES ============
+
+async def template_meals(template_data: DietTemplateCreate, trainer_id: str) -> List[MealInput]:
+    if (template_data.meals is None) == (template_data.diet_id is None):
+        raise HTTPException(status_code=400, detail="Give either meals or diet_id")
+    if template_data.diet_id is None:
+        meals = template_data.meals
+        # Unknown foods are rejected now rather than on every apply
+        compute_meals(meals, await load_foods(trainer_id, [item.food_id for meal in meals for item in meal.foods]))
+        return meals
+    
+    diet = await db.diets.find_one({"id": template_data.diet_id, "trainer_id": trainer_id}, {"_id": 0, "meals": 1})
+    if not diet:
+        raise HTTPException(status_code=404, detail="Diet not found")
+    return [MealInput(**meal) for meal in diet["meals"]]
 
-    client = await db.clients.find_one(
-        {"id": diet["client_id"]},
-        {"_id": 0}
+@api_router.post("/templates", response_model=DietTemplate)
+async def create_template(template_data: DietTemplateCreate, current_user: User = Depends(get_current_user)):
+    template = DietTemplate(
+        trainer_id=current_user.id,
+        name=template_data.name,
+        meals=await template_meals(template_data, current_user.id)
     )
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
+    await db.diet_templates.insert_one(template.model_dump())
+    return template
+
+@api_router.get("/templates", response_model=List[DietTemplate])
+async def get_templates(
+    response: Response,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    templates, next_cursor = await find_page(db.diet_templates, {"trainer_id": current_user.id}, limit, cursor, None)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return templates
+
+@api_router.get("/templates/{template_id}", response_model=DietTemplate)
+async def get_template(template_id: str, response: Response, current_user: User = Depends(get_current_user)):
+    template = await db.diet_templates.find_one({"id": template_id, "trainer_id": current_user.id}, {"_id": 0})
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    response.headers["ETag"] = version_etag(template)
+    return DietTemplate(**template)
+
+@api_router.put("/templates/{template_id}", response_model=DietTemplate)
+async def update_template(
+    template_id: str,
+    template_data: DietTemplateCreate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    expected = parse_if_match(if_match)
+    query = {"id": template_id, "trainer_id": current_user.id}
+    meals = await template_meals(template_data, current_user.id)
+    update_data = {
+        "name": template_data.name,
+        "meals": [meal.model_dump() for meal in meals],
+        "updated_at": datetime.now(timezone.utc)
+    }
+    updated_template = await find_and_update(db.diet_templates, query, update_data, expected)
+    if updated_template is None:
+        raise await update_miss(db.diet_templates, query, expected, "Template")
+    
+    response.headers["ETag"] = version_etag(updated_template)
+    return DietTemplate(**updated_template)
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2 * cm,
-        leftMargin=2 * cm,
-        topMargin=2 * cm,
-        bottomMargin=2 * cm
+@api_router.delete("/templates/{template_id}")
+async def delete_template(template_id: str, current_user: User = Depends(get_current_user)):
+    result = await db.diet_templates.delete_one({"id": template_id, "trainer_id": current_user.id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"message": "Template deleted successfully"}
+
+def client_macro_targets(client: dict) -> np.ndarray:
+    return macro_targets(
+        client.get("target_kcal") or client["maintenance_kcal"],
+        client.get("protein_percentage") or 30.0,
+        client.get("carbs_percentage") or 40.0,
+        client.get("fats_percentage") or 30.0
     )
 
-    styles = getSampleStyleSheet()
-    story = []
-
-    # ================= STYLES =================
-
-    title_style = ParagraphStyle(
-        "Title",
-        fontSize=22,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
-        spaceAfter=20
+def scaled_diets(template: dict, name: str, clients: List[dict], foods: dict, step_g: float) -> List[dict]:
+    """One diet document per client, every client scaled in the same NumPy pass"""
+    meal_inputs = template["meals"]
+    items = [item for meal in meal_inputs for item in meal["foods"]]
+    per_gram = per_gram_matrix([foods[item["food_id"]] for item in items])
+    grams, item_macros, meal_totals = scale_template(
+        per_gram,
+        np.array([item["quantity_g"] for item in items], dtype=float),
+        np.array([client_macro_targets(client) for client in clients]).reshape(-1, 4),
+        [len(meal["foods"]) for meal in meal_inputs],
+        step_g
     )
+    # Plain lists are much faster to index than per-element NumPy scalars
+    grams, item_macros, meal_totals = grams.tolist(), item_macros.tolist(), meal_totals.tolist()
+    names = [foods[item["food_id"]]["name"] for item in items]
+    
+    now = datetime.now(timezone.utc)
+    diets = []
+    for row, client in enumerate(clients):
+        protein, carbs, fats, kcal = item_macros[row]
+        meals = []
+        start = 0
+        for number, meal in enumerate(meal_inputs):
+            end = start + len(meal["foods"])
+            meals.append({
+                "meal_number": meal["meal_number"],
+                "meal_name": meal["meal_name"],
+                "foods": [
+                    {
+                        "food_id": items[i]["food_id"], "food_name": names[i], "quantity_g": grams[row][i],
+                        "kcal": kcal[i], "protein": protein[i], "carbs": carbs[i], "fats": fats[i],
+                    }
+                    for i in range(start, end)
+                ],
+                "total_kcal": meal_totals[row][3][number],
+                "total_protein": meal_totals[row][0][number],
+                "total_carbs": meal_totals[row][1][number],
+                "total_fats": meal_totals[row][2][number],
+            })
+            start = end
+        diets.append({
+            "id": str(uuid.uuid4()),
+            "client_id": client["id"],
+            "trainer_id": template["trainer_id"],
+            "name": name,
+            "meals": meals,
+            "total_kcal": sum(meal["total_kcal"] for meal in meals),
+            "total_protein": sum(meal["total_protein"] for meal in meals),
+            "total_carbs": sum(meal["total_carbs"] for meal in meals),
+            "total_fats": sum(meal["total_fats"] for meal in meals),
+            "created_at": now,
+            "updated_at": now,
+            "version": 0,
+        })
+    return diets
 
-    meal_style = ParagraphStyle(
-        "MealTitle",
-        fontSize=14,
-        fontName="Helvetica-Bold",
-        spaceAfter=10
+@api_router.post("/templates/{template_id}/apply", response_model=List[DietSummary])
+async def apply_template(template_id: str, request: TemplateApplyRequest, current_user: User = Depends(get_current_user)):
+    """Create one diet per client from a template, scaled to each client's kcal target and macro split"""
+    template = await db.diet_templates.find_one({"id": template_id, "trainer_id": current_user.id}, {"_id": 0})
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    client_ids = list(dict.fromkeys(request.client_ids))
+    food_ids = [item["food_id"] for meal in template["meals"] for item in meal["foods"]]
+    client_docs, foods = await asyncio.gather(
+        find_by_ids(db.clients, client_ids, {"trainer_id": current_user.id, **LIVE_CLIENT}, CLIENT_TARGET_PROJECTION),
+        load_foods(current_user.id, food_ids)
     )
+    missing = [client_id for client_id in client_ids if client_id not in client_docs]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Clients not found: {', '.join(missing)}")
+    unknown = sorted(set(food_ids) - set(foods))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown food ids: {', '.join(unknown)}")
+    clients = [client_docs[client_id] for client_id in client_ids]
+    no_target = [c["id"] for c in clients if not (c.get("target_kcal") or c.get("maintenance_kcal"))]
+    if no_target:
+        raise HTTPException(status_code=400, detail=f"Clients have no calorie target: {', '.join(no_target)}")
+    
+    diets = await asyncio.to_thread(scaled_diets, template, request.name or template["name"], clients, foods, request.step_g)
+    await db.diets.insert_many([{**diet} for diet in diets], ordered=False)
+    summary = SummaryDelta(current_user.id)
+    for diet in diets:
+        summary.diet_added(diet)
+    await summary.apply()
+    return diets
 
-    small_style = ParagraphStyle(
-        "Small",
-        fontSize=10,
-        spaceAfter=6
+# ============ PLANS ============
+
+def sum_totals(parts) -> dict:
+    parts = list(parts)
+    return {field: sum(part[field] for part in parts) for field in TOTAL_FIELDS}
+
+def plan_meals(meal_inputs: List[PlanMealInput], foods: dict) -> List[dict]:
+    ids = [meal.id for meal in meal_inputs]
+    duplicates = sorted({meal_id for meal_id in ids if ids.count(meal_id) > 1})
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate meal ids: {', '.join(duplicates)}")
+    meals = compute_meals(
+        [MealInput(meal_number=number, meal_name=meal.meal_name, foods=meal.foods)
+         for number, meal in enumerate(meal_inputs, start=1)],
+        foods
     )
+    return [{"id": meal_input.id, **meal.model_dump(exclude={"meal_number"})} for meal_input, meal in zip(meal_inputs, meals)]
+
+def plan_day(day: PlanDayInput, meals: dict) -> dict:
+    """A day with its totals summed from the stored totals of the meals it references"""
+    unknown = sorted(set(day.meal_ids) - set(meals))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown meal ids: {', '.join(unknown)}")
+    return {"name": day.name, "meal_ids": day.meal_ids, **sum_totals(meals[meal_id] for meal_id in day.meal_ids)}
+
+async def plan_fields(plan_data: PlanCreate, trainer_id: str) -> dict:
+    food_ids = [item.food_id for meal in plan_data.meals for item in meal.foods]
+    meals = plan_meals(plan_data.meals, await load_foods(trainer_id, food_ids))
+    meals_by_id = {meal["id"]: meal for meal in meals}
+    days = [plan_day(day, meals_by_id) for day in plan_data.days]
+    return {"name": plan_data.name, "meals": meals, "days": days, **sum_totals(days)}
+
+async def read_plan(query: dict, expected: Optional[int]) -> dict:
+    plan = await db.plans.find_one(query, {"_id": 0})
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    check_version(plan, expected)
+    return plan
+
+async def save_plan_changes(query: dict, plan: dict, update_data: dict, response: Response) -> Plan:
+    """Write an edit computed from `plan`, pinned to the version it was read at"""
+    expected = plan.get("version", 0)
+    updated_plan = await find_and_update(db.plans, query, update_data, expected)
+    if updated_plan is None:
+        raise await update_miss(db.plans, query, expected, "Plan")
+    await pdf_cache.invalidate_diet(plan["id"])
+    
+    response.headers["ETag"] = version_etag(updated_plan)
+    return Plan(**updated_plan)
+
+@api_router.post("/plans", response_model=Plan)
+async def create_plan(plan_data: PlanCreate, current_user: User = Depends(get_current_user)):
+    client, fields = await asyncio.gather(
+        db.clients.find_one({"id": plan_data.client_id, "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0, "id": 1}),
+        plan_fields(plan_data, current_user.id)
+    )
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    plan = Plan(client_id=plan_data.client_id, trainer_id=current_user.id, **fields)
+    await db.plans.insert_one(plan.model_dump())
+    return plan
+
+@api_router.get("/plans", response_model=List[Plan])
+async def get_plans(
+    response: Response,
+    client_id: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    query = {"trainer_id": current_user.id}
+    if client_id:
+        query["client_id"] = client_id
+    
+    plans, next_cursor = await find_page(db.plans, query, limit, cursor, None)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return plans
+
+@api_router.get("/plans/{plan_id}", response_model=Plan)
+async def get_plan(plan_id: str, response: Response, current_user: User = Depends(get_current_user)):
+    plan = await db.plans.find_one({"id": plan_id, "trainer_id": current_user.id}, {"_id": 0})
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    
+    response.headers["ETag"] = version_etag(plan)
+    return Plan(**plan)
+
+@api_router.put("/plans/{plan_id}", response_model=Plan)
+async def update_plan(
+    plan_id: str,
+    plan_data: PlanCreate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Replace every meal and day of a plan"""
+    expected = parse_if_match(if_match)
+    query = {"id": plan_id, "trainer_id": current_user.id}
+    update_data = {**await plan_fields(plan_data, current_user.id), "updated_at": datetime.now(timezone.utc)}
+    updated_plan = await find_and_update(db.plans, query, update_data, expected)
+    if updated_plan is None:
+        raise await update_miss(db.plans, query, expected, "Plan")
+    await pdf_cache.invalidate_diet(plan_id)
+    
+    response.headers["ETag"] = version_etag(updated_plan)
+    return Plan(**updated_plan)
+
+@api_router.put("/plans/{plan_id}/meals/{meal_id}", response_model=Plan)
+async def update_plan_meal(
+    plan_id: str,
+    meal_id: str,
+    meal_data: PlanMealUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Edit one shared meal; only the days that use it and the plan totals are recomputed"""
+    query = {"id": plan_id, "trainer_id": current_user.id}
+    plan, foods = await asyncio.gather(
+        read_plan(query, parse_if_match(if_match)),
+        load_foods(current_user.id, [item.food_id for item in meal_data.foods])
+    )
+    index = next((number for number, meal in enumerate(plan["meals"]) if meal["id"] == meal_id), None)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    
+    meal = plan_meals([PlanMealInput(id=meal_id, **meal_data.model_dump())], foods)[0]
+    meals = {**{m["id"]: m for m in plan["meals"]}, meal_id: meal}
+    update_data = {f"meals.{index}": meal, "updated_at": datetime.now(timezone.utc)}
+    days = plan["days"]
+    for number, day in enumerate(days):
+        if meal_id in day["meal_ids"]:
+            days[number] = {**day, **sum_totals(meals[i] for i in day["meal_ids"])}
+            update_data.update({f"days.{number}.{field}": days[number][field] for field in TOTAL_FIELDS})
+    update_data.update(sum_totals(days))
+    return await save_plan_changes(query, plan, update_data, response)
+
+@api_router.put("/plans/{plan_id}/days/{day_index}", response_model=Plan)
+async def update_plan_day(
+    plan_id: str,
+    day_index: int,
+    day_data: PlanDayInput,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Rename a day or change which meals it uses; its totals come from the stored meal totals"""
+    query = {"id": plan_id, "trainer_id": current_user.id}
+    plan = await read_plan(query, parse_if_match(if_match))
+    days = plan["days"]
+    if not 0 <= day_index < len(days):
+        raise HTTPException(status_code=404, detail="Day not found")
+    
+    days[day_index] = plan_day(day_data, {meal["id"]: meal for meal in plan["meals"]})
+    update_data = {f"days.{day_index}": days[day_index], **sum_totals(days), "updated_at": datetime.now(timezone.utc)}
+    return await save_plan_changes(query, plan, update_data, response)
 
-    # ================= HEADER =================
-
-    header_table_data = []
+@api_router.delete("/plans/{plan_id}")
+async def delete_plan(plan_id: str, current_user: User = Depends(get_current_user)):
+    result = await db.plans.delete_one({"id": plan_id, "trainer_id": current_user.id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    
+    await pdf_cache.invalidate_diet(plan_id)
+    return {"message": "Plan deleted successfully"}
+
+# ============ DIET GENERATOR ============
+
+def solve_meals(request: DietGenerateRequest, foods: dict, daily_targets) -> List[MealInput]:
+    """Pick foods and grams for every meal of the template (CPU bound, run off the event loop)"""
+    share_total = sum(meal.kcal_share for meal in request.meals)
+    meal_inputs = []
+    for number, template in enumerate(request.meals, start=1):
+        candidate_ids = template.food_ids or request.food_ids or list(foods)
+        candidates = [foods[food_id] for food_id in dict.fromkeys(candidate_ids)]
+        quantities = solve_quantities(
+            per_gram_matrix(candidates),
+            daily_targets * (template.kcal_share / share_total),
+            min_g=request.min_g,
+            max_g=request.max_g,
+            step_g=request.step_g,
+            max_foods=request.max_foods_per_meal
+        )
+        items = sorted(
+            (FoodItemInput(food_id=food["id"], quantity_g=float(grams))
+             for food, grams in zip(candidates, quantities) if grams > 0),
+            key=lambda item: -item.quantity_g
+        )
+        meal_inputs.append(MealInput(meal_number=number, meal_name=template.meal_name, foods=items))
+    return meal_inputs
 
-    # Logo (optional)
-    logo_path = "assets/logo.png"
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=3 * cm, height=3 * cm)
+@api_router.post("/diets/generate", response_model=Diet)
+async def generate_diet(request: DietGenerateRequest, current_user: User = Depends(get_current_user)):
+    client = await db.clients.find_one({"id": request.client_id, "trainer_id": current_user.id, **LIVE_CLIENT}, {"_id": 0})
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    target_kcal = client.get("target_kcal") or client.get("maintenance_kcal")
+    if not target_kcal:
+        raise HTTPException(status_code=400, detail="Client has no calorie target")
+    
+    if request.food_ids is None and any(meal.food_ids is None for meal in request.meals):
+        foods = await trainer_library(current_user.id)
     else:
-        logo = ""
+        candidate_ids = (request.food_ids or []) + [i for meal in request.meals for i in meal.food_ids or []]
+        foods = await load_foods(current_user.id, candidate_ids)
+        unknown = sorted(set(candidate_ids) - set(foods))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown food ids: {', '.join(unknown)}")
+    if not foods:
+        raise HTTPException(status_code=400, detail="No candidate foods")
+    
+    daily_targets = macro_targets(
+        target_kcal,
+        client.get("protein_percentage") or 30.0,
+        client.get("carbs_percentage") or 40.0,
+        client.get("fats_percentage") or 30.0
+    )
+    meal_inputs = await asyncio.to_thread(solve_meals, request, foods, daily_targets)
+    meals = compute_meals(meal_inputs, foods)
+    
+    diet = Diet(
+        client_id=request.client_id,
+        trainer_id=current_user.id,
+        name=request.name,
+        meals=meals,
+        **diet_totals(meals)
+    )
+    if request.save:
+        doc = diet.model_dump()
+        await db.diets.insert_one(doc)
+        summary = SummaryDelta(current_user.id)
+        summary.diet_added(doc)
+        await summary.apply()
+    return diet
 
-    header_table_data.append([
-        Paragraph(f"DIETA – {client['name']}", title_style),
-        logo
-    ])
+# ============ BATCH WRITES ============
+
+# Writes go out one collection at a time in this order
+BATCH_WRITE_ORDER = ["clients", "foods", "food_overrides", "diets"]
+
+BATCH_MODELS = {
+    ("clients", "create"): ClientCreate,
+    ("clients", "update"): ClientUpdate,
+    ("foods", "create"): FoodCreate,
+    ("foods", "update"): FoodCreate,
+    ("diets", "create"): DietCreate,
+    ("diets", "update"): DietCreate,
+}
+
+async def find_by_ids(collection, ids, query: dict, projection: dict) -> dict:
+    if not ids:
+        return {}
+    docs = await collection.find({"id": {"$in": list(ids)}, **query}, projection).to_list(None)
+    return {doc["id"]: doc for doc in docs}
+
+class BatchWriter:
+    """Plans a batch against one read per collection, then writes it collection by collection.
+
+    Operations are validated and applied to the pre-read state in order, so
+    later operations see earlier ones (a client deleted in the batch cannot
+    get a diet further down). Each operation gets its own result; outside a
+    transaction, an operation whose write failed takes down the operations
+    planned on top of it (424).
+    """
+
+    def __init__(self, user: User, operations: List[BatchOperation]):
+        self.user = user
+        self.operations = operations
+        self.results = [BatchResult(index=index, status=200, id=op.id) for index, op in enumerate(operations)]
+        self.parsed = {}
+        self.writes = defaultdict(list)  # collection -> [(operation index, write model)]
+        self.pinned = defaultdict(list)  # collection -> indexes of version-pinned updates
+        self.last_write = {}  # (collection, id) -> index of the latest operation writing that document
+        self.depends = defaultdict(set)  # operation index -> indexes of the operations it was planned on
+        self.clients = {}
+        self.foods = {}
+        self.overrides = {}
+        self.diets = {}
+        self.food_cache = {}
+        self.foods_changed = False
+        self.changed_diets = set()
+        self.deleted_clients = []  # (operation index, client id), purged by the cascade worker
+        self.summary_changes = []  # (operation index, SummaryDelta method name, args)
+        self.diet_revisions = []  # (operation index, diet before, diet after)
+        self.deleted_diets = []  # (operation index, diet id)
+
+    @property
+    def failed(self) -> bool:
+        return any(result.error for result in self.results)
+
+    def _fail(self, index: int, status: int, error: str) -> None:
+        self.results[index].status = status
+        self.results[index].error = error
+        self.results[index].data = None
+
+    def _pending(self, collection: str):
+        return [
+            (index, op) for index, op in enumerate(self.operations)
+            if op.collection == collection and not self.results[index].error
+        ]
 
-    header = Table(header_table_data, colWidths=[12 * cm, 4 * cm])
-    header.setStyle(TableStyle([
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("ALIGN", (1, 0), (1, 0), "RIGHT"),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
-    ]))
+    def _write(self, collection: str, index: int, operation, doc_id: str) -> None:
+        self._requires(index, collection, doc_id)
+        self.last_write[(collection, doc_id)] = index
+        self.writes[collection].append((index, operation))
+
+    def _requires(self, index: int, collection: str, doc_id: str) -> None:
+        """Record that the operation was planned on the batch's earlier write to this document, if any"""
+        writer = self.last_write.get((collection, doc_id))
+        if writer is not None and writer != index:
+            self.depends[index].add(writer)
+
+    def _blocked(self, index: int) -> bool:
+        return any(self.results[writer].error for writer in self.depends.get(index, ()))
+
+    def _summarize(self, index: int, change: str, *args) -> None:
+        self.summary_changes.append((index, change, args))
+
+    def parse(self) -> None:
+        for index, op in enumerate(self.operations):
+            if op.op != "create" and not op.id:
+                self._fail(index, 422, f"id is required to {op.op}")
+                continue
+            model = BATCH_MODELS.get((op.collection, op.op))
+            if model is None:
+                continue
+            try:
+                self.parsed[index] = model.model_validate(op.data or {})
+            except ValidationError as exc:
+                self._fail(index, 422, validation_message(exc))
+
+    async def preload(self) -> None:
+        """Read every client, food and diet the batch references with one $in query each"""
+        trainer_id = self.user.id
+        client_ids = {op.id for _, op in self._pending("clients") if op.id}
+        diet_ids = {op.id for _, op in self._pending("diets") if op.id}
+        food_ids = {op.id for _, op in self._pending("foods") if op.id}
+        meal_food_ids = []
+        for index, op in self._pending("diets"):
+            if op.op == "create":
+                client_ids.add(self.parsed[index].client_id)
+            if index in self.parsed:
+                meal_food_ids += [item.food_id for meal in self.parsed[index].meals for item in meal.foods]
+        
+        diet_query = await live_diets_query(trainer_id) if diet_ids else {}
+        self.clients, self.foods, self.diets, self.overrides, _ = await asyncio.gather(
+            find_by_ids(db.clients, client_ids, {"trainer_id": trainer_id, **LIVE_CLIENT}, {"_id": 0}),
+            find_by_ids(db.foods, food_ids, {"created_by": trainer_id}, {"_id": 0}),
+            find_by_ids(db.diets, diet_ids, diet_query, {"_id": 0}),
+            load_overrides(trainer_id, [food_id for food_id in food_ids if food_id in food_catalog]),
+            load_foods(trainer_id, meal_food_ids, self.food_cache)
+        )
 
-    story.append(header)
-    story.append(Spacer(1, 0.5 * cm))
+    def plan(self) -> None:
+        for index, op in enumerate(self.operations):
+            if self.results[index].error:
+                continue
+            handler = getattr(self, f"_{op.op}_{op.collection}")
+            try:
+                self.results[index].status, data = handler(index, op, self.parsed.get(index))
+            except HTTPException as exc:
+                self._fail(index, exc.status_code, exc.detail)
+                continue
+            if data is not None:
+                # Snapshot: later operations in the batch may change the same document
+                self.results[index].id = data["id"]
+                self.results[index].data = {**data}
+
+    def _get(self, docs: dict, doc_id: str, label: str, version: Optional[int] = None) -> dict:
+        doc = docs.get(doc_id)
+        if doc is None:
+            raise HTTPException(status_code=404, detail=f"{label} not found")
+        check_version(doc, version)
+        return doc
+
+    def _update(self, collection: str, index: int, query: dict, doc: dict, update_data: dict) -> None:
+        """Queue an update pinned to the version it was planned against"""
+        self._write(collection, index, UpdateOne(
+            {**query, **version_filter(doc.get("version", 0))},
+            {"$set": update_data, "$inc": {"version": 1}}
+        ), doc["id"])
+        self.pinned[collection].append(index)
+        doc.update(update_data)
+        doc["version"] = doc.get("version", 0) + 1
+
+    def _create_clients(self, index, op, data: ClientCreate):
+        client = build_client(data, self.user).model_dump()
+        self._write("clients", index, InsertOne({**client}), client["id"])
+        self._summarize(index, "client_added", {**client})
+        self.clients[client["id"]] = client
+        return 201, client
+
+    def _update_clients(self, index, op, data: ClientUpdate):
+        client = self._get(self.clients, op.id, "Client", op.version)
+        update_data = client_update_fields(client, data.model_dump(exclude_unset=True), self.user)
+        before = {**client}
+        self._update("clients", index, {"id": op.id, "trainer_id": self.user.id}, client, update_data)
+        self._summarize(index, "client_changed", before, {**client})
+        return 200, client
+
+    def _delete_clients(self, index, op, data):
+        client = self._get(self.clients, op.id, "Client", op.version)
+        now = datetime.now(timezone.utc)
+        self._update("clients", index, {"id": op.id, "trainer_id": self.user.id}, client, {"deleted_at": now, "updated_at": now})
+        self.deleted_clients.append((index, op.id))
+        self._summarize(index, "client_removed", {**client})
+        del self.clients[op.id]
+        return 200, None
+
+    def _visible_catalog_food(self, food_id: str) -> bool:
+        return food_id in food_catalog and effective_food(food_id, self.overrides) is not None
+
+    def _save_override(self, index: int, food_id: str, fields: dict) -> Optional[dict]:
+        self._write("food_overrides", index, UpdateOne(
+            {"trainer_id": self.user.id, "food_id": food_id},
+            override_update(fields, datetime.now(timezone.utc)),
+            upsert=True
+        ), food_id)
+        override = self.overrides.get(food_id, {})
+        self.overrides[food_id] = {**override, **fields, "version": override.get("version", 0) + 1}
+        return effective_food(food_id, self.overrides)
+
+    def _create_foods(self, index, op, data: FoodCreate):
+        food = Food(**data.model_dump(), created_by=self.user.id).model_dump()
+        self._write("foods", index, InsertOne({**food}), food["id"])
+        self.foods[food["id"]] = food
+        self.foods_changed = True
+        return 201, food
+
+    def _update_foods(self, index, op, data: FoodCreate):
+        if op.id in self.foods:
+            food = self._get(self.foods, op.id, "Food", op.version)
+            self._update("foods", index, {"id": op.id, "created_by": self.user.id}, food, data.model_dump())
+        elif self._visible_catalog_food(op.id):
+            check_version(effective_food(op.id, self.overrides), op.version)
+            food = self._save_override(index, op.id, {**data.model_dump(), "hidden": False})
+        else:
+            raise HTTPException(status_code=404, detail="Food not found")
+        self.foods_changed = True
+        if op.id in self.food_cache:
+            self.food_cache[op.id] = food
+        return 200, food
+
+    def _delete_foods(self, index, op, data):
+        if op.id in self.foods:
+            self._get(self.foods, op.id, "Food", op.version)
+            self._write("foods", index, DeleteOne({"id": op.id, "created_by": self.user.id}), op.id)
+            del self.foods[op.id]
+        elif self._visible_catalog_food(op.id):
+            check_version(effective_food(op.id, self.overrides), op.version)
+            self._save_override(index, op.id, {"hidden": True})
+        else:
+            raise HTTPException(status_code=404, detail="Food not found")
+        self.foods_changed = True
+        self.food_cache.pop(op.id, None)
+        return 200, None
+
+    def _requires_foods(self, index: int, data: DietCreate) -> None:
+        # Meal macros were computed from the batch's version of these foods
+        for meal in data.meals:
+            for item in meal.foods:
+                self._requires(index, "foods", item.food_id)
+                self._requires(index, "food_overrides", item.food_id)
+
+    def _create_diets(self, index, op, data: DietCreate):
+        self._get(self.clients, data.client_id, "Client")
+        meals = compute_meals(data.meals, self.food_cache)
+        self._requires_foods(index, data)
+        self._requires(index, "clients", data.client_id)
+        diet = Diet(
+            client_id=data.client_id,
+            trainer_id=self.user.id,
+            name=data.name,
+            meals=meals,
+            **diet_totals(meals)
+        ).model_dump()
+        self._write("diets", index, InsertOne({**diet}), diet["id"])
+        self._summarize(index, "diet_added", {**diet})
+        self.diets[diet["id"]] = diet
+        return 201, diet
+
+    def _update_diets(self, index, op, data: DietCreate):
+        diet = self._get(self.diets, op.id, "Diet", op.version)
+        meals = compute_meals(data.meals, {**stored_foods(diet["meals"]), **self.food_cache})
+        update_data = diet_update_fields(data, meals)
+        self._requires_foods(index, data)
+        before = {**diet}
+        self._update("diets", index, {"id": op.id, "trainer_id": self.user.id}, diet, update_data)
+        self._summarize(index, "diet_changed", before, {**diet})
+        self.diet_revisions.append((index, before, {**diet}))
+        self.changed_diets.add(op.id)
+        return 200, diet
+
+    def _delete_diets(self, index, op, data):
+        diet = self._get(self.diets, op.id, "Diet", op.version)
+        self._write("diets", index, DeleteOne({"id": op.id, "trainer_id": self.user.id}), op.id)
+        self._summarize(index, "diet_removed", diet)
+        self.deleted_diets.append((index, op.id))
+        self.changed_diets.add(op.id)
+        del self.diets[op.id]
+        return 200, None
+
+    async def _send(self, collection: str, writes: list, session=None):
+        """One ordered bulk_write; outside a transaction the failed write and those after it get an error"""
+        batch = list(writes)
+        writes.clear()
+        try:
+            return await db[collection].bulk_write([operation for _, operation in batch], ordered=True, session=session)
+        except BulkWriteError as exc:
+            if session is not None:
+                raise
+            # Ordered: everything after the first failure was not applied
+            error = exc.details["writeErrors"][0]
+            self._fail(batch[error["index"]][0], 409 if error.get("code") == 11000 else 500, error.get("errmsg"))
+            for operation_index, _ in batch[error["index"] + 1:]:
+                self._fail(operation_index, 424, "Not applied: an earlier write in the batch failed")
+            return None
+
+    async def write(self, session=None) -> None:
+        for collection in BATCH_WRITE_ORDER:
+            pinned = set(self.pinned.get(collection, ()))
+            queued = []  # consecutive unpinned writes, sent together
+            for index, operation in self.writes.get(collection, []):
+                if any(queued_index in self.depends.get(index, ()) for queued_index, _ in queued):
+                    await self._send(collection, queued, session)
+                if self._blocked(index):
+                    self._fail(index, 424, "Not applied: depends on a failed operation")
+                    continue
+                if index not in pinned:
+                    queued.append((index, operation))
+                    continue
+                if queued:
+                    await self._send(collection, queued, session)
+                # Sent on its own so the matched count says whether this very update applied
+                result = await self._send(collection, [(index, operation)], session)
+                if result is not None and result.matched_count == 0:
+                    if session is not None:
+                        raise HTTPException(status_code=412, detail="Batch rolled back: modified since it was read")
+                    self._fail(index, 412, "Not applied: modified since it was read; reload and retry")
+            if queued:
+                await self._send(collection, queued, session)
+
+    async def commit(self, transaction: bool) -> None:
+        if not transaction:
+            await self.write()
+        else:
+            try:
+                async with await db.client.start_session() as session:
+                    async with session.start_transaction():
+                        await self.write(session)
+            except BulkWriteError as exc:
+                raise HTTPException(status_code=409, detail=f"Batch rolled back: {exc.details['writeErrors'][0].get('errmsg')}")
+            except OperationFailure as exc:
+                if exc.code == 20:
+                    raise HTTPException(status_code=400, detail="Transactions require a MongoDB replica set")
+                raise
+        
+        summary = SummaryDelta(self.user.id)
+        for index, change, args in self.summary_changes:
+            if not self.results[index].error:
+                getattr(summary, change)(*args)
+        await summary.apply()
+        recorded = {}  # diet id -> whether the batch's latest version of it was stored
+        for index, before, after in self.diet_revisions:
+            if not self.results[index].error:
+                if before["id"] in recorded:
+                    before = {**before, "has_revisions": recorded[before["id"]]}
+                recorded[after["id"]] = await record_diet_revision(before, after)
+        deleted_diets = [diet_id for index, diet_id in self.deleted_diets if not self.results[index].error]
+        if deleted_diets:
+            await db.diet_revisions.delete_many({"diet_id": {"$in": deleted_diets}})
+        for index, client_id in self.deleted_clients:
+            if not self.results[index].error:
+                cascade_worker.enqueue(client_id, self.user.id)
+        if self.foods_changed:
+            food_search.invalidate(self.user.id)
+        await asyncio.gather(*(pdf_cache.invalidate_diet(diet_id) for diet_id in self.changed_diets))
+
+@api_router.post("/batch", response_model=BatchResponse)
+async def batch_write(request: BatchRequest, current_user: User = Depends(get_current_user)):
+    """Create, update and delete clients, foods and diets in one round trip"""
+    writer = BatchWriter(current_user, request.operations)
+    writer.parse()
+    await writer.preload()
+    writer.plan()
+    
+    # A transaction is all or nothing, so any rejected operation cancels the batch
+    if request.transaction and writer.failed:
+        return BatchResponse(committed=False, results=writer.results)
+    
+    await writer.commit(request.transaction)
+    return BatchResponse(committed=True, results=writer.results)
 
-    # ================= MEALS =================
+# ============ PDF EXPORT ============
 
-    for meal in diet["meals"]:
-        # Meal title
-        story.append(Paragraph(meal["meal_name"].upper(), meal_style))
+class PdfRenderPool:
+    """Renders diet PDFs in worker processes with a concurrency cap and a per-render timeout"""
+
+    def __init__(self, workers: int, max_concurrency: int, timeout_seconds: float):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self._executor = None
+        self._semaphore = None
+        self.renders = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.render_seconds_total = 0.0
+        self.render_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    def start(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._start_executor()
+
+    def _start_executor(self) -> None:
+        if self.workers > 0:
+            # spawn: the API process runs Motor threads, which fork() must not inherit
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            # workers=0 renders on threads instead, for hosts without multiprocessing
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_concurrency), thread_name_prefix="pdf-render")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _release_when_done(self, job) -> None:
+        """Free the job's slot when it ends, not when its caller stops waiting.
+
+        A timed-out render keeps its worker busy; releasing on timeout would let
+        new renders queue up behind it and exceed the concurrency cap.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore
+
+        def release(_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(semaphore.release)
+        job.add_done_callback(release)
+
+    async def render(self, fn, *args) -> bytes:
+        if self._semaphore is None:
+            self.start()
+        queued_at = time.perf_counter()
+        await self._semaphore.acquire()
+        self.wait_seconds_total += time.perf_counter() - queued_at
+        job = None
+        try:
+            job = self._executor.submit(fn, *args)
+            self._release_when_done(job)
+            elapsed, pdf = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            job.cancel()  # only stops a job that has not started yet
+            raise HTTPException(status_code=504, detail="PDF rendering timed out")
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM kill); replace the pool so later renders recover
+            self.failures += 1
+            logger.exception("PDF render pool broken, restarting it")
+            self.shutdown()
+            self._start_executor()
+            raise HTTPException(status_code=500, detail="PDF rendering failed")
+        except Exception:
+            self.failures += 1
+            logger.exception("PDF rendering failed")
+            raise HTTPException(status_code=500, detail="PDF rendering failed")
+        finally:
+            if job is None:
+                self._semaphore.release()
+        
+        self.renders += 1
+        self.render_seconds_total += elapsed
+        self.render_seconds_max = max(self.render_seconds_max, elapsed)
+        metrics_registry.observe("pdf_render_duration_seconds", (fn.__name__,), elapsed)
+        record_timing("pdf", elapsed)
+        return pdf
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "renders": self.renders,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "render_seconds_total": self.render_seconds_total,
+            "render_seconds_max": self.render_seconds_max,
+            "wait_seconds_total": self.wait_seconds_total,
+        }
+
+pdf_pool = PdfRenderPool(PDF_RENDER_WORKERS, PDF_RENDER_MAX_CONCURRENCY, PDF_RENDER_TIMEOUT_SECONDS)
+
+class PdfCacheStore(abc.ABC):
+    """Storage backend for rendered PDFs, addressed by (diet_id, content key)"""
+
+    # Stores doing file or network I/O are called from a worker thread
+    blocking = False
+
+    @abc.abstractmethod
+    def get(self, diet_id: str, key: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def put(self, diet_id: str, key: str, pdf: bytes) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete_diet(self, diet_id: str) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+class MemoryPdfCache(PdfCacheStore):
+    """In-process LRU bounded by total bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._size = 0
+
+    def get(self, diet_id, key):
+        pdf = self._entries.get((diet_id, key))
+        if pdf is not None:
+            self._entries.move_to_end((diet_id, key))
+        return pdf
+
+    def put(self, diet_id, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        previous = self._entries.pop((diet_id, key), None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[(diet_id, key)] = pdf
+        self._size += len(pdf)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def delete_diet(self, diet_id):
+        for entry in [e for e in self._entries if e[0] == diet_id]:
+            self._size -= len(self._entries.pop(entry))
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+class DiskPdfCache(PdfCacheStore):
+    """Files under <root>/<diet_id>/<key>.pdf with LRU eviction bounded by total bytes"""
+
+    blocking = True
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Path, int]" = OrderedDict()
+        self._size = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Rebuild the LRU order from modification times; get() touches files on every hit
+        files = sorted(self.root.glob("*/*.pdf"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            self._entries[path] = path.stat().st_size
+            self._size += self._entries[path]
+
+    def _path(self, diet_id: str, key: str) -> Path:
+        return self.root / diet_id / f"{key}.pdf"
+
+    def get(self, diet_id, key):
+        path = self._path(diet_id, key)
+        with self._lock:
+            if path not in self._entries:
+                return None
+            self._entries.move_to_end(path)
+        try:
+            pdf = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(path, 0)
+            return None
+        return pdf
+
+    def put(self, diet_id, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        path = self._path(diet_id, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(pdf)
+        os.replace(tmp_path, path)
+        
+        evicted = []
+        with self._lock:
+            self._size -= self._entries.pop(path, 0)
+            self._entries[path] = len(pdf)
+            self._size += len(pdf)
+            while self._size > self.max_bytes:
+                old_path, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append(old_path)
+        for old_path in evicted:
+            old_path.unlink(missing_ok=True)
+
+    def delete_diet(self, diet_id):
+        directory = self.root / diet_id
+        with self._lock:
+            for path in [p for p in self._entries if p.parent == directory]:
+                self._size -= self._entries.pop(path)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+class PdfCache:
+    """Content-addressed cache of rendered diet PDFs in front of a PdfCacheStore"""
+
+    def __init__(self, store: Optional[PdfCacheStore]):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(payload: dict, client_name: str) -> str:
+        content = json.dumps(
+            {"template": PDF_TEMPLATE_VERSION, "client_name": client_name, "diet": payload},
+            sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    async def _call(self, method, *args):
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, diet_id: str, key: str) -> Optional[bytes]:
+        if self.store is None:
+            return None
+        pdf = await self._call(self.store.get, diet_id, key)
+        if pdf is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return pdf
+
+    async def put(self, diet_id: str, key: str, pdf: bytes) -> None:
+        if self.store is not None:
+            await self._call(self.store.put, diet_id, key, pdf)
+
+    async def invalidate_diet(self, diet_id: str) -> None:
+        if self.store is not None:
+            await self._call(self.store.delete_diet, diet_id)
+
+    def stats(self) -> dict:
+        stats = {"hits": self.hits, "misses": self.misses}
+        if self.store is not None:
+            stats.update(self.store.stats())
+        return stats
+
+def create_pdf_cache_store() -> Optional[PdfCacheStore]:
+    if PDF_CACHE_BACKEND == 'disk':
+        return DiskPdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+    if PDF_CACHE_BACKEND == 'memory':
+        return MemoryPdfCache(PDF_CACHE_MAX_BYTES)
+    return None
+
+pdf_cache = PdfCache(create_pdf_cache_store())
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def render_diet_cached(diet_id: str, key: str, payload: dict, client_name: str,
+                             renderer=timed_render_diet_pdf) -> bytes:
+    pdf = await pdf_cache.get(diet_id, key)
+    if pdf is None:
+        pdf = await pdf_pool.render(renderer, payload, client_name)
+        await pdf_cache.put(diet_id, key, pdf)
+    return pdf
+
+def pdf_payload(diet: dict) -> dict:
+    """Strip a diet document down to what the renderer needs before sending it to a worker"""
+    return {
+        "meals": diet["meals"],
+        "total_kcal": diet["total_kcal"],
+        "total_protein": diet["total_protein"],
+        "total_carbs": diet["total_carbs"],
+        "total_fats": diet["total_fats"],
+    }
 
-        # Foods table
-        food_table_data = [["Alimento", "Cantidad (g)"]]
+@api_router.get("/diets/{diet_id}/export")
+async def export_diet_pdf(
+    diet_id: str,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    diet = await db.diets.find_one(
+        {"id": diet_id, "trainer_id": current_user.id},
+        {"_id": 0}
+    )
+    if not diet:
+        raise HTTPException(status_code=404, detail="Diet not found")
 
-        for food in meal["foods"]:
-            food_table_data.append([
-                food["food_name"],
-                f"{food['quantity_g']:.0f}"
-            ])
+    client = await db.clients.find_one(
+        {"id": diet["client_id"], **LIVE_CLIENT},
+        {"_id": 0}
+    )
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
 
-        food_table = Table(
-            food_table_data,
-            colWidths=[10 * cm, 4 * cm]
-        )
+    payload = pdf_payload(diet)
+    key = PdfCache.key(payload, client['name'])
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename=dieta_{client['name'].replace(' ', '_')}.pdf"
+    }
+    
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers={"ETag": headers["ETag"], "Cache-Control": headers["Cache-Control"]})
+    
+    pdf = await render_diet_cached(diet_id, key, payload, client['name'])
+
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+@api_router.get("/plans/{plan_id}/export")
+async def export_plan_pdf(
+    plan_id: str,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Every day of a plan and its totals as one PDF"""
+    plan = await db.plans.find_one({"id": plan_id, "trainer_id": current_user.id}, {"_id": 0})
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    client = await db.clients.find_one({"id": plan["client_id"], **LIVE_CLIENT}, {"_id": 0, "name": 1})
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+    
+    payload = {field: plan[field] for field in ["name", "meals", "days", *TOTAL_FIELDS]}
+    key = PdfCache.key(payload, client['name'])
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename=plan_{client['name'].replace(' ', '_')}.pdf"
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers={"ETag": headers["ETag"], "Cache-Control": headers["Cache-Control"]})
+    
+    pdf = await render_diet_cached(plan_id, key, payload, client['name'], timed_render_plan_pdf)
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
 
-        food_table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.black),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("ALIGN", (1, 1), (-1, -1), "CENTER"),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
-        ]))
-
-        story.append(food_table)
-        story.append(Spacer(1, 0.2 * cm))
-
-        # Meal totals table
-        totals_meal_data = [
-            ["Kcal", "Proteínas", "Carbohidratos", "Grasas"],
-            [
-                f"{meal['total_kcal']:.0f}",
-                f"{meal['total_protein']:.1f} g",
-                f"{meal['total_carbs']:.1f} g",
-                f"{meal['total_fats']:.1f} g",
-            ]
-        ]
+class ZipStream(io.RawIOBase):
+    """Unseekable sink for zipfile; written bytes are drained chunk by chunk into the response"""
 
-        totals_meal_table = Table(
-            totals_meal_data,
-            colWidths=[4 * cm, 4 * cm, 4 * cm, 4 * cm]
-        )
+    def __init__(self):
+        self._chunks = []
 
-        totals_meal_table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ]))
+    def writable(self) -> bool:
+        return True
 
-        story.append(totals_meal_table)
-        story.append(Spacer(1, 0.6 * cm))
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
 
-    # ================= DAILY TOTALS =================
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
 
-    story.append(Paragraph("TOTALES DIARIOS", meal_style))
+def pdf_filename(client_name: str, diet: dict) -> str:
+    stem = re.sub(r"[^\w.-]+", "_", f"dieta_{client_name}_{diet['name']}").strip("_")
+    return f"{stem}_{diet['id'][:8]}.pdf"
 
-    daily_totals = [
-        ["Calorías", "Proteínas", "Carbohidratos", "Grasas"],
-        [
-            f"{diet['total_kcal']:.0f} kcal",
-            f"{diet['total_protein']:.1f} g",
-            f"{diet['total_carbs']:.1f} g",
-            f"{diet['total_fats']:.1f} g",
-        ]
-    ]
+@api_router.post("/diets/export")
+async def export_diets_bulk(request: BulkExportRequest, current_user: User = Depends(get_current_user)):
+    query = {"trainer_id": current_user.id}
+    if request.diet_ids is not None:
+        query["id"] = {"$in": request.diet_ids}
+    if request.client_ids is not None:
+        query["client_id"] = {"$in": request.client_ids}
+    
+    projection = {"_id": 0, "id": 1, "name": 1, "client_id": 1, "meals": 1,
+                  "total_kcal": 1, "total_protein": 1, "total_carbs": 1, "total_fats": 1}
+    diets = await db.diets.find(query, projection).to_list(BULK_EXPORT_MAX_DIETS + 1)
+    if not diets:
+        raise HTTPException(status_code=404, detail="No diets found")
+    if len(diets) > BULK_EXPORT_MAX_DIETS:
+        raise HTTPException(status_code=400, detail=f"Too many diets, export at most {BULK_EXPORT_MAX_DIETS} at once")
+    
+    client_ids = list({diet["client_id"] for diet in diets})
+    clients = await db.clients.find({"id": {"$in": client_ids}, **LIVE_CLIENT}, {"_id": 0, "id": 1, "name": 1}).to_list(len(client_ids))
+    client_names = {c["id"]: c["name"] for c in clients}
+    diets = [diet for diet in diets if diet["client_id"] in client_names]
+    
+    async def render(diet: dict) -> tuple:
+        client_name = client_names[diet["client_id"]]
+        payload = pdf_payload(diet)
+        key = PdfCache.key(payload, client_name)
+        try:
+            return diet, client_name, await render_diet_cached(diet["id"], key, payload, client_name)
+        except HTTPException as e:
+            return diet, client_name, e
+    
+    def start_renders() -> list:
+        # The render pool's semaphore bounds how many of these actually run at once
+        return [asyncio.ensure_future(render(diet)) for diet in diets]
+    
+    if request.format == "pdf":
+        tasks = start_renders()
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        pdfs = [pdf for _, _, pdf in results if isinstance(pdf, bytes)]
+        if not pdfs:
+            raise HTTPException(status_code=500, detail="PDF rendering failed")
+        merged = await asyncio.to_thread(merge_pdfs, pdfs)
+        return Response(
+            content=merged,
+            media_type="application/pdf",
+            headers={"Content-Disposition": "attachment; filename=dietas.pdf"}
+        )
+    
+    async def zip_entries():
+        # Started here rather than in the handler: a client gone before the body starts never runs this
+        tasks = start_renders()
+        sink = ZipStream()
+        failed = []
+        try:
+            with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+                # Entries are written in completion order, so finished renders stream out immediately
+                for next_done in asyncio.as_completed(tasks):
+                    diet, client_name, pdf = await next_done
+                    if isinstance(pdf, HTTPException):
+                        failed.append(f"{client_name} - {diet['name']} ({diet['id']}): {pdf.detail}")
+                        continue
+                    archive.writestr(pdf_filename(client_name, diet), pdf)
+                    yield sink.drain()
+                if failed:
+                    archive.writestr("ERRORES.txt", "\n".join(failed))
+            yield sink.drain()
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        zip_entries(),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=dietas.zip"}
+    )
 
-    daily_table = Table(daily_totals, colWidths=[4 * cm] * 4)
-    daily_table.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.black),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
-    ]))
+def merge_pdfs(pdfs: List[bytes]) -> bytes:
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(io.BytesIO(pdf))
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
 
-    story.append(daily_table)
+# ============ DATABASE INDEXES ============
 
-    doc.build(story)
-    buffer.seek(0)
+def id_index() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], name="id_unique", unique=True)
 
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename=dieta_{client['name'].replace(' ', '_')}.pdf"
+# Every hot query filters on these; the (created_at, id) suffix backs keyset pagination
+INDEX_SPECS = {
+    "users": [
+        id_index(),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "clients": [
+        id_index(),
+        IndexModel([("trainer_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="trainer_created"),
+        IndexModel(
+            [("deleted_at", ASCENDING)], name="tombstoned",
+            partialFilterExpression={"deleted_at": {"$type": "date"}}
+        ),
+    ],
+    "foods": [
+        id_index(),
+        IndexModel([("created_by", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="owner_created"),
+    ],
+    "catalog_foods": [
+        id_index(),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created"),
+    ],
+    "food_overrides": [
+        IndexModel([("trainer_id", ASCENDING), ("food_id", ASCENDING)], name="trainer_food_unique", unique=True),
+    ],
+    "dashboard_summaries": [
+        IndexModel([("trainer_id", ASCENDING)], name="trainer_unique", unique=True),
+    ],
+    "diet_templates": [
+        id_index(),
+        IndexModel([("trainer_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="trainer_created"),
+    ],
+    "plans": [
+        id_index(),
+        IndexModel(
+            [("trainer_id", ASCENDING), ("client_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="trainer_client_created"
+        ),
+        IndexModel([("trainer_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="trainer_created"),
+    ],
+    "checkins": [
+        IndexModel([("meta.client_id", ASCENDING), ("measured_at", ASCENDING)], name="client_measured"),
+    ],
+    "diet_revisions": [
+        IndexModel([("diet_id", ASCENDING), ("version", ASCENDING)], name="diet_version_unique", unique=True),
+    ],
+    "diets": [
+        id_index(),
+        IndexModel([("trainer_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="trainer_created"),
+        IndexModel(
+            [("trainer_id", ASCENDING), ("client_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="trainer_client_created"
+        ),
+        IndexModel([("client_id", ASCENDING)], name="client"),
+    ],
+}
+
+async def ensure_indexes(database, mode: str = "ensure", strict: bool = False) -> dict:
+    """Create missing indexes idempotently and report missing, failed and undeclared ones"""
+    report = {}
+    problems = []
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = database[collection_name]
+        existing = await collection.index_information()
+        missing = [spec for spec in specs if spec.document["name"] not in existing]
+        declared = {spec.document["name"] for spec in specs} | {"_id_"}
+        entry = {
+            "missing": [spec.document["name"] for spec in missing],
+            "created": [],
+            "failed": {},
+            "undeclared": sorted(set(existing) - declared),
         }
+        
+        if mode == "ensure":
+            for spec in missing:
+                # One at a time so a single failure (e.g. duplicate keys) does not hide the rest
+                try:
+                    await collection.create_indexes([spec])
+                    entry["created"].append(spec.document["name"])
+                except OperationFailure as e:
+                    entry["failed"][spec.document["name"]] = str(e)
+            problems += [f"{collection_name}.{name}: {error}" for name, error in entry["failed"].items()]
+        else:
+            problems += [f"{collection_name}.{name}: missing" for name in entry["missing"]]
+        
+        report[collection_name] = entry
+        if entry["created"]:
+            logger.info("Created indexes on %s: %s", collection_name, ", ".join(entry["created"]))
+        if entry["undeclared"]:
+            logger.info("Undeclared indexes on %s: %s", collection_name, ", ".join(entry["undeclared"]))
+    
+    for problem in problems:
+        logger.warning("Index problem: %s", problem)
+    if strict and problems:
+        raise RuntimeError(f"Required MongoDB indexes are not in place: {'; '.join(problems)}")
+    return report
+
+async def index_usage(database, min_age: timedelta) -> dict:
+    """Per collection, indexes with no recorded use and those whose counters are too recent to tell.
+
+    $indexStats counters live in memory on each mongod: they restart at zero
+    with the process (and with the index), and only cover the node that
+    answers. An index only counts as unused once its counters have been
+    running for min_age; run this on demand against the primary, not at startup.
+    """
+    cutoff = datetime.now(timezone.utc) - min_age
+    report = {}
+    for collection_name in INDEX_SPECS:
+        entry = {"unused": [], "too_recent": []}
+        try:
+            async for stats in database[collection_name].aggregate([{"$indexStats": {}}]):
+                accesses = stats.get("accesses", {})
+                if stats["name"] == "_id_" or accesses.get("ops", 0) > 0:
+                    continue
+                since = accesses.get("since")
+                if since is not None and since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                entry["unused" if since is not None and since <= cutoff else "too_recent"].append(stats["name"])
+        except OperationFailure as e:
+            entry["error"] = str(e)  # $indexStats needs the clusterMonitor role on some deployments
+        report[collection_name] = entry
+    return report
+
+# ============ METRICS ============
+
+metrics_registry.histogram("pdf_render_duration_seconds", "PDF render time in the worker pool", ("renderer",))
+
+# stats() keys holding point-in-time values; every other numeric stat only ever grows
+GAUGE_STATS = {
+    "size", "entries", "bytes", "max_bytes", "max_entries", "in_flight", "queued", "workers",
+    "max_concurrency", "trainers", "foods", "macro_bytes", "queue_wait_seconds_max", "render_seconds_max",
+}
+
+def component_metrics() -> tuple:
+    """Numeric stats() of the in-process caches, pools and workers, as (gauges, counters) of name -> (help, value)"""
+    components = {
+        "user_cache": user_cache, "password_pool": password_pool, "pdf_pool": pdf_pool,
+        "pdf_cache": pdf_cache, "food_search": food_search, "food_catalog": food_catalog,
+        "cascade_worker": cascade_worker,
+    }
+    gauges, counters = {}, {}
+    for name, component in components.items():
+        for key, value in component.stats().items():
+            if not isinstance(value, (int, float)):
+                continue
+            help_text = f"{name}.stats()['{key}']"
+            if key in GAUGE_STATS:
+                gauges[f"{name}_{key}"] = (help_text, value)
+            else:
+                counters[f"{name}_{key}" if key.endswith("_total") else f"{name}_{key}_total"] = (help_text, value)
+    return gauges, counters
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    # Route labels, pool sizes and cache counts are not for the public: no token, no endpoint
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    gauges, counters = component_metrics()
+    return Response(
+        metrics_registry.render(gauges, counters),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
     )
 
 # ============ HEALTH CHECK ============
@@ -732,6 +3855,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_workers():
+    pdf_pool.start()
+    cascade_worker.start()
+
+@app.on_event("startup")
+async def load_food_catalog():
+    await load_catalog()
+
+@app.on_event("startup")
+async def ensure_database_indexes():
+    if MONGO_INDEX_MODE == "ensure":
+        await ensure_checkins_collection(db)
+    if MONGO_INDEX_MODE != "off":
+        await ensure_indexes(db, MONGO_INDEX_MODE, MONGO_INDEX_STRICT)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await cascade_worker.stop()
     client.close()
+    password_pool.shutdown()
+    pdf_pool.shutdown()
@@ -223,6 +223,21 @@ class LontsoFitnessAPITester:
         )
         return success
 
+    def test_search_foods(self):
+        """Test accent-insensitive food search"""
+        success, response = self.run_test(
+            "Search Foods",
+            "GET",
+            "foods/search",
+            200,
+            params={"q": "updated test"}
+        )
+        if success:
+            names = [food['name'] for food in response]
+            print(f"   Found {len(names)} matches: {names}")
+            return "Updated Test Food" in names
+        return False
+
     def test_create_diet(self):
         """Test creating a diet with meals"""
         if not self.client_id or not self.food_id:
@@ -370,6 +385,7 @@ def main():
         tester.test_get_foods,
         tester.test_create_food,
         tester.test_update_food,
+        tester.test_search_foods,
         tester.test_create_diet,
         tester.test_get_diets,
         tester.test_get_diet_detail,
@@ -0,0 +1,93 @@
+import React, { useState, useEffect } from 'react';
+import axios from 'axios';
+import { Popover, PopoverContent, PopoverTrigger } from '../components/ui/popover';
+import {
+  Command,
+  CommandEmpty,
+  CommandInput,
+  CommandItem,
+  CommandList,
+} from '../components/ui/command';
+import { ChevronsUpDown } from 'lucide-react';
+
+const API_URL = process.env.REACT_APP_BACKEND_URL + '/api';
+const SEARCH_DELAY_MS = 250;
+
+// Selector de alimentos: busca en el servidor mientras se escribe en lugar de descargar la biblioteca completa
+export const FoodPicker = ({ label, onSelect }) => {
+  const [open, setOpen] = useState(false);
+  const [query, setQuery] = useState('');
+  const [results, setResults] = useState([]);
+  const [searching, setSearching] = useState(false);
+
+  useEffect(() => {
+    const q = query.trim();
+    if (!open || !q) {
+      setResults([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(() => {
+      setSearching(true);
+      axios.get(`${API_URL}/foods/search`, { params: { q, limit: 20 } })
+        .then((response) => {
+          if (!cancelled) setResults(response.data);
+        })
+        .catch(() => {
+          if (!cancelled) setResults([]);
+        })
+        .finally(() => {
+          if (!cancelled) setSearching(false);
+        });
+    }, SEARCH_DELAY_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [query, open]);
+
+  const handleOpenChange = (next) => {
+    setOpen(next);
+    if (!next) setQuery('');
+  };
+
+  return (
+    <Popover open={open} onOpenChange={handleOpenChange}>
+      <PopoverTrigger asChild>
+        <button
+          type="button"
+          className="flex items-center justify-between rounded-none border border-transparent bg-transparent hover:bg-zinc-900 h-full w-full px-3 py-2 text-sm text-left"
+        >
+          <span className={label ? 'text-white truncate' : 'text-zinc-500'}>{label || 'Seleccionar...'}</span>
+          <ChevronsUpDown className="w-4 h-4 ml-2 shrink-0 opacity-50" />
+        </button>
+      </PopoverTrigger>
+      <PopoverContent className="rounded-none bg-zinc-900 border-zinc-800 p-0 w-72" align="start">
+        <Command shouldFilter={false} className="rounded-none bg-zinc-900">
+          <CommandInput
+            value={query}
+            onValueChange={setQuery}
+            placeholder="Buscar alimento..."
+          />
+          <CommandList className="max-h-60">
+            <CommandEmpty className="py-6 text-center text-sm text-zinc-500">
+              {!query.trim() ? 'Escribe para buscar' : searching ? 'Buscando...' : 'No se encontraron alimentos'}
+            </CommandEmpty>
+            {results.map((f) => (
+              <CommandItem
+                key={f.id}
+                value={f.id}
+                onSelect={() => {
+                  onSelect(f);
+                  handleOpenChange(false);
+                }}
+              >
+                {f.name}
+              </CommandItem>
+            ))}
+          </CommandList>
+        </Command>
+      </PopoverContent>
+    </Popover>
+  );
+};
@@ -39,13 +39,10 @@ const ClientDetail = () => {
 
   const fetchData = async () => {
     try {
-      const [clientRes, dietsRes] = await Promise.all([
-        axios.get(`${API_URL}/clients/${id}`),
-        axios.get(`${API_URL}/diets?client_id=${id}`)
-      ]);
-      setClient(clientRes.data);
-      setEditData(clientRes.data);
-      setDiets(dietsRes.data);
+      const response = await axios.get(`${API_URL}/clients/${id}/detail`);
+      setClient(response.data.client);
+      setEditData(response.data.client);
+      setDiets(response.data.diets);
     } catch (error) {
       toast.error('Error al cargar datos');
     } finally {
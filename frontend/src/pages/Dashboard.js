@@ -3,27 +3,45 @@ import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
-import { Users, Plus, Search, LogOut, Database } from 'lucide-react';
+import { Users, Plus, Search, LogOut, Database, Utensils, Flame } from 'lucide-react';
 import { useAuth } from '../contexts/AuthContext';
 import { toast } from 'sonner';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + '/api';
+const PAGE_SIZE = 50;
+const CLIENT_FIELDS = 'name,age,sex,weight,tmb,target_kcal';
 
 const Dashboard = () => {
+  const [summary, setSummary] = useState(null);
   const [clients, setClients] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [searchQuery, setSearchQuery] = useState('');
   const [loading, setLoading] = useState(true);
   const navigate = useNavigate();
   const { user, logout } = useAuth();
 
   useEffect(() => {
+    fetchSummary();
     fetchClients();
   }, []);
 
-  const fetchClients = async () => {
+  // Los totales salen del resumen materializado, sin descargar clientes ni dietas
+  const fetchSummary = async () => {
     try {
-      const response = await axios.get(`${API_URL}/clients`);
-      setClients(response.data);
+      const response = await axios.get(`${API_URL}/dashboard/summary`);
+      setSummary(response.data);
+    } catch (error) {
+      toast.error('Error al cargar el resumen');
+    }
+  };
+
+  const fetchClients = async (cursor = null) => {
+    try {
+      const params = { limit: PAGE_SIZE, fields: CLIENT_FIELDS };
+      if (cursor) params.cursor = cursor;
+      const response = await axios.get(`${API_URL}/clients`, { params });
+      setClients((current) => cursor ? [...current, ...response.data] : response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Error al cargar clientes');
     } finally {
@@ -76,7 +94,26 @@ const Dashboard = () => {
               <span className="text-xs uppercase tracking-wider text-zinc-500 font-bold">Total Clientes</span>
               <Users className="w-5 h-5 text-zinc-600" />
             </div>
-            <div className="text-4xl font-bold text-white font-heading">{clients.length}</div>
+            <div className="text-4xl font-bold text-white font-heading">{summary ? summary.client_count : '-'}</div>
+          </div>
+          <div className="rounded-none border border-zinc-800 bg-zinc-950/50 p-6 flex flex-col justify-between hover:border-zinc-700 transition-colors" data-testid="total-diets-stat">
+            <div className="flex items-center justify-between mb-4">
+              <span className="text-xs uppercase tracking-wider text-zinc-500 font-bold">Total Dietas</span>
+              <Utensils className="w-5 h-5 text-zinc-600" />
+            </div>
+            <div className="text-4xl font-bold text-white font-heading">{summary ? summary.diet_count : '-'}</div>
+            {summary?.latest_diet && (
+              <span className="text-sm text-zinc-500 mt-2">Última: {summary.latest_diet.name}</span>
+            )}
+          </div>
+          <div className="rounded-none border border-zinc-800 bg-zinc-950/50 p-6 flex flex-col justify-between hover:border-zinc-700 transition-colors" data-testid="avg-target-kcal-stat">
+            <div className="flex items-center justify-between mb-4">
+              <span className="text-xs uppercase tracking-wider text-zinc-500 font-bold">Kcal Objetivo Media</span>
+              <Flame className="w-5 h-5 text-zinc-600" />
+            </div>
+            <div className="text-4xl font-bold text-white font-heading">
+              {summary?.avg_target_kcal != null ? Math.round(summary.avg_target_kcal) : '-'}
+            </div>
           </div>
         </div>
 
@@ -163,6 +200,19 @@ const Dashboard = () => {
             </tbody>
           </table>
         </div>
+
+        {nextCursor && (
+          <div className="flex justify-center mt-6">
+            <Button
+              onClick={() => fetchClients(nextCursor)}
+              variant="ghost"
+              className="rounded-none hover:bg-zinc-800 text-zinc-400 hover:text-white uppercase tracking-wider text-xs"
+              data-testid="load-more-clients-button"
+            >
+              Cargar más
+            </Button>
+          </div>
+        )}
       </main>
     </div>
   );
@@ -4,7 +4,7 @@ import axios from 'axios';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
-import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
+import { FoodPicker } from '../components/FoodPicker';
 import { ArrowLeft, Plus, Trash2, Save } from 'lucide-react';
 import { toast } from 'sonner';
 
@@ -14,6 +14,7 @@ const DietBuilder = () => {
   const { clientId } = useParams();
   const navigate = useNavigate();
   const [client, setClient] = useState(null);
+  // Alimentos elegidos en los selectores, para recalcular al cambiar la cantidad
   const [foods, setFoods] = useState([]);
   const [dietName, setDietName] = useState('');
   const [meals, setMeals] = useState([]);
@@ -28,9 +29,7 @@ const DietBuilder = () => {
   const fetchData = async () => {
     try {
       const clientRes = await axios.get(`${API_URL}/clients/${clientId}`);
-      const foodsRes = await axios.get(`${API_URL}/foods`);
       setClient(clientRes.data);
-      setFoods(foodsRes.data);
       
       const initialMeals = mealNames.map((name, idx) => ({
         meal_number: idx + 1,
@@ -81,16 +80,15 @@ const DietBuilder = () => {
     const food = { ...newFoods[foodIdx] };
 
     if (field === 'food_id') {
-      const selected = foods.find(f => f.id === value);
-      if (selected) {
-        food.food_id = selected.id;
-        food.food_name = selected.name;
-        const qty = food.quantity_g;
-        food.kcal = (selected.kcal_per_100g * qty) / 100;
-        food.protein = (selected.protein_per_100g * qty) / 100;
-        food.carbs = (selected.carbs_per_100g * qty) / 100;
-        food.fats = (selected.fats_per_100g * qty) / 100;
-      }
+      const selected = value;
+      setFoods((current) => current.some(f => f.id === selected.id) ? current : [...current, selected]);
+      food.food_id = selected.id;
+      food.food_name = selected.name;
+      const qty = food.quantity_g;
+      food.kcal = (selected.kcal_per_100g * qty) / 100;
+      food.protein = (selected.protein_per_100g * qty) / 100;
+      food.carbs = (selected.carbs_per_100g * qty) / 100;
+      food.fats = (selected.fats_per_100g * qty) / 100;
     } else if (field === 'quantity_g') {
       food.quantity_g = parseFloat(value) || 0;
       const selected = foods.find(f => f.id === food.food_id);
@@ -275,19 +273,10 @@ const DietBuilder = () => {
                     {meal.foods.map((food, fIdx) => (
                       <tr key={fIdx} className="border-b border-zinc-900 hover:bg-zinc-900/50">
                         <td className="py-2 px-2 border border-zinc-900">
-                          <Select
-                            value={food.food_id}
-                            onValueChange={(v) => updateFood(mIdx, fIdx, 'food_id', v)}
-                          >
-                            <SelectTrigger className="rounded-none border-transparent bg-transparent hover:bg-zinc-900 h-full w-full text-sm">
-                              <SelectValue placeholder="Seleccionar..." />
-                            </SelectTrigger>
-                            <SelectContent className="rounded-none bg-zinc-900 border-zinc-800 max-h-60">
-                              {foods.map((f) => (
-                                <SelectItem key={f.id} value={f.id}>{f.name}</SelectItem>
-                              ))}
-                            </SelectContent>
-                          </Select>
+                          <FoodPicker
+                            label={food.food_name}
+                            onSelect={(f) => updateFood(mIdx, fIdx, 'food_id', f)}
+                          />
                         </td>
                         <td className="py-2 px-2 border border-zinc-900">
                           <Input
@@ -4,7 +4,7 @@ import axios from 'axios';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
 import { Label } from '../components/ui/label';
-import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
+import { FoodPicker } from '../components/FoodPicker';
 import { ArrowLeft, Save, FileDown, Plus, Trash2, Edit2 } from 'lucide-react';
 import { toast } from 'sonner';
 
@@ -26,15 +26,11 @@ const DietPreview = () => {
 
   const fetchData = async () => {
     try {
-      const [clientRes, dietRes, foodsRes] = await Promise.all([
-        axios.get(`${API_URL}/clients/${clientId}`),
-        axios.get(`${API_URL}/diets/${dietId}`),
-        axios.get(`${API_URL}/foods`)
-      ]);
-      setClient(clientRes.data);
-      setDiet(dietRes.data);
-      setEditedDiet(JSON.parse(JSON.stringify(dietRes.data)));
-      setFoods(foodsRes.data);
+      const response = await axios.get(`${API_URL}/diets/${dietId}/detail`);
+      setClient(response.data.client);
+      setDiet(response.data.diet);
+      setEditedDiet(JSON.parse(JSON.stringify(response.data.diet)));
+      setFoods(response.data.foods);
     } catch (error) {
       toast.error('Error al cargar datos');
     } finally {
@@ -53,16 +49,16 @@ const DietPreview = () => {
     const food = updated.meals[mealIdx].foods[foodIdx];
 
     if (field === 'food_id') {
-      const selectedFood = foods.find(f => f.id === value);
-      if (selectedFood) {
-        food.food_id = selectedFood.id;
-        food.food_name = selectedFood.name;
-        const qty = food.quantity_g;
-        food.kcal = (selectedFood.kcal_per_100g * qty) / 100;
-        food.protein = (selectedFood.protein_per_100g * qty) / 100;
-        food.carbs = (selectedFood.carbs_per_100g * qty) / 100;
-        food.fats = (selectedFood.fats_per_100g * qty) / 100;
-      }
+      const selectedFood = value;
+      // Keep the picked food so later quantity changes can recalculate its macros
+      setFoods((current) => current.some(f => f.id === selectedFood.id) ? current : [...current, selectedFood]);
+      food.food_id = selectedFood.id;
+      food.food_name = selectedFood.name;
+      const qty = food.quantity_g;
+      food.kcal = (selectedFood.kcal_per_100g * qty) / 100;
+      food.protein = (selectedFood.protein_per_100g * qty) / 100;
+      food.carbs = (selectedFood.carbs_per_100g * qty) / 100;
+      food.fats = (selectedFood.fats_per_100g * qty) / 100;
     } else if (field === 'quantity_g') {
       food.quantity_g = parseFloat(value) || 0;
       const selectedFood = foods.find(f => f.id === food.food_id);
@@ -281,19 +277,10 @@ const DietPreview = () => {
                     {meal.foods.map((food, fIdx) => (
                       <tr key={fIdx} className="border-b border-zinc-900 hover:bg-zinc-900/50">
                         <td className="py-2 px-2 border border-zinc-900">
-                          <Select
-                            value={food.food_id}
-                            onValueChange={(v) => updateFood(mIdx, fIdx, 'food_id', v)}
-                          >
-                            <SelectTrigger className="rounded-none border-transparent bg-transparent hover:bg-zinc-900 h-full w-full text-sm">
-                              <SelectValue placeholder="Seleccionar..." />
-                            </SelectTrigger>
-                            <SelectContent className="rounded-none bg-zinc-900 border-zinc-800 max-h-60">
-                              {foods.map((f) => (
-                                <SelectItem key={f.id} value={f.id}>{f.name}</SelectItem>
-                              ))}
-                            </SelectContent>
-                          </Select>
+                          <FoodPicker
+                            label={food.food_name}
+                            onSelect={(f) => updateFood(mIdx, fIdx, 'food_id', f)}
+                          />
                         </td>
                         <td className="py-2 px-2 border border-zinc-900">
                           <Input
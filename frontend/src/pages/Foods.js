@@ -26,11 +26,17 @@ import {
 } from '../components/ui/alert-dialog';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + '/api';
+const PAGE_SIZE = 50;
+const SEARCH_DELAY_MS = 250;
 
 const Foods = () => {
   const navigate = useNavigate();
   const [foods, setFoods] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [searchQuery, setSearchQuery] = useState('');
+  // null mientras no hay búsqueda: se muestra la lista paginada
+  const [searchResults, setSearchResults] = useState(null);
+  const [refreshKey, setRefreshKey] = useState(0);
   const [loading, setLoading] = useState(true);
   const [dialogOpen, setDialogOpen] = useState(false);
   const [editingFood, setEditingFood] = useState(null);
@@ -46,10 +52,35 @@ const Foods = () => {
     fetchFoods();
   }, []);
 
-  const fetchFoods = async () => {
+  useEffect(() => {
+    const q = searchQuery.trim();
+    if (!q) {
+      setSearchResults(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(() => {
+      axios.get(`${API_URL}/foods/search`, { params: { q, limit: 100 } })
+        .then((response) => {
+          if (!cancelled) setSearchResults(response.data);
+        })
+        .catch(() => {
+          if (!cancelled) toast.error('Error al buscar alimentos');
+        });
+    }, SEARCH_DELAY_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, refreshKey]);
+
+  const fetchFoods = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API_URL}/foods`);
-      setFoods(response.data);
+      const params = { limit: PAGE_SIZE };
+      if (cursor) params.cursor = cursor;
+      const response = await axios.get(`${API_URL}/foods`, { params });
+      setFoods((current) => cursor ? [...current, ...response.data] : response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Error al cargar alimentos');
     } finally {
@@ -57,6 +88,11 @@ const Foods = () => {
     }
   };
 
+  const refreshFoods = () => {
+    fetchFoods();
+    setRefreshKey((key) => key + 1);
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -69,7 +105,7 @@ const Foods = () => {
       }
       setDialogOpen(false);
       resetForm();
-      fetchFoods();
+      refreshFoods();
     } catch (error) {
       toast.error('Error al guardar alimento');
     }
@@ -85,7 +121,7 @@ const Foods = () => {
     try {
       await axios.delete(`${API_URL}/foods/${foodId}`);
       toast.success('Alimento eliminado');
-      fetchFoods();
+      refreshFoods();
     } catch (error) {
       toast.error('Error al eliminar alimento');
     }
@@ -102,9 +138,7 @@ const Foods = () => {
     setEditingFood(null);
   };
 
-  const filteredFoods = foods.filter(food =>
-    food.name.toLowerCase().includes(searchQuery.toLowerCase())
-  );
+  const filteredFoods = searchResults ?? foods;
 
   return (
     <div className="min-h-screen bg-zinc-950" data-testid="foods-page">
@@ -316,6 +350,19 @@ const Foods = () => {
             </tbody>
           </table>
         </div>
+
+        {!searchResults && nextCursor && (
+          <div className="flex justify-center mt-6">
+            <Button
+              onClick={() => fetchFoods(nextCursor)}
+              variant="ghost"
+              className="rounded-none hover:bg-zinc-800 text-zinc-400 hover:text-white uppercase tracking-wider text-xs"
+              data-testid="load-more-foods-button"
+            >
+              Cargar más
+            </Button>
+          </div>
+        )}
       </main>
     </div>
   );
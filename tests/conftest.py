@@ -0,0 +1,102 @@
+"""Shared test setup: backend modules importable, and settings safe for a machine without MongoDB."""
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Read by server.py at import time; nothing connects until a test uses the database
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "lontso_test")
+os.environ["MONGO_INDEX_MODE"] = "off"
+os.environ["PDF_CACHE_BACKEND"] = "memory"
+os.environ["PDF_RENDER_WORKERS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import pytest
+from mongomock.collection import Collection
+
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return doc
+    included = {key for key, value in projection.items() if value and key != "_id"}
+    if included:
+        keep = included | ({"_id"} if projection.get("_id", 1) else set())
+        return {key: value for key, value in doc.items() if key in keep}
+    return {key: value for key, value in doc.items() if projection.get(key, 1)}
+
+
+def _find_and_modify_by_id(original):
+    """mongomock re-runs the caller's filter to return the updated document; when the update
+    changes a filtered field (e.g. version) that finds nothing unless _id was projected.
+    Always fetch with _id and apply the projection afterwards, as MongoDB does."""
+    def find_and_modify(self, query, projection=None, *args, **kwargs):
+        doc = original(self, query, None, *args, **kwargs)
+        return None if doc is None else _project(doc, projection)
+    return find_and_modify
+
+
+Collection._find_and_modify = _find_and_modify_by_id(Collection._find_and_modify)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """The API module with a fresh in-memory database"""
+    import server as module
+    from mongomock_motor import AsyncMongoMockClient
+
+    mongo = AsyncMongoMockClient(tz_aware=True)
+    monkeypatch.setattr(module, "client", mongo)
+    monkeypatch.setattr(module, "db", mongo[os.environ["DB_NAME"]])
+    module.user_cache.clear()
+    # Per-process caches would otherwise carry one test's foods into the next
+    monkeypatch.setattr(module, "food_catalog", module.FoodCatalog())
+    monkeypatch.setattr(module, "food_search", module.FoodSearchRegistry(module.FOOD_INDEX_MAX_TRAINERS))
+    return module
+
+
+@pytest.fixture
+def api(server):
+    from fastapi.testclient import TestClient
+
+    # No lifespan: startup would start the background workers and shutdown would stop the shared pools
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def auth(api):
+    """Authorization headers of a freshly registered trainer"""
+    credentials = {"email": "trainer@example.com", "password": "secret"}
+    api.post("/api/auth/register", json={**credentials, "name": "Trainer"}).raise_for_status()
+    token = api.post("/api/auth/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+CLIENT = {"name": "Ana", "age": 30, "sex": "M", "weight": 65, "height": 165, "activity_level": "moderada"}
+
+
+@pytest.fixture
+def new_client(api, auth):
+    def create(**fields):
+        response = api.post("/api/clients", json={**CLIENT, **fields}, headers=auth)
+        response.raise_for_status()
+        return response.json()
+    return create
+
+
+@pytest.fixture
+def catalog(server):
+    """Load shared catalogue foods, as the server does at startup"""
+    from datetime import datetime, timedelta, timezone
+
+    def load(*foods):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        docs = [
+            {"id": f"cat-{index}", "created_by": "catalog", "created_at": start + timedelta(seconds=index), **food}
+            for index, food in enumerate(foods)
+        ]
+        server.food_catalog.load(docs)
+        return docs
+    return load
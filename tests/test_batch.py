@@ -0,0 +1,112 @@
+import pytest
+
+from .conftest import CLIENT
+
+FOOD = {"name": "Arroz", "kcal_per_100g": 130, "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3}
+
+
+def batch(api, auth, operations, **options):
+    response = api.post("/api/batch", json={"operations": operations, **options}, headers=auth)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def statuses(response):
+    return [result["status"] for result in response["results"]]
+
+
+def diet_body(client_id, food_id, grams=100, name="Dieta"):
+    return {"client_id": client_id, "name": name, "meals": [
+        {"meal_number": 1, "meal_name": "Comida", "foods": [{"food_id": food_id, "quantity_g": grams}]}
+    ]}
+
+
+@pytest.fixture
+def diet(api, auth, new_client):
+    """A client with a diet built on one of the trainer's own foods"""
+    client = new_client()
+    food = api.post("/api/foods", json=FOOD, headers=auth).json()
+    response = api.post("/api/diets", json=diet_body(client["id"], food["id"]), headers=auth)
+    response.raise_for_status()
+    return {"client": client, "food": food, "diet": response.json()}
+
+
+@pytest.fixture
+def concurrent(server, monkeypatch):
+    """Run a database change between planning the batch and writing it"""
+    def before_commit(change):
+        commit = server.BatchWriter.commit
+
+        async def commit_after_change(writer, transaction):
+            await change(server.db)
+            await commit(writer, transaction)
+        monkeypatch.setattr(server.BatchWriter, "commit", commit_after_change)
+    return before_commit
+
+
+def test_batches_are_transactions_unless_asked_otherwise(server, api, auth, new_client):
+    assert server.BatchRequest(operations=[{"op": "delete", "collection": "clients", "id": "x"}]).transaction
+
+    client = new_client()
+    response = batch(api, auth, [
+        {"op": "update", "collection": "clients", "id": client["id"], "data": {"name": "Bea"}},
+        {"op": "delete", "collection": "diets", "id": "missing"},
+    ])
+    assert response["committed"] is False
+    assert statuses(response) == [200, 404]
+    assert api.get(f"/api/clients/{client['id']}", headers=auth).json()["name"] == "Ana"
+
+
+def test_best_effort_applies_what_it_can(api, auth, diet):
+    response = batch(api, auth, [
+        {"op": "create", "collection": "clients", "data": {**CLIENT, "name": "Bea"}},
+        {"op": "update", "collection": "diets", "id": diet["diet"]["id"], "data": diet_body(diet["client"]["id"], diet["food"]["id"], 200)},
+        {"op": "delete", "collection": "diets", "id": "missing"},
+    ], transaction=False)
+    assert response["committed"] is True
+    assert statuses(response) == [201, 200, 404]
+    assert api.get(f"/api/diets/{diet['diet']['id']}", headers=auth).json()["total_kcal"] == 260
+
+
+def test_operations_planned_on_a_failed_write_are_not_applied(api, auth, diet, concurrent):
+    food_id = diet["food"]["id"]
+
+    async def edit_food(db):
+        await db.foods.update_one({"id": food_id}, {"$set": {"name": "Arroz integral"}, "$inc": {"version": 1}})
+    concurrent(edit_food)
+
+    response = batch(api, auth, [
+        {"op": "update", "collection": "foods", "id": food_id, "data": {**FOOD, "kcal_per_100g": 350}},
+        # Its totals were computed from the batch's version of the food
+        {"op": "update", "collection": "diets", "id": diet["diet"]["id"], "data": diet_body(diet["client"]["id"], food_id)},
+        {"op": "create", "collection": "clients", "data": {**CLIENT, "name": "Bea"}},
+    ], transaction=False)
+    assert statuses(response) == [412, 424, 201]
+    stored = api.get(f"/api/diets/{diet['diet']['id']}", headers=auth).json()
+    assert stored["total_kcal"] == 130 and stored["version"] == diet["diet"]["version"]
+
+
+def test_a_stale_update_does_not_fail_the_fresh_ones(api, auth, diet, concurrent):
+    client_id, food_id = diet["client"]["id"], diet["food"]["id"]
+    stale = diet["diet"]
+    fresh = api.post("/api/diets", json=diet_body(client_id, food_id, name="Otra"), headers=auth).json()
+
+    async def edit_diet(db):
+        await db.diets.update_one({"id": stale["id"]}, {"$set": {"name": "Editada"}, "$inc": {"version": 1}})
+    concurrent(edit_diet)
+
+    response = batch(api, auth, [
+        {"op": "update", "collection": "diets", "id": stale["id"], "data": diet_body(client_id, food_id, 300)},
+        {"op": "update", "collection": "diets", "id": fresh["id"], "data": diet_body(client_id, food_id, 200, "Otra")},
+        {"op": "delete", "collection": "diets", "id": stale["id"]},
+    ], transaction=False)
+    assert statuses(response) == [412, 200, 424]
+
+    assert api.get(f"/api/diets/{stale['id']}", headers=auth).json()["name"] == "Editada"
+    assert api.get(f"/api/diets/{fresh['id']}", headers=auth).json()["total_kcal"] == 260
+    # Side effects follow what was applied: one revision, and the summary counts the fresh edit only
+    assert api.get(f"/api/diets/{stale['id']}/revisions", headers=auth).json() == []
+    assert [revision["version"] for revision in api.get(f"/api/diets/{fresh['id']}/revisions", headers=auth).json()] == [1, 0]
+    stored = api.get("/api/dashboard/summary", headers=auth).json()
+    assert stored == api.get("/api/dashboard/summary?refresh=true", headers=auth).json()
+    assert stored["diet_count"] == 2
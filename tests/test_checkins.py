@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+def at(*parts):
+    return datetime(*parts, tzinfo=timezone.utc)
+
+
+def moment(value: str) -> datetime:
+    """Response timestamps as aware UTC datetimes, whether or not they carry an offset"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def checkins(api, auth, new_client):
+    client = new_client(weight=80)
+
+    def record(*points, recalculate=False):
+        body = {"checkins": [
+            {"measured_at": when.isoformat(), **measures} for when, measures in points
+        ]}
+        response = api.post(f"/api/clients/{client['id']}/checkins?recalculate={str(recalculate).lower()}",
+                            json=body, headers=auth)
+        response.raise_for_status()
+        return response.json()
+
+    def series(**params):
+        response = api.get(f"/api/clients/{client['id']}/checkins", params=params, headers=auth)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return record, series
+
+
+def test_weeks_start_on_monday_at_midnight_utc(checkins):
+    record, series = checkins
+    record(
+        (at(2026, 3, 8, 23, 59, 59), {"weight": 80}),  # Sunday
+        (at(2026, 3, 9, 0, 0), {"weight": 79}),  # Monday
+        (at(2026, 3, 15, 23, 59), {"weight": 78}),  # Sunday
+        (at(2026, 3, 16, 0, 0, 1), {"weight": 77}),
+    )
+    points = series(interval="week")
+    assert [moment(point["measured_at"]) for point in points] == [at(2026, 3, 2), at(2026, 3, 9), at(2026, 3, 16)]
+    assert [(point["count"], point["weight"]) for point in points] == [(1, 80), (2, 78.5), (1, 77)]
+
+
+def test_days_and_months_bucket_on_utc_boundaries(checkins):
+    record, series = checkins
+    record(
+        (at(2026, 1, 31, 23, 59, 59), {"weight": 80}),
+        (at(2026, 2, 1, 0, 0), {"weight": 79, "waist_cm": 90}),
+        (at(2026, 2, 28, 23, 0), {"weight": 78}),
+        (at(2026, 3, 1, 0, 0), {"weight": 77}),
+    )
+    days = series(interval="day")
+    assert [moment(point["measured_at"]) for point in days] == [
+        at(2026, 1, 31), at(2026, 2, 1), at(2026, 2, 28), at(2026, 3, 1)
+    ]
+    months = series(interval="month")
+    assert [moment(point["measured_at"]) for point in months] == [at(2026, 1, 1), at(2026, 2, 1), at(2026, 3, 1)]
+    assert [point["count"] for point in months] == [1, 2, 1]
+    # $avg skips measures a check-in did not record
+    assert months[1]["waist_cm"] == 90
+
+
+def test_rolling_trend_keeps_the_slope_of_a_linear_series(checkins):
+    record, series = checkins
+    start = at(2026, 1, 5, 8)
+    # -0.1 kg a day for three weeks
+    record(*[(start + timedelta(days=day), {"weight": 90 - 0.1 * day}) for day in range(21)])
+
+    window = 7
+    points = series(interval="day", window=window)
+    assert len(points) == 21
+    trend = [point["weight_trend"] for point in points]
+    # The first points average what there is so far
+    assert trend[0] == pytest.approx(90)
+    assert trend[2] == pytest.approx(89.9)
+    # Once the window is full the trend lags the series by (window - 1) / 2 days, with the same slope
+    for day in range(window - 1, 21):
+        assert trend[day] == pytest.approx(points[day]["weight"] + 0.1 * (window - 1) / 2)
+        if day > window - 1:
+            assert trend[day] - trend[day - 1] == pytest.approx(-0.1)
+    assert all("waist_cm_trend" not in point for point in points)
+
+
+def test_raw_series_and_trend_over_the_latest_weigh_ins(server, api, auth, checkins):
+    record, series = checkins
+    start = at(2026, 1, 1, 7)
+    result = record(*[
+        (start + timedelta(days=day), {"weight": 80 - day, "body_fat_percentage": 20}) for day in range(10)
+    ], recalculate=True)
+    assert result["inserted"] == 10
+
+    # Mean of the latest CHECKIN_TREND_POINTS weigh-ins: days 3..9
+    latest = [80 - day for day in range(10 - server.CHECKIN_TREND_POINTS, 10)]
+    assert result["client"]["weight"] == pytest.approx(round(sum(latest) / len(latest), 1))
+    assert result["client"]["body_fat_percentage"] == 20
+
+    points = series(start=at(2026, 1, 3).isoformat(), end=at(2026, 1, 5).isoformat())
+    assert [point["weight"] for point in points] == [78, 77]
+    assert all("weight_trend" not in point for point in points)
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from .conftest import CLIENT
+
+FOOD = {"name": "Pollo", "kcal_per_100g": 165, "protein_per_100g": 31, "carbs_per_100g": 0, "fats_per_100g": 3.6}
+
+
+def diet_body(client_id, food_id, grams):
+    return {"client_id": client_id, "name": "Dieta", "meals": [
+        {"meal_number": 1, "meal_name": "Comida", "foods": [{"food_id": food_id, "quantity_g": grams}]}
+    ]}
+
+
+@pytest.fixture
+def client_with_target(api, auth, new_client):
+    def create(target_kcal, **fields):
+        client = new_client(**fields)
+        response = api.put(f"/api/clients/{client['id']}", json={"target_kcal": target_kcal}, headers=auth)
+        response.raise_for_status()
+        return response.json()
+    return create
+
+
+def assert_matches_refresh(api, auth):
+    """The incrementally maintained summary equals one rebuilt from scratch"""
+    incremental = api.get("/api/dashboard/summary", headers=auth).json()
+    assert incremental == api.get("/api/dashboard/summary?refresh=true", headers=auth).json()
+    return incremental
+
+
+def test_incremental_summary_matches_a_full_refresh(api, auth, client_with_target):
+    summary = assert_matches_refresh(api, auth)
+    assert summary["avg_target_kcal"] is None
+
+    ana = client_with_target(2000)
+    bea = client_with_target(1600, name="Bea")
+    food = api.post("/api/foods", json=FOOD, headers=auth).json()
+    diets = [
+        api.post("/api/diets", json=diet_body(client["id"], food["id"], grams), headers=auth).json()
+        for client, grams in [(ana, 100), (ana, 300), (bea, 200)]
+    ]
+    summary = assert_matches_refresh(api, auth)
+    assert (summary["client_count"], summary["diet_count"]) == (2, 3)
+    # The clients' targets, not the diets' totals
+    assert summary["avg_target_kcal"] == 1800
+
+    api.put(f"/api/clients/{bea['id']}", json={"target_kcal": 2200}, headers=auth).raise_for_status()
+    api.put(f"/api/diets/{diets[0]['id']}", json=diet_body(ana["id"], food["id"], 150), headers=auth).raise_for_status()
+    api.delete(f"/api/diets/{diets[1]['id']}", headers=auth).raise_for_status()
+    summary = assert_matches_refresh(api, auth)
+    assert summary["avg_target_kcal"] == 2100
+    assert summary["clients"][ana["id"]]["latest_diet"]["id"] == diets[0]["id"]
+
+    api.delete(f"/api/clients/{ana['id']}", headers=auth).raise_for_status()
+    summary = assert_matches_refresh(api, auth)
+    assert (summary["client_count"], summary["diet_count"], summary["avg_target_kcal"]) == (1, 1, 2200)
+
+
+def test_batch_changes_keep_the_summary_exact(api, auth, client_with_target):
+    ana = client_with_target(2000)
+    bea = client_with_target(1500, name="Bea")
+    assert_matches_refresh(api, auth)
+
+    response = api.post("/api/batch", json={"transaction": False, "operations": [
+        {"op": "create", "collection": "clients", "data": {**CLIENT, "name": "Carla"}},
+        {"op": "update", "collection": "clients", "id": ana["id"], "data": {"target_kcal": 2300}},
+        {"op": "update", "collection": "clients", "id": bea["id"], "data": {"target_kcal": 1700}},
+        {"op": "delete", "collection": "clients", "id": bea["id"]},
+    ]}, headers=auth)
+    assert [result["status"] for result in response.json()["results"]] == [201, 200, 200, 200]
+    carla = response.json()["results"][0]["data"]
+    summary = assert_matches_refresh(api, auth)
+    # New clients start with their maintenance kcal as target
+    assert summary["avg_target_kcal"] == pytest.approx((2300 + carla["maintenance_kcal"]) / 2, abs=0.05)
+
+
+def test_summaries_stored_before_target_totals_are_rebuilt(server, api, auth, client_with_target):
+    client_with_target(2000)
+    api.get("/api/dashboard/summary", headers=auth)
+    asyncio.run(server.db.dashboard_summaries.update_one({}, {"$unset": {"target_count": "", "target_kcal_sum": ""}}))
+    client_with_target(1000, name="Bea")
+    assert assert_matches_refresh(api, auth)["avg_target_kcal"] == 1500
+
+
+def test_diets_of_a_deleted_client_are_gone_before_the_purge(api, auth, client_with_target):
+    ana, bea = client_with_target(2000), client_with_target(1600, name="Bea")
+    food = api.post("/api/foods", json=FOOD, headers=auth).json()
+    diet = api.post("/api/diets", json=diet_body(ana["id"], food["id"], 100), headers=auth).json()
+    kept = api.post("/api/diets", json=diet_body(bea["id"], food["id"], 200), headers=auth).json()
+    assert_matches_refresh(api, auth)
+
+    # The cascade worker is not running, so the diet is still stored
+    api.delete(f"/api/clients/{ana['id']}", headers=auth).raise_for_status()
+    assert api.put(f"/api/diets/{diet['id']}", json=diet_body(ana["id"], food["id"], 400), headers=auth).status_code == 404
+    assert api.get(f"/api/diets/{diet['id']}", headers=auth).status_code == 404
+    assert api.delete(f"/api/diets/{diet['id']}", headers=auth).status_code == 404
+    assert [d["id"] for d in api.get("/api/diets", headers=auth).json()] == [kept["id"]]
+    assert api.get(f"/api/diets?client_id={ana['id']}", headers=auth).json() == []
+    batch = api.post("/api/batch", json={"transaction": False, "operations": [
+        {"op": "update", "collection": "diets", "id": diet["id"], "data": diet_body(ana["id"], food["id"], 400)},
+    ]}, headers=auth).json()
+    assert batch["results"][0]["status"] == 404
+
+    summary = assert_matches_refresh(api, auth)
+    assert (summary["diet_count"], summary["client_count"]) == (1, 1)
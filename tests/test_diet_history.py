@@ -0,0 +1,141 @@
+import copy
+
+import pytest
+
+from diet_history import revision_state, diff_diet, apply_delta
+
+FOODS = [
+    {"name": "Arroz", "kcal_per_100g": 130, "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3},
+    {"name": "Pollo", "kcal_per_100g": 165, "protein_per_100g": 31, "carbs_per_100g": 0, "fats_per_100g": 3.6},
+]
+
+
+def item(name, grams):
+    return {"food_id": name.lower(), "food_name": name, "quantity_g": grams, "kcal": grams, "protein": 0, "carbs": 0, "fats": 0}
+
+
+def meal(number, *foods):
+    return {"meal_number": number, "meal_name": f"Comida {number}", "foods": list(foods),
+            "total_kcal": sum(food["kcal"] for food in foods), "total_protein": 0, "total_carbs": 0, "total_fats": 0}
+
+
+def diet(name, *meals):
+    return {"name": name, "meals": list(meals), "total_kcal": sum(m["total_kcal"] for m in meals),
+            "total_protein": 0, "total_carbs": 0, "total_fats": 0}
+
+
+BASE = diet("Base", meal(1, item("Arroz", 100), item("Pollo", 150)), meal(2, item("Arroz", 80)))
+
+
+def edited(change):
+    new = copy.deepcopy(BASE)
+    change(new)
+    return new
+
+
+EDITS = {
+    "rename": lambda d: d.update(name="Otra"),
+    "quantity": lambda d: d["meals"][0]["foods"][1].update(quantity_g=200),
+    "append food": lambda d: d["meals"][1]["foods"].append(item("Pollo", 50)),
+    "drop last food": lambda d: d["meals"][0]["foods"].pop(),
+    "drop first food": lambda d: d["meals"][0]["foods"].pop(0),
+    "add meal": lambda d: d["meals"].append(meal(3, item("Pollo", 120))),
+    "drop meal": lambda d: d["meals"].pop(0),
+    "meal fields": lambda d: d["meals"][1].update(meal_name="Cena", total_kcal=999),
+}
+
+
+@pytest.mark.parametrize("change", EDITS.values(), ids=EDITS.keys())
+def test_apply_delta_inverts_diff_diet(change):
+    new = edited(change)
+    delta = diff_diet(BASE, new)
+    assert apply_delta(revision_state(BASE), delta) == revision_state(new)
+    assert apply_delta(revision_state(new), diff_diet(new, BASE)) == revision_state(BASE)
+
+
+def test_unchanged_diet_has_an_empty_delta():
+    assert diff_diet(BASE, copy.deepcopy(BASE)) == {}
+
+
+def test_apply_delta_leaves_its_input_alone():
+    state = revision_state(BASE)
+    apply_delta(state, diff_diet(BASE, edited(EDITS["quantity"])))
+    assert state == revision_state(BASE)
+
+
+# ============ API ============
+
+@pytest.fixture
+def saved_diet(api, auth, new_client):
+    client = new_client()
+    foods = [api.post("/api/foods", json=food, headers=auth).json() for food in FOODS]
+
+    def body(grams, name="Dieta"):
+        return {"client_id": client["id"], "name": name, "meals": [
+            {"meal_number": 1, "meal_name": "Comida", "foods": [
+                {"food_id": foods[0]["id"], "quantity_g": grams},
+                {"food_id": foods[1]["id"], "quantity_g": 150},
+            ]},
+        ]}
+
+    created = api.post("/api/diets", json=body(100), headers=auth).json()
+    return created, body
+
+
+def revisions(api, auth, diet_id):
+    return api.get(f"/api/diets/{diet_id}/revisions", headers=auth).json()
+
+
+def at_version(api, auth, diet_id, version):
+    response = api.get(f"/api/diets/{diet_id}/revisions/{version}", headers=auth)
+    assert response.status_code == 200, (version, response.text)
+    return response.json()
+
+
+def content(diet):
+    return {field: diet[field] for field in ("name", "meals", "total_kcal")}
+
+
+def test_every_version_materializes_with_periodic_snapshots(api, auth, saved_diet):
+    created, body = saved_diet
+    versions = [created]
+    for step in range(1, 13):
+        response = api.put(f"/api/diets/{created['id']}", json=body(100 + step * 10, f"v{step}"), headers=auth)
+        versions.append(response.json())
+
+    recorded = revisions(api, auth, created["id"])
+    assert [revision["version"] for revision in recorded] == list(range(12, -1, -1))
+    assert {revision["version"] for revision in recorded if revision["snapshot"]} == {0, 10}
+    for version, expected in enumerate(versions):
+        assert content(at_version(api, auth, created["id"], version)) == content(expected)
+
+
+def test_batch_edits_record_revisions(api, auth, saved_diet):
+    created, body = saved_diet
+    operations = [
+        {"op": "update", "collection": "diets", "id": created["id"], "data": body(grams)} for grams in (200, 300)
+    ]
+    response = api.post("/api/batch", json={"operations": operations, "transaction": False}, headers=auth).json()
+    assert [result["status"] for result in response["results"]] == [200, 200]
+
+    assert [revision["version"] for revision in revisions(api, auth, created["id"])] == [2, 1, 0]
+    for version, result in enumerate([created] + [result["data"] for result in response["results"]]):
+        assert content(at_version(api, auth, created["id"], version)) == content(result)
+
+
+def test_a_lost_revision_is_recovered_by_the_next_update(server, api, auth, saved_diet, monkeypatch):
+    created, body = saved_diet
+    record = server.record_diet_revision
+
+    async def lost(previous, updated):
+        pass  # e.g. the process died between the diet write and the revision insert
+    monkeypatch.setattr(server, "record_diet_revision", lost)
+    first = api.put(f"/api/diets/{created['id']}", json=body(200), headers=auth).json()
+    monkeypatch.setattr(server, "record_diet_revision", record)
+    second = api.put(f"/api/diets/{created['id']}", json=body(300), headers=auth).json()
+
+    recorded = revisions(api, auth, created["id"])
+    # Version 1 was never flagged as stored, so it went in as a snapshot with version 2
+    assert [(revision["version"], revision["snapshot"]) for revision in recorded] == [(2, False), (1, True)]
+    assert content(at_version(api, auth, created["id"], 1)) == content(first)
+    assert content(at_version(api, auth, created["id"], 2)) == content(second)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from diet_solver import macro_targets, per_gram_matrix, solve_quantities
+
+LIBRARY = [
+    {"id": "chicken", "protein_per_100g": 31, "carbs_per_100g": 0, "fats_per_100g": 3.6, "kcal_per_100g": 165},
+    {"id": "rice", "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3, "kcal_per_100g": 130},
+    {"id": "oil", "protein_per_100g": 0, "carbs_per_100g": 0, "fats_per_100g": 100, "kcal_per_100g": 884},
+    {"id": "oats", "protein_per_100g": 13, "carbs_per_100g": 66, "fats_per_100g": 7, "kcal_per_100g": 389},
+    {"id": "egg", "protein_per_100g": 13, "carbs_per_100g": 1.1, "fats_per_100g": 11, "kcal_per_100g": 155},
+    {"id": "banana", "protein_per_100g": 1.1, "carbs_per_100g": 23, "fats_per_100g": 0.3, "kcal_per_100g": 89},
+    {"id": "salmon", "protein_per_100g": 20, "carbs_per_100g": 0, "fats_per_100g": 13, "kcal_per_100g": 208},
+]
+
+
+def achieved(per_gram, quantities):
+    return per_gram @ quantities
+
+
+@pytest.mark.parametrize("min_g,max_g,step_g,max_foods", [
+    (10, 400, 5, 4),
+    (25, 150, 10, 3),
+    (0, 300, 1, 2),
+    (12, 400, 5, 1),  # min_g off the step grid
+])
+def test_quantities_respect_bounds_step_and_food_count(min_g, max_g, step_g, max_foods):
+    per_gram = per_gram_matrix(LIBRARY)
+    target = macro_targets(700, 30, 45, 25)
+    quantities = solve_quantities(per_gram, target, min_g=min_g, max_g=max_g, step_g=step_g, max_foods=max_foods)
+
+    used = quantities[quantities > 0]
+    assert 0 < len(used) <= max_foods
+    assert np.all(used >= min_g) and np.all(used <= max_g)
+    # Rounded to the step grid, except where a bound clipped the rounded value
+    on_grid = np.isclose(np.round(used / step_g) * step_g, used)
+    assert np.all(on_grid | np.isclose(used, min_g) | np.isclose(used, max_g))
+
+
+@pytest.mark.parametrize("kcal,split", [
+    (600, (30, 40, 30)),
+    (900, (25, 50, 25)),
+    (450, (40, 30, 30)),
+])
+def test_quantities_approach_macro_targets(kcal, split):
+    per_gram = per_gram_matrix(LIBRARY)
+    target = macro_targets(kcal, *split)
+    result = achieved(per_gram, solve_quantities(per_gram, target, step_g=1))
+
+    assert result[3] == pytest.approx(target[3], rel=0.05)
+    # Each macro within 15% of its grams, or 5 g for small targets
+    assert np.all(np.abs(result[:3] - target[:3]) <= np.maximum(0.15 * target[:3], 5))
+
+
+def test_more_foods_never_fit_worse():
+    per_gram = per_gram_matrix(LIBRARY)
+    target = macro_targets(800, 30, 40, 30)
+    weights = 1 / np.maximum(target, 1)
+    errors = [
+        np.linalg.norm((achieved(per_gram, solve_quantities(per_gram, target, step_g=1, max_foods=k)) - target) * weights)
+        for k in (1, 2, 3, 4)
+    ]
+    # Step rounding adds a little noise on top of the continuous optimum
+    assert all(later <= earlier + 0.02 for earlier, later in zip(errors, errors[1:]))
+    assert errors[-1] < errors[0]
+
+
+def test_empty_library_and_zero_target_give_no_food():
+    assert solve_quantities(np.zeros((4, 0)), macro_targets(500, 30, 40, 30)).size == 0
+    assert not solve_quantities(per_gram_matrix(LIBRARY), np.zeros(4)).any()
+
+
+def test_solve_meals_splits_the_day_by_kcal_share():
+    from server import DietGenerateRequest, solve_meals
+
+    foods = {food["id"]: food for food in LIBRARY}
+    request = DietGenerateRequest(
+        client_id="c", name="Auto", step_g=1, max_foods_per_meal=3,
+        meals=[
+            {"meal_name": "Desayuno", "kcal_share": 1, "food_ids": ["oats", "egg", "banana"]},
+            {"meal_name": "Comida", "kcal_share": 2},
+        ],
+    )
+    daily = macro_targets(1800, 30, 45, 25)
+    meals = solve_meals(request, foods, daily)
+
+    assert [meal.meal_name for meal in meals] == ["Desayuno", "Comida"]
+    assert {item.food_id for item in meals[0].foods} <= {"oats", "egg", "banana"}
+    for meal, share in zip(meals, (1 / 3, 2 / 3)):
+        assert 0 < len(meal.foods) <= 3
+        kcal = sum(foods[item.food_id]["kcal_per_100g"] * item.quantity_g / 100 for item in meal.foods)
+        assert kcal == pytest.approx(daily[3] * share, rel=0.05)
+
+
+def test_inverted_gram_bounds_are_rejected(api, auth, new_client):
+    client = new_client()
+    body = {"client_id": client["id"], "name": "Auto", "meals": [{"meal_name": "Comida", "kcal_share": 1}]}
+
+    response = api.post("/api/diets/generate", json={**body, "min_g": 500, "max_g": 100}, headers=auth)
+    assert response.status_code == 422
+    assert "min_g must not exceed max_g" in response.text
+    # Equal bounds are a fixed quantity, not an error
+    response = api.post("/api/diets/generate", json={**body, "min_g": 100, "max_g": 100}, headers=auth)
+    assert response.status_code != 422
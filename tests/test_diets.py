@@ -0,0 +1,59 @@
+import pytest
+
+FOODS = [
+    {"name": "Arroz", "kcal_per_100g": 130, "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3},
+    {"name": "Salmón", "kcal_per_100g": 208, "protein_per_100g": 20, "carbs_per_100g": 0, "fats_per_100g": 13},
+]
+
+
+@pytest.fixture
+def diet_with_deleted_food(api, auth, new_client):
+    """A diet using two foods, one of which has since been deleted from the library"""
+    client = new_client()
+    kept, deleted = [api.post("/api/foods", json=food, headers=auth).json()["id"] for food in FOODS]
+
+    def body(salmon_grams=150, name="Dieta", extra=()):
+        foods = [{"food_id": kept, "quantity_g": 100}, {"food_id": deleted, "quantity_g": salmon_grams}, *extra]
+        return {"client_id": client["id"], "name": name, "meals": [{"meal_number": 1, "meal_name": "Comida", "foods": foods}]}
+
+    diet = api.post("/api/diets", json=body(), headers=auth).json()
+    api.delete(f"/api/foods/{deleted}", headers=auth).raise_for_status()
+    return diet, body, deleted
+
+
+def test_a_diet_stays_editable_after_one_of_its_foods_is_deleted(api, auth, diet_with_deleted_food):
+    diet, body, deleted = diet_with_deleted_food
+
+    response = api.put(f"/api/diets/{diet['id']}", json=body(name="Renombrada"), headers=auth)
+    assert response.status_code == 200, response.text
+    assert response.json()["total_kcal"] == pytest.approx(diet["total_kcal"])
+
+    # The saved item's values scale with a new quantity
+    response = api.put(f"/api/diets/{diet['id']}", json=body(300), headers=auth)
+    assert response.status_code == 200
+    salmon = response.json()["meals"][0]["foods"][1]
+    assert (salmon["food_name"], salmon["kcal"], salmon["fats"]) == ("Salmón", pytest.approx(624), pytest.approx(39))
+
+    detail = api.get(f"/api/diets/{diet['id']}/detail", headers=auth).json()
+    assert {food["id"]: food["kcal_per_100g"] for food in detail["foods"]}[deleted] == pytest.approx(208)
+
+
+def test_batch_edits_keep_deleted_foods_too(api, auth, diet_with_deleted_food):
+    diet, body, _ = diet_with_deleted_food
+    response = api.post("/api/batch", json={"transaction": False, "operations": [
+        {"op": "update", "collection": "diets", "id": diet["id"], "data": body(name="Lote")},
+    ]}, headers=auth).json()
+    assert response["results"][0]["status"] == 200
+    assert response["results"][0]["data"]["total_kcal"] == pytest.approx(diet["total_kcal"])
+
+
+def test_foods_added_to_a_diet_must_exist(api, auth, diet_with_deleted_food):
+    diet, body, deleted = diet_with_deleted_food
+    response = api.put(f"/api/diets/{diet['id']}", json=body(extra=[{"food_id": "nope", "quantity_g": 50}]), headers=auth)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown food ids: nope"
+
+    # A deleted food cannot be put into another diet
+    other = body()
+    other["name"] = "Nueva"
+    assert api.post("/api/diets", json=other, headers=auth).status_code == 400
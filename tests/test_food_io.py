@@ -0,0 +1,154 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from food_io import iter_rows, format_foods
+
+
+async def chunks(data: bytes, size: int = 7):
+    # Small chunks so lines, quoted fields and UTF-8 characters get split across reads
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def parse(text, fmt="csv", encoding="utf-8"):
+    async def collect():
+        return [row async for row in iter_rows(chunks(text.encode(encoding)), fmt)]
+    return asyncio.run(collect())
+
+
+FOOD = {"name": "Arroz", "kcal_per_100g": 130, "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3}
+HEADER = "name,kcal_per_100g,protein_per_100g,carbs_per_100g,fats_per_100g"
+
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_csv_delimiter_is_detected_from_the_header(delimiter):
+    text = HEADER.replace(",", delimiter) + "\n" + delimiter.join(["Arroz", "130", "2.7", "28", "0.3"]) + "\n"
+    [(line, row, error)] = parse(text)
+    assert (line, error) == (2, None)
+    assert row == {"name": "Arroz", "kcal_per_100g": "130", "protein_per_100g": "2.7",
+                   "carbs_per_100g": "28", "fats_per_100g": "0.3"}
+
+
+def test_csv_decimal_commas_bom_crlf_and_quoted_newlines():
+    text = ("﻿" + HEADER.replace(",", ";") + "\r\n"
+            '"Plátano\nmaduro";89;1,1;22,8;0,3\r\n'
+            "\r\n"
+            "Huevo;155;13;1,1;11\r\n")
+    rows = parse(text)
+    assert [line for line, _, _ in rows] == [2, 5]
+    assert rows[0][1]["name"] == "Plátano\nmaduro"
+    assert rows[0][1]["protein_per_100g"] == "1.1"
+    assert rows[1][1]["carbs_per_100g"] == "1.1"
+
+
+def test_csv_errors_keep_their_line_numbers():
+    text = HEADER + "\nArroz,130,2.7\nPan,265,9,49,3.2\n\"Sin cerrar,1,2,3,4\n"
+    rows = parse(text)
+    assert rows[0] == (2, None, "expected 5 columns, got 3")
+    assert rows[1][0] == 3 and rows[1][2] is None
+    assert rows[2] == (4, None, "unterminated quoted field")
+
+
+def test_csv_missing_columns_stop_the_parse():
+    assert parse("name,kcal_per_100g\nArroz,130\n") == [
+        (1, None, "missing columns: protein_per_100g, carbs_per_100g, fats_per_100g")
+    ]
+
+
+def test_ndjson_rows_and_errors():
+    text = json.dumps(FOOD) + "\n\n{bad json\n[1, 2]\n" + json.dumps({**FOOD, "name": "Pan"})
+    rows = parse(text, "ndjson")
+    assert rows[0] == (1, FOOD, None)
+    assert rows[1][0] == 3 and rows[1][2].startswith("invalid JSON")
+    assert rows[2] == (4, None, "expected a JSON object")
+    assert rows[3][0] == 5 and rows[3][1]["name"] == "Pan"
+
+
+def test_format_round_trips_through_the_parser():
+    foods = [FOOD, {**FOOD, "name": 'Queso "fresco", 0%'}]
+
+    async def source():
+        for food in foods:
+            yield food
+
+    async def formatted(fmt):
+        return "".join([text async for text in format_foods(source(), fmt)])
+
+    for fmt in ("csv", "ndjson"):
+        rows = parse(asyncio.run(formatted(fmt)), fmt)
+        assert [row["name"] for _, row, _ in rows] == [food["name"] for food in foods]
+        assert all(float(row["kcal_per_100g"]) == 130 for _, row, _ in rows)
+
+
+# ============ API ============
+
+def import_csv(api, auth, text, mode="skip"):
+    response = api.post(f"/api/foods/import?format=csv&mode={mode}", content=text.encode(), headers=auth)
+    assert response.status_code == 200
+    return response.json()
+
+
+def library(api, auth):
+    return {food["name"]: food for food in api.get("/api/foods", headers=auth).json()}
+
+
+def test_import_reports_duplicates_and_invalid_rows(api, auth):
+    report = import_csv(api, auth, HEADER + "\nArroz,130,2.7,28,0.3\n arroz ,131,2.7,28,0.3\nPan,mucho,9,49,3.2\n,1,1,1,1\n")
+    assert report["inserted"] == 1
+    assert report["error_count"] == 3
+    errors = {error["line"]: error["error"] for error in report["errors"]}
+    assert errors[3] == "duplicate of line 2"
+    assert errors[4].startswith("kcal_per_100g: ")
+    assert errors[5] == "name: empty"
+
+
+def test_import_skips_or_upserts_existing_names(api, auth, catalog):
+    catalog({**FOOD, "name": "Avena"})
+    api.post("/api/foods", json=FOOD, headers=auth).raise_for_status()
+    text = HEADER + "\narroz,140,3,29,0.4\nAVENA,400,14,66,7\nLentejas,116,9,20,0.4\n"
+
+    report = import_csv(api, auth, text)
+    assert (report["inserted"], report["updated"], report["skipped"]) == (1, 0, 2)
+    assert library(api, auth)["Arroz"]["kcal_per_100g"] == 130
+
+    report = import_csv(api, auth, text, mode="upsert")
+    assert (report["inserted"], report["updated"], report["skipped"]) == (0, 3, 0)
+    foods = library(api, auth)
+    assert foods["arroz"]["kcal_per_100g"] == 140
+    # The catalogue food is overwritten for this trainer only, through an override
+    assert foods["AVENA"]["id"] == "cat-0" and foods["AVENA"]["kcal_per_100g"] == 400
+    assert len(foods) == 3
+
+
+def test_export_includes_edited_catalogue_foods(api, auth, catalog):
+    catalog({**FOOD, "name": "Cat 1"}, {**FOOD, "name": "Cat 2"}, {**FOOD, "name": "Cat 3"})
+    api.post("/api/foods", json={**FOOD, "name": "Mío"}, headers=auth).raise_for_status()
+    api.put("/api/foods/cat-1", json={**FOOD, "name": "Cat 2 mine", "kcal_per_100g": 99}, headers=auth).raise_for_status()
+    api.delete("/api/foods/cat-2", headers=auth).raise_for_status()
+
+    exported = api.get("/api/foods/export?format=csv", headers=auth).text
+    rows = list(csv.DictReader(io.StringIO(exported)))
+    assert [row["name"] for row in rows] == ["Mío", "Cat 2 mine"]
+    assert float(rows[1]["kcal_per_100g"]) == 99
+
+    # Round trip: nothing new, the edited catalogue food is matched by its name
+    report = import_csv(api, auth, exported, mode="upsert")
+    assert (report["inserted"], report["updated"], report["error_count"]) == (0, 2, 0)
+    assert library(api, auth)["Cat 2 mine"]["kcal_per_100g"] == 99
+
+
+def test_upserted_foods_get_a_new_version(api, auth):
+    food = api.post("/api/foods", json=FOOD, headers=auth).json()
+    etag = api.get(f"/api/foods/{food['id']}", headers=auth).headers["ETag"]
+
+    import_csv(api, auth, HEADER + "\nArroz,140,3,29,0.4\n", mode="upsert")
+    assert api.get(f"/api/foods/{food['id']}", headers=auth).headers["ETag"] != etag
+
+    # An editor that loaded the food before the import must not overwrite it
+    response = api.put(f"/api/foods/{food['id']}", json=FOOD, headers={**auth, "If-Match": etag})
+    assert response.status_code == 412
+    assert library(api, auth)["Arroz"]["kcal_per_100g"] == 140
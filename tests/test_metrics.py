@@ -0,0 +1,94 @@
+import re
+
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def samples(text):
+    """Sample lines as {(name, labels): value}"""
+    parsed = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            name, _, labels = series.partition("{")
+            parsed[(name, labels.rstrip("}"))] = float(value)
+    return parsed
+
+
+def metric_types(text):
+    return dict(re.findall(r"^# TYPE (\S+) (\S+)$", text, re.MULTILINE))
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = MetricsRegistry(buckets=(0.01, 0.1, 1.0))
+    registry.histogram("job_seconds", "Job time", ("kind",))
+    for seconds in (0.005, 0.01, 0.05, 2.0):
+        registry.observe("job_seconds", ("a",), seconds)
+
+    text = registry.render()
+    assert "# HELP job_seconds Job time\n# TYPE job_seconds histogram\n" in text
+    values = samples(text)
+    # Upper bounds are inclusive: 0.01 falls in le="0.01"
+    assert [values[("job_seconds_bucket", f'kind="a",le="{bound}"')] for bound in ("0.01", "0.1", "1.0", "+Inf")] == [2, 3, 3, 4]
+    assert values[("job_seconds_count", 'kind="a"')] == 4
+    assert values[("job_seconds_sum", 'kind="a"')] == pytest.approx(2.065)
+
+
+def test_counters_gauges_and_label_escaping():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "Errors", ("path",))
+    registry.inc("errors_total", ('say "hi"\\now',), 2)
+
+    text = registry.render(gauges={"queue_size": ("Queued", 3)}, totals={"cache_hits_total": ("Hits", 7)})
+    assert metric_types(text) == {"errors_total": "counter", "cache_hits_total": "counter", "queue_size": "gauge"}
+    assert 'errors_total{path="say \\"hi\\"\\\\now"} 2' in text
+    assert "cache_hits_total 7" in text and "queue_size 3" in text
+    assert text.endswith("\n")
+
+
+@pytest.fixture
+def metrics(server, api, monkeypatch):
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape")
+
+    def scrape():
+        response = api.get("/metrics", headers={"Authorization": "Bearer scrape"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        return response.text
+    return scrape
+
+
+def test_metrics_need_a_token(server, api, monkeypatch):
+    assert api.get("/metrics").status_code == 404
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape")
+    assert api.get("/metrics").status_code == 401
+    assert api.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+def test_requests_are_labelled_by_route_template(api, auth, new_client, metrics):
+    client = new_client()
+    response = api.get(f"/api/clients/{client['id']}", headers=auth)
+    assert "server-timing" in response.headers
+    api.get("/api/clients/missing", headers=auth)
+    api.get("/api/no/such/route")
+
+    values = samples(metrics())
+    count = "http_request_duration_seconds_count"
+    assert values[(count, 'method="GET",route="/api/clients/{client_id}",status="200"')] >= 1
+    assert values[(count, 'method="GET",route="/api/clients/{client_id}",status="404"')] >= 1
+    assert values[(count, 'method="GET",route="unmatched",status="404"')] >= 1
+    # No series per client id
+    assert not any(client["id"] in labels for _, labels in values)
+
+
+def test_component_stats_are_typed(metrics):
+    types = metric_types(metrics())
+    assert types["user_cache_hits_total"] == "counter"
+    assert types["pdf_pool_renders_total"] == "counter"
+    assert types["pdf_pool_render_seconds_total"] == "counter"
+    assert types["user_cache_size"] == "gauge"
+    assert types["pdf_pool_render_seconds_max"] == "gauge"
+    assert types["cascade_worker_queued"] == "gauge"
+    assert "user_cache_hits" not in types
+    assert all(name.endswith("_total") for name, kind in types.items() if kind == "counter")
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+FOOD = {"name": "Arroz", "kcal_per_100g": 130, "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3}
+
+
+def pages(api, auth, url, limit, **params):
+    """Every page of a keyset-paginated list, following X-Next-Cursor"""
+    result, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = api.get(url, params=query, headers=auth)
+        assert response.status_code == 200
+        assert len(response.json()) <= limit
+        result.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return result
+
+
+@pytest.mark.parametrize("fields", [None, "name"])
+def test_clients_sharing_created_at_are_paged_without_duplicates_or_gaps(server, api, auth, new_client, fields):
+    ids = [new_client(name=f"Cliente {n}")["id"] for n in range(7)]
+    # Same timestamp for all of them, so only the id tie-break orders the pages
+    same_time = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    asyncio.run(server.db.clients.update_many({}, {"$set": {"created_at": same_time}}))
+
+    result = pages(api, auth, "/api/clients", 3, **({"fields": fields} if fields else {}))
+    assert [len(page) for page in result] == [3, 3, 1]
+    seen = [client["id"] for page in result for client in page]
+    assert seen == sorted(ids)
+    if fields:
+        assert all(set(client) == {"id", "created_at", "name"} for page in result for client in page)
+
+
+def test_bad_cursor_and_unknown_fields_are_rejected(api, auth, new_client):
+    new_client()
+    assert api.get("/api/clients", params={"cursor": "not-a-cursor"}, headers=auth).status_code == 400
+    assert api.get("/api/clients", params={"fields": "name,password"}, headers=auth).status_code == 400
+
+
+def test_foods_merge_the_catalogue_and_own_foods_on_one_keyset(server, api, auth, catalog):
+    shared = catalog(*({**FOOD, "name": f"Cat {n}"} for n in range(5)))
+    own = [api.post("/api/foods", json={**FOOD, "name": f"Propio {n}"}, headers=auth).json() for n in range(3)]
+    # Own foods interleave with the catalogue, one of them tied with a catalogue food
+    times = [shared[1]["created_at"], shared[2]["created_at"] + timedelta(milliseconds=500), shared[4]["created_at"]]
+    for food, created_at in zip(own, times):
+        asyncio.run(server.db.foods.update_one({"id": food["id"]}, {"$set": {"created_at": created_at}}))
+    api.put("/api/foods/cat-0", json={**FOOD, "name": "Cat 0 editado"}, headers=auth).raise_for_status()
+    api.delete("/api/foods/cat-3", headers=auth).raise_for_status()
+
+    for limit in [1, 2, 3, 10]:
+        seen = [food for page in pages(api, auth, "/api/foods", limit) for food in page]
+        keys = [(datetime.fromisoformat(food["created_at"]), food["id"]) for food in seen]
+        assert keys == sorted(keys)
+        assert len({food["id"] for food in seen}) == len(seen) == 7
+        assert "cat-3" not in {food["id"] for food in seen}
+        assert seen[0]["name"] == "Cat 0 editado"
+
+    projected = [food for page in pages(api, auth, "/api/foods", 2, fields="name") for food in page]
+    assert [food["id"] for food in projected] == [food["id"] for food in seen]
+    assert all(set(food) == {"id", "created_at", "name"} for food in projected)
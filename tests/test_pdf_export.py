@@ -0,0 +1,93 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+FOOD = {"name": "Avena", "kcal_per_100g": 389, "protein_per_100g": 16.9, "carbs_per_100g": 66.3, "fats_per_100g": 6.9}
+
+
+@pytest.fixture
+def diets(api, auth, new_client):
+    food = api.post("/api/foods", json=FOOD, headers=auth).json()
+
+    def create(client, name):
+        body = {"client_id": client["id"], "name": name, "meals": [
+            {"meal_number": 1, "meal_name": "Desayuno", "foods": [{"food_id": food["id"], "quantity_g": 80}]}
+        ]}
+        return api.post("/api/diets", json=body, headers=auth).json()
+
+    ana, bea = new_client(), new_client(name="Bea")
+    return [create(ana, "Volumen"), create(ana, "Definición"), create(bea, "Mantenimiento")]
+
+
+def test_bulk_export_needs_a_filter(api, auth, diets):
+    assert api.post("/api/diets/export", json={}, headers=auth).status_code == 422
+    assert api.post("/api/diets/export", json={"format": "pdf"}, headers=auth).status_code == 422
+
+
+def test_bulk_export_zips_the_selected_diets(api, auth, diets):
+    response = api.post("/api/diets/export", json={"client_ids": [diets[0]["client_id"]]}, headers=auth)
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert len(names) == 2 and all(name.endswith(".pdf") for name in names)
+
+
+def test_renders_start_only_once_the_body_is_sent(server, api, auth, diets):
+    user = server.User(**api.get("/api/auth/me", headers=auth).json())
+    request = server.BulkExportRequest(diet_ids=[diet["id"] for diet in diets])
+
+    async def export_without_reading():
+        response = await server.export_diets_bulk(request, user)
+        # A client that disconnects now must not leave renders behind
+        return response, asyncio.all_tasks() - {asyncio.current_task()}
+
+    response, pending = asyncio.run(export_without_reading())
+    assert response.media_type == "application/zip"
+    assert pending == set()
+
+
+@pytest.fixture
+def pdf_cache(server, monkeypatch):
+    cache = server.PdfCache(server.MemoryPdfCache(10 * 1024 * 1024))
+    monkeypatch.setattr(server, "pdf_cache", cache)
+    return cache
+
+
+def test_cache_stores_must_implement_every_method(server):
+    class GetOnly(server.PdfCacheStore):
+        def get(self, diet_id, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_second_export_is_served_from_the_cache(server, api, auth, diets, pdf_cache, monkeypatch):
+    renders = []
+    render = server.pdf_pool.render
+
+    async def counting_render(*args):
+        renders.append(args)
+        return await render(*args)
+
+    monkeypatch.setattr(server.pdf_pool, "render", counting_render)
+    first = api.get(f"/api/diets/{diets[0]['id']}/export", headers=auth)
+    second = api.get(f"/api/diets/{diets[0]['id']}/export", headers=auth)
+
+    assert first.status_code == second.status_code == 200
+    assert second.content == first.content
+    assert len(renders) == 1
+    assert (pdf_cache.hits, pdf_cache.misses) == (1, 1)
+
+
+def test_matching_if_none_match_returns_304(api, auth, diets, pdf_cache):
+    url = f"/api/diets/{diets[0]['id']}/export"
+    etag = api.get(url, headers=auth).headers["ETag"]
+
+    response = api.get(url, headers={**auth, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag and response.content == b""
+
+    stale = api.get(url, headers={**auth, "If-None-Match": '"other"'})
+    assert stale.status_code == 200 and stale.headers["ETag"] == etag
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+FOODS = [
+    {"name": "Avena", "kcal_per_100g": 389, "protein_per_100g": 16.9, "carbs_per_100g": 66.3, "fats_per_100g": 6.9},
+    {"name": "Pollo", "kcal_per_100g": 165, "protein_per_100g": 31, "carbs_per_100g": 0, "fats_per_100g": 3.6},
+    {"name": "Arroz", "kcal_per_100g": 130, "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3},
+]
+
+
+def rounded(value):
+    """Floats rounded so incremental and full sums compare equal despite the addition order"""
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+
+@pytest.fixture
+def plan(api, auth, new_client):
+    client = new_client()
+    foods = [api.post("/api/foods", json=food, headers=auth).json()["id"] for food in FOODS]
+
+    def portion(food, grams):
+        return {"food_id": foods[food], "quantity_g": grams}
+
+    body = {
+        "client_id": client["id"],
+        "name": "Semana",
+        "meals": [
+            {"id": "desayuno", "meal_name": "Desayuno", "foods": [portion(0, 80)]},
+            {"id": "comida", "meal_name": "Comida", "foods": [portion(1, 150), portion(2, 100)]},
+            {"id": "cena", "meal_name": "Cena", "foods": [portion(1, 120)]},
+        ],
+        "days": [
+            {"name": "Lunes", "meal_ids": ["desayuno", "comida"]},
+            {"name": "Martes", "meal_ids": ["desayuno", "cena"]},
+            {"name": "Miércoles", "meal_ids": ["comida", "cena"]},
+        ],
+    }
+    response = api.post("/api/plans", json=body, headers=auth)
+    response.raise_for_status()
+    return response.json(), body, portion
+
+
+def recomputed(server, api, auth, body):
+    trainer_id = api.get("/api/auth/me", headers=auth).json()["id"]
+    return asyncio.run(server.plan_fields(server.PlanCreate(**body), trainer_id))
+
+
+def assert_matches_full_recompute(server, api, auth, plan, body):
+    expected = recomputed(server, api, auth, body)
+    assert rounded({field: plan[field] for field in expected}) == rounded(expected)
+
+
+def test_editing_a_shared_meal_matches_a_full_recompute(server, api, auth, plan):
+    created, body, portion = plan
+    meal = {"meal_name": "Desayuno grande", "foods": [portion(0, 120), portion(2, 50)]}
+
+    response = api.put(f"/api/plans/{created['id']}/meals/desayuno", json=meal, headers=auth)
+    assert response.status_code == 200
+    updated = response.json()
+    # Lunes and Martes use the meal; Miércoles keeps its totals
+    assert updated["days"][2] == created["days"][2]
+    assert updated["days"][0]["total_kcal"] > created["days"][0]["total_kcal"]
+
+    body["meals"][0] = {"id": "desayuno", **meal}
+    assert_matches_full_recompute(server, api, auth, updated, body)
+    assert updated == api.get(f"/api/plans/{created['id']}", headers=auth).json()
+
+
+def test_editing_a_day_matches_a_full_recompute(server, api, auth, plan):
+    created, body, _ = plan
+    day = {"name": "Martes entreno", "meal_ids": ["desayuno", "comida", "cena"]}
+
+    response = api.put(f"/api/plans/{created['id']}/days/1", json=day, headers=auth)
+    assert response.status_code == 200
+
+    body["days"][1] = day
+    assert_matches_full_recompute(server, api, auth, response.json(), body)
@@ -0,0 +1,55 @@
+import pytest
+
+FOOD = {"name": "Pollo", "kcal_per_100g": 165, "protein_per_100g": 31, "carbs_per_100g": 0, "fats_per_100g": 3.6}
+RICE = {"name": "Arroz", "kcal_per_100g": 130, "protein_per_100g": 2.7, "carbs_per_100g": 28, "fats_per_100g": 0.3}
+OIL = {"name": "Aceite", "kcal_per_100g": 884, "protein_per_100g": 0, "carbs_per_100g": 0, "fats_per_100g": 100}
+
+
+@pytest.fixture
+def template(api, auth):
+    foods = [api.post("/api/foods", json=food, headers=auth).json() for food in [FOOD, RICE, OIL]]
+    body = {"name": "Base", "meals": [
+        {"meal_number": 1, "meal_name": "Comida", "foods": [
+            {"food_id": foods[0]["id"], "quantity_g": 150},
+            {"food_id": foods[1]["id"], "quantity_g": 200},
+            {"food_id": foods[2]["id"], "quantity_g": 10},
+        ]},
+        {"meal_number": 2, "meal_name": "Cena", "foods": [{"food_id": foods[0]["id"], "quantity_g": 120}]},
+    ]}
+    response = api.post("/api/templates", json=body, headers=auth)
+    response.raise_for_status()
+    return response.json()
+
+
+def test_apply_scales_one_diet_per_client_to_its_target(api, auth, new_client, template):
+    clients = [new_client(), new_client(name="Bea")]
+    for client, target in zip(clients, [1800, 2600]):
+        api.put(f"/api/clients/{client['id']}", json={"target_kcal": target}, headers=auth).raise_for_status()
+
+    response = api.post(f"/api/templates/{template['id']}/apply",
+                        json={"client_ids": [c["id"] for c in clients], "name": "Semana 1"}, headers=auth)
+    assert response.status_code == 200
+    diets = response.json()
+    assert [diet["client_id"] for diet in diets] == [c["id"] for c in clients]
+    assert all(diet["name"] == "Semana 1" for diet in diets)
+    # Scaled towards each target, so the larger target gets the larger diet
+    assert diets[0]["total_kcal"] < diets[1]["total_kcal"]
+    for diet, target in zip(diets, [1800, 2600]):
+        assert diet["total_kcal"] == pytest.approx(target, rel=0.15)
+
+    stored = api.get(f"/api/diets/{diets[1]['id']}", headers=auth).json()
+    assert [meal["meal_name"] for meal in stored["meals"]] == ["Comida", "Cena"]
+    assert stored["total_kcal"] == pytest.approx(sum(meal["total_kcal"] for meal in stored["meals"]))
+    summary = api.get("/api/dashboard/summary", headers=auth).json()
+    assert summary == api.get("/api/dashboard/summary?refresh=true", headers=auth).json()
+    assert summary["diet_count"] == 2
+
+
+def test_apply_rejects_unknown_or_deleted_clients(api, auth, new_client, template):
+    ana, bea = new_client(), new_client(name="Bea")
+    api.delete(f"/api/clients/{bea['id']}", headers=auth).raise_for_status()
+
+    for client_ids in [[ana["id"], "missing"], [ana["id"], bea["id"]]]:
+        response = api.post(f"/api/templates/{template['id']}/apply", json={"client_ids": client_ids}, headers=auth)
+        assert response.status_code == 404
+    assert api.get("/api/diets", headers=auth).json() == []
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from nutrition import calculate_tmb, calculate_maintenance_kcal
+from recalculate_clients import recalculate
+
+
+def test_changing_the_default_formula_recomputes_inheriting_clients(api, auth, new_client):
+    inherits = new_client(name="Hereda")
+    own = new_client(name="Propia", bmr_formula="harris_benedict")
+
+    response = api.put("/api/auth/me", json={"bmr_formula": "mifflin_st_jeor"}, headers=auth)
+    assert response.status_code == 200
+    assert response.json()["bmr_formula"] == "mifflin_st_jeor"
+
+    updated = api.get(f"/api/clients/{inherits['id']}", headers=auth).json()
+    tmb = calculate_tmb("M", 65, 165, 30, "mifflin_st_jeor")
+    assert updated["tmb"] == pytest.approx(tmb)
+    assert updated["maintenance_kcal"] == pytest.approx(calculate_maintenance_kcal(tmb, "moderada"))
+    assert updated["projection_key"] != inherits["projection_key"]
+    assert updated["version"] == inherits["version"] + 1
+
+    unchanged = api.get(f"/api/clients/{own['id']}", headers=auth).json()
+    assert unchanged["tmb"] == pytest.approx(own["tmb"])
+    assert unchanged["version"] == own["version"]
+
+
+def test_other_settings_leave_clients_alone(api, auth, new_client):
+    client = new_client()
+    api.put("/api/auth/me", json={"name": "Otro nombre"}, headers=auth).raise_for_status()
+    assert api.get(f"/api/clients/{client['id']}", headers=auth).json()["version"] == client["version"]
+
+
+def test_recalculation_skips_clients_edited_meanwhile(server, api, auth, new_client):
+    edited, untouched = new_client(name="Editada"), new_client(name="Intacta")
+    clients = server.db.clients
+
+    class EditBeforeWriting:
+        """The clients collection, with a concurrent edit landing between the read and the write"""
+        find = clients.find
+
+        async def bulk_write(self, operations, **kwargs):
+            await clients.update_one({"id": edited["id"]}, {"$set": {"weight": 70}, "$inc": {"version": 1}})
+            return await clients.bulk_write(operations, **kwargs)
+
+    db = SimpleNamespace(users=server.db.users, clients=EditBeforeWriting())
+    # Force every client to look stale
+    asyncio.run(clients.update_many({}, {"$set": {"tmb": 0}}))
+    totals = asyncio.run(recalculate(db, log=lambda message: None))
+    assert totals == {"processed": 2, "changed": 1, "skipped": 1}
+
+    assert api.get(f"/api/clients/{edited['id']}", headers=auth).json()["tmb"] == 0
+    recomputed = api.get(f"/api/clients/{untouched['id']}", headers=auth).json()
+    assert recomputed["tmb"] == pytest.approx(untouched["tmb"])
+    assert recomputed["version"] == untouched["version"] + 1